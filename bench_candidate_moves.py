@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Tree size, memory and playout speed of MCTS with and without candidate-move restriction
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import copy
+import time
+import tracemalloc
+import numpy as np
+from game import Board
+from mcts_pure import MCTS, policy_value_fn
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node._children.values())
+
+
+def midgame_board(size, candidate_distance, n_stones=12, seed=0):
+    """a board with n_stones played around the center"""
+    rng = np.random.RandomState(seed)
+    board = Board(width=size, height=size, n_in_row=5, candidate_distance=candidate_distance)
+    board.init_board()
+    center = size // 2
+    while len(board.states) < n_stones:
+        h, w = center + rng.randint(-3, 4), center + rng.randint(-3, 4)
+        move = h * size + w
+        if move in board.availables:
+            board.do_move(move)
+    return board
+
+
+def run(size, candidate_distance, n_playout):
+    board = midgame_board(size, candidate_distance)
+    mcts = MCTS(policy_value_fn, c_puct=5, n_playout=n_playout)
+    tracemalloc.start()
+    t1 = time.time()
+    for n in range(n_playout):
+        mcts._playout(copy.deepcopy(board))
+    t2 = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count_nodes(mcts._root), len(mcts._root._children), current, n_playout / (t2 - t1)
+
+
+if __name__ == '__main__':
+    n_playout = 2000
+    for size in [15, 19]:
+        for candidate_distance in [0, 2, 1]:
+            nodes, root_children, mem, pps = run(size, candidate_distance, n_playout)
+            print("board:{}x{}, candidate_distance:{}, root_children:{}, nodes:{}, tree_mem_kb:{:.0f}, "
+                  "playouts_per_second:{:.1f}".format(size, size, candidate_distance, root_children, nodes,
+                                                      mem / 1024.0, pps))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call time of policy_value_fn at batch size 1: the current path (Variable around a tensor built
+from a numpy copy, eager module, .data.cpu().numpy()) against CompiledPolicyValue in each mode.
+The overhead column is the call time minus a bare forward of the eager module on a ready tensor.
+
+Runs on the cpu; the current path is reproduced without the .cuda() move.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import numpy as np
+import torch
+from torch.autograd import Variable
+from bench_utils import seconds_per_call, position
+from compiled_inference import CompiledPolicyValue
+from policy_value_net import PolicyValueBackBoneNet
+
+
+def legacy_policy_value_fn(model, board, feature_planes):
+    """PolicyValueNet.policy_value_fn as it is, on the cpu"""
+    legal_positions = board.candidate_moves()
+    current_state = board.current_state()
+    current_state = current_state.reshape(-1, feature_planes, board.width, board.height)
+    current_state = Variable(torch.Tensor(current_state.copy()).type(torch.FloatTensor))
+    act_probs, value = model(current_state)
+    act_probs, value = act_probs.data.cpu().numpy(), value.data.cpu().numpy()
+    act_probs = act_probs.flatten()[legal_positions]
+    act_probs = zip(legal_positions, act_probs)
+    return act_probs, value[0][0]
+
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    feature_planes, n_calls = 8, 20
+    for size in [11, 15]:
+        board = position(size, feature_planes)
+        model = PolicyValueBackBoneNet(size * size, feature_planes)
+        model.eval()
+        x = torch.from_numpy(board.current_state().reshape(1, feature_planes, size, size).astype(np.float32))
+
+        def bare():
+            with torch.inference_mode():
+                model(x)
+        t_bare = seconds_per_call(bare, n_calls)
+        _, reference = legacy_policy_value_fn(model, board, feature_planes)
+        t_legacy = seconds_per_call(lambda: legacy_policy_value_fn(model, board, feature_planes), n_calls)
+        print("board:{}x{}, path:eager_forward_only, ms_per_call:{:.3f}".format(size, size, t_bare * 1000))
+        print("board:{}x{}, path:current, ms_per_call:{:.3f}, overhead_ms:{:.3f}".format(
+            size, size, t_legacy * 1000, (t_legacy - t_bare) * 1000))
+        for mode in ['eager', 'trace', 'compile']:
+            try:
+                compiled = CompiledPolicyValue(model, size, size, feature_planes, max_batch=1, mode=mode)
+            except Exception as e:
+                # torch.compile needs a working c++ toolchain
+                print("board:{}x{}, path:{}, unavailable: {}".format(size, size, mode, str(e).splitlines()[0]))
+                continue
+            _, value = compiled.policy_value_fn(board)
+            t = seconds_per_call(lambda: compiled.policy_value_fn(board), n_calls)
+            print("board:{}x{}, path:{}, ms_per_call:{:.3f}, overhead_ms:{:.3f}, speedup:{:.2f}, "
+                  "value_diff:{:.2e}".format(size, size, mode, t * 1000, (t - t_bare) * 1000, t_legacy / t,
+                                             abs(value - reference)))
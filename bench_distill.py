@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Strength vs latency of distilled students against their teacher: policy_value_fn latency,
+agreement with the teacher on held-out positions, and matches of MCTSPlayer(student) against
+MCTSPlayer(teacher) at the same time per move
+
+Uses checkpoint_best.pth.tar as the teacher if it exists, a randomly initialised network
+otherwise (then only the latencies and the distillation fit are meaningful). The positions
+come from random play.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import os
+import sys
+import torch
+from bench_utils import seconds_per_call, position, random_states
+from compiled_inference import CompiledPolicyValue
+from distill import Distiller, load_model
+from game import Board, Game
+from mcts_alphazero import MCTSPlayer
+from policy_value_net import PolicyValueBackBoneNet
+
+STUDENTS = [(32, 2), (64, 4)]  # (channels, residual_blocks)
+
+
+def match(student_fn, teacher_fn, size, feature_planes, n_games, seconds_per_move):
+    board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+    game = Game(board)
+    student = MCTSPlayer(student_fn, c_puct=5, time_budget=seconds_per_move)
+    teacher = MCTSPlayer(teacher_fn, c_puct=5, time_budget=seconds_per_move)
+    win_cnt = {'win': 0, 'lose': 0, 'tie': 0}
+    for i in range(n_games):
+        winner = game.start_play(student, teacher, start_player=i % 2, is_shown=0)
+        if winner == -1:
+            win_cnt['tie'] += 1
+        elif winner == student.player:
+            win_cnt['win'] += 1
+        else:
+            win_cnt['lose'] += 1
+    return win_cnt, student.search_stats, teacher.search_stats
+
+
+if __name__ == '__main__':
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    size, feature_planes, seconds_per_move = 11, 8, 1.0
+    torch.manual_seed(0)
+    if os.path.exists('checkpoint_best.pth.tar'):
+        teacher = load_model('checkpoint_best.pth.tar', size, size, feature_planes)
+    else:
+        teacher = PolicyValueBackBoneNet(size * size, feature_planes)
+        teacher.eval()
+    states = random_states(2048, size, feature_planes, seed=1)
+    train_states, val_states = states[256:], states[:256]
+    board = position(size, feature_planes)
+    teacher_net = CompiledPolicyValue(teacher, size, size, feature_planes)
+    t_teacher = seconds_per_call(lambda: teacher_net.policy_value_fn(board), 20)
+    print("net:teacher 256x10, ms_per_call:{:.3f}".format(t_teacher * 1000))
+    for channels, blocks in STUDENTS:
+        student = PolicyValueBackBoneNet(size * size, feature_planes, channels=channels, residual_blocks=blocks)
+        distiller = Distiller(teacher, student)
+        distiller.fit(train_states, epochs=3, batch_size=256)
+        kl, value_mse, agreement = distiller.evaluate(val_states)
+        student_net = CompiledPolicyValue(student, size, size, feature_planes)
+        t_student = seconds_per_call(lambda: student_net.policy_value_fn(board), 200)
+        win_cnt, student_stats, teacher_stats = match(student_net.policy_value_fn, teacher_net.policy_value_fn,
+                                                      size, feature_planes, n_games, seconds_per_move)
+        print("net:student {}x{}, ms_per_call:{:.3f}, speedup:{:.1f}, val_kl:{:.4f}, val_value_mse:{:.4f}, "
+              "top1_agreement:{:.3f}".format(channels, blocks, t_student * 1000, t_teacher / t_student,
+                                              kl, value_mse, agreement))
+        print("student {}x{} vs teacher at {}s/move, win:{}, lose:{}, tie:{}, student avg_playouts:{:.1f}, "
+              "teacher avg_playouts:{:.1f}".format(channels, blocks, seconds_per_move, win_cnt['win'],
+                                                   win_cnt['lose'], win_cnt['tie'],
+                                                   student_stats.summary()['avg_playouts'],
+                                                   teacher_stats.summary()['avg_playouts']))
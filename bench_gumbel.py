@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Policy targets of the PUCT and the Gumbel root search at low playout counts: total variation to
+and top-1 agreement with a long PUCT search, and search throughput at equal playouts
+
+Uses checkpoint_best.pth.tar as the policy-value function if it exists, uniform priors with a
+random rollout value otherwise.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import copy
+import os
+import time
+import numpy as np
+from game import Board
+from mcts_alphazero import MCTS
+from mcts_pure import MCTS as MCTS_Pure, policy_value_fn as uniform_policy_fn
+
+
+def rollout_policy_value_fn(board):
+    """uniform priors, value of one random rollout for the player to move"""
+    action_probs, _ = uniform_policy_fn(board)
+    rollout = MCTS_Pure(uniform_policy_fn)
+    return action_probs, rollout._evaluate_rollout(copy.deepcopy(board))
+
+
+def load_policy_value_fn(size, model_file='checkpoint_best.pth.tar', feature_planes=8):
+    if not os.path.exists(model_file):
+        return rollout_policy_value_fn, 'rollout'
+    from policy_value_net import PolicyValueNet
+    from checkpoint import load_weights
+    net = PolicyValueNet(size, size, feature_planes, mode='eval', checkpoint=load_weights(model_file))
+    return net.policy_value_fn, model_file
+
+
+def midgame_positions(n_positions, size, feature_planes=8, seed=0):
+    rng = np.random.RandomState(seed)
+    positions = []
+    while len(positions) < n_positions:
+        board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+        board.init_board()
+        center = size // 2
+        for i in range(rng.randint(4, 12)):
+            h, w = center + rng.randint(-3, 4), center + rng.randint(-3, 4)
+            if h * size + w in board.availables:
+                board.do_move(h * size + w)
+        if not board.game_end()[0]:
+            positions.append(board)
+    return positions
+
+
+def puct_target(policy_value_fn, board, n_playout):
+    mcts = MCTS(policy_value_fn, c_puct=5, n_playout=n_playout)
+    acts, probs = mcts.get_move_probs(board, temp=1.0)
+    target = np.zeros(board.width * board.height)
+    target[list(acts)] = probs
+    return target
+
+
+def gumbel_target(policy_value_fn, board, n_playout, m=16):
+    mcts = MCTS(policy_value_fn, c_puct=5, n_playout=n_playout)
+    acts, probs, move = mcts.gumbel_move_probs(board, m=m)
+    target = np.zeros(board.width * board.height)
+    target[list(acts)] = probs
+    return target
+
+
+def total_variation(p, q):
+    """0.5 * L1 distance, unlike the KL divergence it stays finite when a target misses a move"""
+    return 0.5 * np.abs(p - q).sum()
+
+
+if __name__ == '__main__':
+    size, n_positions, reference_playout = 11, 20, 800
+    policy_value_fn, source = load_policy_value_fn(size)
+    positions = midgame_positions(n_positions, size)
+    references = [puct_target(policy_value_fn, board, reference_playout) for board in positions]
+    print("policy_value_fn:{}, positions:{}, reference:puct@{}".format(source, n_positions, reference_playout))
+    for n_playout in [16, 32, 64]:
+        for name, target_fn in [('puct', puct_target), ('gumbel', gumbel_target)]:
+            distances, agree = [], 0
+            t1 = time.time()
+            for board, reference in zip(positions, references):
+                target = target_fn(policy_value_fn, board, n_playout)
+                distances.append(total_variation(reference, target))
+                agree += int(np.argmax(target) == np.argmax(reference))
+            t2 = time.time()
+            print("root_search:{}, n_playout:{}, tv_to_reference:{:.3f}, top1_agreement:{:.2f}, "
+                  "searches_per_second:{:.1f}".format(name, n_playout, np.mean(distances), agree / float(n_positions),
+                                                      n_positions / (t2 - t1)))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Check that mixed-precision and gradient-accumulation training follow the fp32 loss curve
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import copy
+import time
+import numpy as np
+import torch
+from game import Board
+from policy_value_net import PolicyValueNet
+
+
+def make_samples(board_width, board_height, feature_planes, n_samples, seed=0):
+    """a fixed set of random positions with random mcts targets and outcomes"""
+    rng = np.random.RandomState(seed)
+    board = Board(width=board_width, height=board_height, feature_planes=feature_planes)
+    states, probs, winners = [], [], []
+    for i in range(n_samples):
+        board.init_board()
+        for j in range(rng.randint(0, board_width * board_height // 3)):
+            board.do_move(board.availables[rng.randint(len(board.availables))])
+        states.append(board.current_state())
+        prob = np.zeros(board_width * board_height)
+        prob[board.availables] = rng.dirichlet(0.3 * np.ones(len(board.availables)))
+        probs.append(prob)
+        winners.append(rng.choice([-1.0, 0.0, 1.0]))
+    return (torch.from_numpy(np.array(states, dtype=np.float32)).cuda(),
+            torch.from_numpy(np.array(probs, dtype=np.float32)).cuda(),
+            torch.from_numpy(np.array(winners, dtype=np.float32)).cuda())
+
+
+def loss_curve(init_state, samples, n_steps, learning_rate, **kwargs):
+    net = PolicyValueNet(BOARD_SIZE, BOARD_SIZE, FEATURE_PLANES, **kwargs)
+    net.policy_value_model.load_state_dict(copy.deepcopy(init_state))
+    losses = []
+    torch.cuda.synchronize()
+    t1 = time.time()
+    for i in range(n_steps):
+        _, _, loss, _ = net.train_step(samples[0], samples[1], samples[2], learning_rate)
+        losses.append(loss)
+    torch.cuda.synchronize()
+    t2 = time.time()
+    return np.array(losses), (t2 - t1) / n_steps, torch.cuda.max_memory_allocated()
+
+
+BOARD_SIZE = 11
+FEATURE_PLANES = 8
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    samples = make_samples(BOARD_SIZE, BOARD_SIZE, FEATURE_PLANES, 1024)
+    init_state = PolicyValueNet(BOARD_SIZE, BOARD_SIZE, FEATURE_PLANES).policy_value_model.state_dict()
+    configs = [('fp32', 1), ('fp32', 4), ('bf16', 1), ('fp16', 1), ('fp16', 4)]
+    baseline = None
+    for precision, accum_steps in configs:
+        if precision == 'bf16' and not torch.cuda.is_bf16_supported():
+            print("precision:bf16 not supported on this device, skip")
+            continue
+        torch.cuda.reset_peak_memory_stats()
+        losses, step_time, peak_mem = loss_curve(init_state, samples, 50, 5e-3,
+                                                 precision=precision, accum_steps=accum_steps)
+        if baseline is None:
+            baseline = losses
+        max_rel_diff = np.max(np.abs(losses - baseline) / np.abs(baseline))
+        print("precision:{}, accum_steps:{}, first_loss:{:.4f}, last_loss:{:.4f}, max_rel_diff_vs_fp32:{:.4f}, "
+              "time_per_step:{:.4f}, peak_mem_mb:{:.1f}".format(precision, accum_steps, losses[0], losses[-1],
+                                                              max_rel_diff, step_time, peak_mem / 2.0 ** 20))
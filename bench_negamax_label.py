@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Positions per second of labelling positions with the negamax search: NegamaxEngine.label (one call
+for the whole batch, a thread pool in the engine) at depths 2, 4 and 6 on 1 thread and on every
+core, against NegamaxPlayer (one engine process per position), whose moves it must reproduce
+
+Needs negamax/build/librenju_c.so and negamax/build/renju (see negamax_lib.py).
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import multiprocessing
+import random
+import sys
+import time
+import numpy as np
+from game import Board
+from negamax import NegamaxPlayer
+from negamax_lib import NegamaxEngine, game_state
+
+DEPTHS = [2, 4, 6]
+CMD_PATH = 'negamax/build/renju'
+
+
+def game_positions(n, size, seed=0):
+    """boards of random games, each stopped at a random ply before the end"""
+    random.seed(seed)
+    boards = []
+    while len(boards) < n:
+        board = Board(width=size, height=size, n_in_row=5)
+        board.init_board()
+        stop = random.randint(1, size * size // 3)
+        for i in range(stop):
+            board.do_move(random.choice(board.availables))
+            if board.game_end()[0]:
+                break
+        else:
+            boards.append(board)
+    return boards
+
+
+def subprocess_labels(boards, search_depth):
+    moves = []
+    for board in boards:
+        player = NegamaxPlayer(CMD_PATH, search_depth=search_depth)
+        player.set_player_ind(board.get_current_player())
+        moves.append(player.get_action(board))
+    return np.array(moves)
+
+
+if __name__ == '__main__':
+    n_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    size, n_subprocess = 15, 16
+    engine = NegamaxEngine()
+    boards = game_positions(n_positions, size)
+    gs_batch = np.stack([game_state(board) for board in boards])
+    players = np.array([board.get_current_player() for board in boards])
+    cpus = multiprocessing.cpu_count()
+    for depth in DEPTHS:
+        for threads in sorted(set([1, cpus])):
+            t1 = time.time()
+            labels = engine.label(gs_batch, players, depth, threads)
+            seconds = time.time() - t1
+            print("depth:{}, threads:{}, positions:{}, positions_per_second:{:.1f}, avg_nodes:{:.0f}, "
+                  "avg_evals:{:.0f}, wins_found:{}".format(depth, threads, n_positions, n_positions / seconds,
+                                                         labels['node_count'].mean(), labels['eval_count'].mean(),
+                                                         int((labels['winner'] != 0).sum())))
+        t1 = time.time()
+        moves = subprocess_labels(boards[:n_subprocess], depth)
+        seconds = time.time() - t1
+        print("depth:{}, NegamaxPlayer subprocess, positions_per_second:{:.1f}, same_moves:{}/{}".format(
+            depth, n_subprocess / seconds, int((moves == labels['move'][:n_subprocess]).sum()), n_subprocess))
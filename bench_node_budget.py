@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Memory of the reused self-play tree with and without a node budget: live nodes and bytes per
+move, peak python memory and self-play speed
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import time
+import tracemalloc
+from game import Board, Game
+from mcts_alphazero import MCTSPlayer
+from mcts_pure import policy_value_fn
+
+
+def count_nodes(node):
+    count, stack = 0, [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node._children.values())
+    return count
+
+
+class TracingPlayer(MCTSPlayer):
+    """records the live tree at the end of every search, before the root moves on"""
+
+    def __init__(self, *args, **kwargs):
+        super(TracingPlayer, self).__init__(*args, **kwargs)
+        self.trace = []
+        update_with_move = self.mcts.update_with_move
+
+        def traced_update_with_move(last_move):
+            if self.mcts.live_nodes > 1:
+                self.trace.append((self.mcts.live_nodes, self.mcts.tree_bytes()))
+            update_with_move(last_move)
+        self.mcts.update_with_move = traced_update_with_move
+
+
+def run(node_budget, n_games, size=11, n_in_row=5, n_playout=800):
+    game = Game(Board(width=size, height=size, n_in_row=n_in_row))
+    player = TracingPlayer(policy_value_fn, c_puct=5, n_playout=n_playout, is_selfplay=1,
+                           node_budget=node_budget)
+    tracemalloc.start()
+    t1 = time.time()
+    moves = 0
+    for i in range(n_games):
+        winner, play_data = game.start_self_play(player, temp=1.0)
+        moves += len(list(play_data))
+    t2 = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = [n for n, b in player.trace]
+    tree_mb = [b / 1024.0 / 1024.0 for n, b in player.trace]
+    print("node_budget:{}, max_live_nodes:{}, avg_live_nodes:{:.0f}, max_tree_mb:{:.1f}, peak_python_mb:{:.1f}, "
+          "pruned_nodes:{}, moves_per_second:{:.2f}".format(
+              node_budget, max(nodes), sum(nodes) / float(len(nodes)), max(tree_mb), peak / 1024.0 / 1024.0,
+              player.mcts.pruned_nodes, moves / (t2 - t1)))
+
+
+if __name__ == '__main__':
+    for node_budget in [None, 100000, 20000]:
+        run(node_budget, n_games=2)
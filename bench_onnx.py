@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Parity of the ONNX Runtime backend with the pytorch network, and cpu latency/throughput of both
+at batch sizes 1 to 256
+
+Uses checkpoint_best.pth.tar if it exists, a randomly initialised network otherwise.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import os
+import torch
+from bench_utils import seconds_per_call, random_states
+from onnx_backend import export_checkpoint, export_onnx, OnnxPolicyValueNet, max_abs_diff
+from policy_value_net import PolicyValueBackBoneNet
+from checkpoint import load_weights
+
+BATCH_SIZES = [1, 4, 16, 64, 256]
+
+
+if __name__ == '__main__':
+    size, feature_planes = 11, 8
+    model_file, onnx_file = 'checkpoint_best.pth.tar', 'policy_value.onnx'
+    if os.path.exists(model_file):
+        export_checkpoint(model_file, onnx_file, size, size, feature_planes)
+        model = PolicyValueBackBoneNet(size * size, feature_planes, load_weights(model_file))
+    else:
+        torch.manual_seed(0)
+        model = PolicyValueBackBoneNet(size * size, feature_planes)
+        export_onnx(model, onnx_file, size, size, feature_planes)
+    model.eval()
+    torch_threads = torch.get_num_threads()
+
+    for threads in sorted(set([1, torch_threads])):
+        torch.set_num_threads(threads)
+        onnx_net = OnnxPolicyValueNet(onnx_file, size, size, feature_planes,
+                                      intra_op_threads=threads, inter_op_threads=1)
+        for batch_size in BATCH_SIZES:
+            states = random_states(batch_size, size, feature_planes, seed=batch_size)
+            prob_diff, value_diff = max_abs_diff(model, onnx_net, states)
+            if prob_diff > 1e-4 or value_diff > 1e-4:
+                raise AssertionError("onnx output differs from pytorch: probs {}, value {}".format(prob_diff,
+                                                                                                   value_diff))
+
+            def torch_fn(x):
+                with torch.no_grad():
+                    return model(torch.from_numpy(x))
+            n_calls = max(3, 64 // batch_size)
+            t_torch = seconds_per_call(lambda: torch_fn(states), n_calls, repeats=1, warmup=1)
+            t_onnx = seconds_per_call(lambda: onnx_net.policy_value(states), n_calls, repeats=1, warmup=1)
+            print("threads:{}, batch_size:{}, max_diff:{:.2e}, torch_ms:{:.2f}, onnx_ms:{:.2f}, "
+                  "torch_states_per_second:{:.0f}, onnx_states_per_second:{:.0f}".format(
+                      threads, batch_size, max(prob_diff, value_diff), t_torch * 1000, t_onnx * 1000,
+                      batch_size / t_torch, batch_size / t_onnx))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Parity of the numpy pattern evaluator with the C++ RenjuAIEval on random positions, its speed
+on 11x11, 15x15 and 19x19 against the C++ evaluator and the line-by-line python port, and the
+strength of the pattern priors in the pure MCTS player
+
+The C++ columns need negamax/build/librenju_c.so (see negamax_lib.py).
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import os
+import sys
+import numpy as np
+from bench_utils import seconds_per_call
+from game import Board, Game
+from mcts_pure import MCTSPlayer
+from negamax_lib import NegamaxEngine, LIB_PATH
+from pattern_eval import eval_moves, eval_move_scalar, policy_value_fn
+
+SIZES = [11, 15, 19]
+
+
+def random_positions(n, size, rng):
+    """game states with a random number of random stones, dense enough for fours and fives"""
+    positions = np.zeros((n, size, size), dtype=np.int8)
+    for gs in positions:
+        stones = rng.randint(0, size * size // 2)
+        cells = rng.choice(size * size, stones, replace=False)
+        gs.flat[cells] = rng.randint(1, 3, stones)
+    return positions
+
+
+def check_parity(engine, n_positions=50, seed=0):
+    """every cell of every position for both players, returns the number of cells compared"""
+    rng = np.random.RandomState(seed)
+    compared = 0
+    for size in SIZES:
+        for gs in random_positions(n_positions, size, rng):
+            for player in (1, 2):
+                expected = engine.eval_moves(gs, player)
+                scores = eval_moves(gs, player)
+                if not np.array_equal(expected, scores):
+                    r, c = np.argwhere(expected != scores)[0]
+                    raise AssertionError("size:{}, player:{}, cell:({}, {}), c++:{}, numpy:{}".format(
+                        size, player, r, c, expected[r, c], scores[r, c]))
+                compared += size * size
+    return compared
+
+
+def prior_match(n_games, size=9, seconds_per_move=0.5):
+    """pure MCTS with pattern priors against uniform priors, random rollouts for both"""
+    game = Game(Board(width=size, height=size, n_in_row=5))
+    player = MCTSPlayer(c_puct=5, time_budget=seconds_per_move, prior_fn=policy_value_fn)
+    baseline = MCTSPlayer(c_puct=5, time_budget=seconds_per_move)
+    win_cnt = {'win': 0, 'lose': 0, 'tie': 0}
+    for i in range(n_games):
+        winner = game.start_play(player, baseline, start_player=i % 2, is_shown=0)
+        if winner == -1:
+            win_cnt['tie'] += 1
+        elif winner == player.player:
+            win_cnt['win'] += 1
+        else:
+            win_cnt['lose'] += 1
+    return win_cnt, player.search_stats.summary()['avg_playouts'], baseline.search_stats.summary()['avg_playouts']
+
+
+if __name__ == '__main__':
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    engine = NegamaxEngine() if os.path.exists(LIB_PATH) else None
+    if engine is not None:
+        print("parity with RenjuAIEval: ok, cells:{}".format(check_parity(engine)))
+    rng = np.random.RandomState(1)
+    for size in SIZES:
+        positions = random_positions(64, size, rng)
+        gs = positions[0]
+        t_numpy = seconds_per_call(lambda: eval_moves(gs, 1), 20, repeats=1, warmup=1)
+        t_batch = seconds_per_call(lambda: eval_moves(positions, 1), 3, repeats=1, warmup=1) / len(positions)
+        cells = [(r, c) for r in range(size) for c in range(size)]
+        gs_list = gs.tolist()
+        t_scalar = seconds_per_call(lambda: [eval_move_scalar(gs_list, r, c, 1) for r, c in cells], 2,
+                                    repeats=1, warmup=1)
+        line = "board:{}x{}, ms_per_board numpy:{:.2f}, numpy_batch64:{:.2f}, python:{:.2f}".format(
+            size, size, t_numpy * 1000, t_batch * 1000, t_scalar * 1000)
+        if engine is not None:
+            t_cpp = seconds_per_call(lambda: engine.eval_moves(gs, 1), 200, repeats=1, warmup=1)
+            line += ", c++:{:.3f}".format(t_cpp * 1000)
+        print(line)
+    win_cnt, playouts, baseline_playouts = prior_match(n_games)
+    print("pattern priors vs uniform priors, 9x9 at 0.5s/move, win:{}, lose:{}, tie:{}, avg_playouts:{:.1f}, "
+          "uniform avg_playouts:{:.1f}".format(win_cnt['win'], win_cnt['lose'], win_cnt['tie'],
+                                               playouts, baseline_playouts))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Self-play throughput with playout cap randomisation: games per hour and samples emitted per mode
+(policy+value targets from full searches, value-only targets from fast searches)
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import time
+from game import Board, Game
+from mcts_alphazero import MCTSPlayer
+from mcts_pure import policy_value_fn
+
+MODES = [
+    ('full', dict()),
+    ('cap_p0.5', dict(fast_n_playout=50, fast_move_prob=0.5)),
+    ('cap_p0.75', dict(fast_n_playout=50, fast_move_prob=0.75)),
+]
+
+
+def run(name, kwargs, n_games, size=8, n_in_row=5, n_playout=400):
+    """the uniform policy of mcts_pure stands in for the network, only the search cost is measured"""
+    game = Game(Board(width=size, height=size, n_in_row=n_in_row))
+    player = MCTSPlayer(policy_value_fn, c_puct=5, n_playout=n_playout, is_selfplay=1, **kwargs)
+    n_policy, n_value = 0, 0
+    t1 = time.time()
+    for i in range(n_games):
+        winner, play_data = game.start_self_play(player, temp=1.0)
+        for state, mcts_prob, winner_z in play_data:
+            if mcts_prob.any():
+                n_policy += 1
+            else:
+                n_value += 1
+    t2 = time.time()
+    print("mode:{}, games_per_hour:{:.0f}, policy_samples:{}, value_only_samples:{}, "
+          "policy_samples_per_hour:{:.0f}".format(name, n_games * 3600.0 / (t2 - t1), n_policy, n_value,
+                                                  n_policy * 3600.0 / (t2 - t1)))
+
+
+if __name__ == '__main__':
+    for name, kwargs in MODES:
+        run(name, kwargs, n_games=5)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Tree reuse and pondering of the MCTS player: visits carried over per move, playouts run during
+the opponent's turn, and strength against an opponent that takes time to think
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import time
+from collections import defaultdict
+from game import Board, Game
+from mcts_pure import MCTSPlayer
+
+
+class SlowPlayer(MCTSPlayer):
+    """pure MCTS that also sleeps before moving, stands in for a human or an external engine"""
+
+    def __init__(self, think_time, **kwargs):
+        super(SlowPlayer, self).__init__(**kwargs)
+        self.think_time = think_time
+
+    def get_action(self, board):
+        time.sleep(self.think_time)
+        return super(SlowPlayer, self).get_action(board)
+
+
+def run(name, kwargs, n_games, think_time, size=8, n_in_row=5, n_playout=300):
+    game = Game(Board(width=size, height=size, n_in_row=n_in_row))
+    player = MCTSPlayer(c_puct=5, n_playout=n_playout, **kwargs)
+    opponent = SlowPlayer(think_time, c_puct=5, n_playout=n_playout)
+    win_cnt = defaultdict(int)
+    for i in range(n_games):
+        winner = game.start_play(player, opponent, start_player=i % 2, is_shown=0)
+        win_cnt['win' if winner == player.player else 'tie' if winner == -1 else 'lose'] += 1
+    print("mode:{}, win:{}, lose:{}, tie:{}, {}".format(
+        name, win_cnt['win'], win_cnt['lose'], win_cnt['tie'], player.search_stats))
+
+
+if __name__ == '__main__':
+    for name, kwargs in [('fresh_tree', {}), ('reuse_tree', dict(reuse_tree=True)), ('ponder', dict(ponder=True))]:
+        run(name, kwargs, n_games=10, think_time=1.0)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Samples per second of the reanalyse role against self-play with the same network and playouts:
+a self-play worker, reanalyse one position at a time (MCTS with policy_value_fn) and reanalyse in
+lock-step batches (reanalyse.Reanalyser), then the training throughput a reanalysed share of the
+mini-batches gains: with a share f, each train step needs (1 - f) of the fresh samples, so one
+reanalyse worker next to each self-play worker lets the trainer run min(1 / (1 - f),
+1 + reanalyse_rate / selfplay_rate) times as many steps per second
+
+Uses checkpoint_best.pth.tar if it exists, an untrained 32x2 network otherwise (the search
+costs are the same, only the targets are meaningless).
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import numpy as np
+import torch
+from compiled_inference import CompiledPolicyValue
+from distill import load_model
+from game import Board, Game
+from mcts_alphazero import MCTS, MCTSPlayer
+from policy_value_net import PolicyValueBackBoneNet
+from reanalyse import Reanalyser, board_from_state
+
+BATCH_SIZES = [16, 64]
+FRACTIONS = [0.25, 0.5]
+
+
+def selfplay_samples(net, size, feature_planes, n_playout, n_games):
+    board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+    game = Game(board)
+    player = MCTSPlayer(net.policy_value_fn, c_puct=5, n_playout=n_playout, is_selfplay=1)
+    samples = []
+    t1 = time.time()
+    for i in range(n_games):
+        winner, play_data = game.start_self_play(player, temp=1.0)
+        samples.extend(list(play_data))
+    return samples, time.time() - t1
+
+
+def sequential_reanalyse(net, samples, size, n_playout):
+    t1 = time.time()
+    for state, mcts_prob, winner in samples:
+        mcts = MCTS(net.policy_value_fn, c_puct=5, n_playout=n_playout)
+        mcts.get_move_probs(board_from_state(state, size, size), temp=1.0)
+        mcts.root_value()
+    return time.time() - t1
+
+
+if __name__ == '__main__':
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    size, feature_planes, n_playout = 9, 8, 100
+    torch.manual_seed(0)
+    np.random.seed(0)
+    if os.path.exists('checkpoint_best.pth.tar'):
+        model = load_model('checkpoint_best.pth.tar', size, size, feature_planes)
+    else:
+        model = PolicyValueBackBoneNet(size * size, feature_planes, channels=32, residual_blocks=2)
+        model.eval()
+    single = CompiledPolicyValue(model, size, size, feature_planes)
+    samples, seconds = selfplay_samples(single, size, feature_planes, n_playout, n_games)
+    selfplay_rate = len(samples) / seconds
+    print("selfplay, n_playout:{}, samples:{}, samples_per_second:{:.2f}".format(n_playout, len(samples),
+                                                                                 selfplay_rate))
+    seconds = sequential_reanalyse(single, samples, size, n_playout)
+    print("reanalyse sequential, samples_per_second:{:.2f}".format(len(samples) / seconds))
+    best_rate = 0.0
+    for batch_size in BATCH_SIZES:
+        net = CompiledPolicyValue(model, size, size, feature_planes, max_batch=batch_size)
+        reanalyser = Reanalyser(net, size, size, n_playout=n_playout, batch_size=batch_size, temp=1.0)
+        t1 = time.time()
+        refreshed = reanalyser.reanalyse(samples)
+        seconds = time.time() - t1
+        rate = len(refreshed) / seconds
+        best_rate = max(best_rate, rate)
+        print("reanalyse batch_size:{}, samples_per_second:{:.2f}, states_per_network_call:{:.1f}, "
+              "mean_policy_change:{:.3f}".format(
+                  batch_size, rate, reanalyser.evaluated_states / float(n_playout * -(-len(samples) // batch_size)),
+                  np.mean([0.5 * np.abs(new[1] - old[1]).sum() for new, old in zip(refreshed, samples)])))
+    for fraction in FRACTIONS:
+        gain = min(1.0 / (1.0 - fraction), 1.0 + best_rate / selfplay_rate)
+        print("reanalysed_fraction:{}, train_steps_per_second gain with one reanalyse worker per self-play "
+              "worker:{:.2f}x".format(fraction, gain))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of drawing a mini-batch from the replay buffer: random.sample on the deque of the training
+pipelines against ReplayBuffer uniform and prioritised (sum tree) sampling, with the priority
+update of a batch, at the buffer sizes of train_parallel and of the distributed trainer
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import random
+from collections import deque
+import numpy as np
+from bench_utils import seconds_per_call
+from replay_buffer import ReplayBuffer
+
+SIZES = [(10000, 512), (4096 * 20, 4096)]  # (buffer_size, batch_size)
+
+
+if __name__ == '__main__':
+    game_length, window = 200, 20
+    for buffer_size, batch_size in SIZES:
+        samples = list(range(buffer_size))
+        data_buffer = deque(samples, maxlen=buffer_size)
+        t_deque = seconds_per_call(lambda: random.sample(data_buffer, batch_size), 20)
+        print("buffer_size:{}, batch_size:{}, deque random.sample ms:{:.3f}".format(
+            buffer_size, batch_size, t_deque * 1000))
+        for prioritized in (False, True):
+            replay = ReplayBuffer(buffer_size, generation_window=window, prioritized=prioritized)
+            # games of increasing generations, the oldest ones fall out of the window
+            n_games = buffer_size // game_length
+            for game_id in range(n_games):
+                replay.extend(samples[:game_length], game_id * 2 * window // n_games, game_id)
+            losses = np.random.exponential(size=batch_size)
+            t_sample = seconds_per_call(lambda: replay.sample(batch_size), 20)
+            ids = replay.sample(batch_size)[0]
+            t_update = seconds_per_call(lambda: replay.update_priorities(ids, losses), 20)
+            print("buffer_size:{}, batch_size:{}, prioritized:{}, sample ms:{:.3f}, update_priorities ms:{:.3f}, "
+                  "{}".format(buffer_size, batch_size, prioritized, t_sample * 1000, t_update * 1000,
+                              replay.summary()))
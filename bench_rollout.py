@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Strength per second of search of the rollout policies of rollout.py: pure MCTS players with
+pattern, network and batched network rollouts play the random-rollout player at the same time
+per move, with the playouts per second and the cost of one rollout of each
+
+The network is checkpoint_student.pth.tar (see distill.py) if it exists, an untrained 16x1
+network otherwise (then it is no better than random, only its cost is meaningful).
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import copy
+import os
+import sys
+import time
+import torch
+from compiled_inference import CompiledPolicyValue
+from distill import load_model
+from game import Board, Game
+from mcts_pure import MCTSPlayer, MCTS, policy_value_fn
+from policy_value_net import PolicyValueBackBoneNet
+from rollout import pattern_rollout_fn, network_rollout_fn, BatchedRollout
+
+
+def seconds_per_rollout(board, n, **kwargs):
+    mcts = MCTS(policy_value_fn, **kwargs)
+    t1 = time.time()
+    for i in range(n):
+        state = copy.deepcopy(board)
+        if mcts._rollout_value is not None:
+            mcts._rollout_value(state)
+        else:
+            mcts._evaluate_rollout(state)
+    return (time.time() - t1) / n
+
+
+def match(kwargs, size, n_games, seconds_per_move):
+    board = Board(width=size, height=size, n_in_row=5)
+    game = Game(board)
+    player = MCTSPlayer(c_puct=5, time_budget=seconds_per_move, **kwargs)
+    baseline = MCTSPlayer(c_puct=5, time_budget=seconds_per_move)
+    win_cnt = {'win': 0, 'lose': 0, 'tie': 0}
+    for i in range(n_games):
+        winner = game.start_play(player, baseline, start_player=i % 2, is_shown=0)
+        if winner == -1:
+            win_cnt['tie'] += 1
+        elif winner == player.player:
+            win_cnt['win'] += 1
+        else:
+            win_cnt['lose'] += 1
+    return win_cnt, player.search_stats, baseline.search_stats
+
+
+if __name__ == '__main__':
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    size, feature_planes, seconds_per_move, n_rollouts = 9, 4, 0.5, 8
+    torch.manual_seed(0)
+    if os.path.exists('checkpoint_student.pth.tar'):
+        model = load_model('checkpoint_student.pth.tar', size, size, feature_planes)
+    else:
+        model = PolicyValueBackBoneNet(size * size, feature_planes, channels=16, residual_blocks=1)
+    net = CompiledPolicyValue(model, size, size, model.feature_planes, max_batch=n_rollouts)
+    policies = [('random', {}),
+                ('pattern', {'rollout_fn': pattern_rollout_fn}),
+                ('network', {'rollout_fn': network_rollout_fn(net)}),
+                ('batched_network', {'rollout_value_fn': BatchedRollout(net, n_rollouts)})]
+    board = Board(width=size, height=size, n_in_row=5, feature_planes=model.feature_planes)
+    board.init_board()
+    for name, kwargs in policies:
+        cost = seconds_per_rollout(board, 20, **kwargs)
+        if name == 'random':
+            print("rollout:random, ms_per_rollout:{:.2f}".format(cost * 1000))
+            continue
+        win_cnt, stats, baseline_stats = match(kwargs, size, n_games, seconds_per_move)
+        summary, baseline_summary = stats.summary(), baseline_stats.summary()
+        print("rollout:{}, ms_per_rollout:{:.2f}, playouts_per_second:{:.0f}, random_playouts_per_second:{:.0f}, "
+              "vs random at {}s/move, win:{}, lose:{}, tie:{}".format(
+                  name, cost * 1000, summary['avg_playouts'] / seconds_per_move,
+                  baseline_summary['avg_playouts'] / seconds_per_move, seconds_per_move,
+                  win_cnt['win'], win_cnt['lose'], win_cnt['tie']))
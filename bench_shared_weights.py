@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Resident memory and reload latency of self-play workers: checkpoint file vs shared memory weights
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import os
+import time
+import multiprocessing
+import torch
+import torch.optim as optim
+from policy_value_net import PolicyValueBackBoneNet
+from checkpoint import save_checkpoint, load_weights
+from shared_weights import SharedWeights, SharedWeightsReader
+
+
+class CpuNet(object):
+    """stand-in for PolicyValueNet with the model on the cpu"""
+
+    def __init__(self, num_actions, feature_planes):
+        self.policy_value_model = PolicyValueBackBoneNet(num_actions, feature_planes)
+        self.policy_value_model.eval()
+
+    def resume(self, checkpoint):
+        self.policy_value_model.resume(checkpoint)
+
+
+def memory_kb():
+    """(rss, pss) of this process, pss charges shared pages proportionally to each mapper"""
+    rss, pss = 0, 0
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    if os.path.exists('/proc/self/smaps_rollup'):
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    return rss, pss
+
+
+def worker(mode, model_file, shared, n_reloads, result_queue, num_actions, feature_planes):
+    torch.set_num_threads(1)
+    net = CpuNet(num_actions, feature_planes)
+    reader = SharedWeightsReader(shared, net) if shared is not None else None
+    latencies = []
+    for i in range(n_reloads):
+        t1 = time.time()
+        if mode == 'full':
+            net.resume(torch.load(model_file, map_location='cpu'))
+        elif mode == 'weights':
+            net.resume(load_weights(model_file))
+        else:
+            reader.generation = -1  # force a remap of the active generation
+            reader.poll()
+        latencies.append(time.time() - t1)
+    x = torch.zeros(1, feature_planes, BOARD_SIZE, BOARD_SIZE)
+    with torch.no_grad():
+        net.policy_value_model(x)
+    result_queue.put((memory_kb(), sum(latencies) / len(latencies)))
+
+
+BOARD_SIZE = 11
+FEATURE_PLANES = 8
+NUM_PROCESS = 8
+
+if __name__ == '__main__':
+    num_actions = BOARD_SIZE * BOARD_SIZE
+    model = PolicyValueBackBoneNet(num_actions, FEATURE_PLANES)
+    optimizer = optim.Adam(model.parameters(), lr=1e-3)
+    probs, value = model(torch.rand(2, FEATURE_PLANES, BOARD_SIZE, BOARD_SIZE))
+    (probs[:, 0].sum() + value.sum()).backward()
+    optimizer.step()  # materialise the adam state, it is as large as the model
+    model_file = 'bench_checkpoint.pth.tar'
+    save_checkpoint({'state_dict': model.state_dict(), 'optim_dict': optimizer.state_dict(),
+                     'generation': 1}, model_file)
+    shared = SharedWeights(model.state_dict())
+    shared.publish(model.state_dict(), 1)
+    print("checkpoint_mb:{:.1f}, weights_mb:{:.1f}, shared_slot_mb:{:.1f}".format(
+        os.path.getsize(model_file) / 2.0 ** 20, os.path.getsize(model_file + '.weights') / 2.0 ** 20,
+        shared.nbytes() / 2.0 ** 20))
+    for mode in ['full', 'weights', 'shared']:
+        result_queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(mode, model_file, shared if mode == 'shared' else None,
+                                                              10, result_queue, num_actions, FEATURE_PLANES))
+                 for i in range(NUM_PROCESS)]
+        for proc in procs:
+            proc.start()
+        results = [result_queue.get() for proc in procs]
+        for proc in procs:
+            proc.join()
+        rss = sum(r[0][0] for r in results) / len(results)
+        pss = sum(r[0][1] for r in results) / len(results)
+        latency = sum(r[1] for r in results) / len(results)
+        print("mode:{}, workers:{}, rss_per_worker_mb:{:.1f}, pss_per_worker_mb:{:.1f}, reload_ms:{:.2f}".format(
+            mode, NUM_PROCESS, rss / 1024.0, pss / 1024.0, latency * 1000))
+    for f in [model_file, model_file + '.weights', model_file + '.gen']:
+        os.remove(f)
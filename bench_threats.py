@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Effect of the threat solver on MCTS: playouts spent on tactical positions and strength against
+the negamax player at equal time per move
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import copy
+import os
+import time
+from collections import defaultdict
+from game import Board, Game
+from mcts_pure import MCTS, MCTSPlayer, policy_value_fn
+from negamax import NegamaxPlayer
+
+# (description, stones as {(row, col): player}, player to move, expected move (row, col))
+POSITIONS = [
+    ('win in one', {(5, 2): 1, (5, 3): 1, (5, 4): 1, (5, 5): 1, (4, 4): 2, (3, 3): 2, (6, 6): 2, (2, 2): 2}, 1, [(5, 1), (5, 6)]),
+    ('block open four', {(5, 2): 2, (5, 3): 2, (5, 4): 2, (5, 5): 2, (4, 4): 1, (3, 3): 1, (6, 6): 1, (2, 8): 1,
+                         (9, 9): 2}, 1, [(5, 1), (5, 6)]),
+    ('open three to open four', {(5, 3): 1, (5, 4): 1, (5, 5): 1, (0, 0): 2, (0, 10): 2, (10, 0): 2}, 1, [(5, 2), (5, 6)]),
+    ('double four', {(4, 0): 2, (4, 1): 1, (4, 2): 1, (4, 3): 1, (0, 4): 2, (1, 4): 1, (2, 4): 1, (3, 4): 1,
+                     (10, 10): 2, (10, 8): 2}, 1, [(4, 4)]),
+]
+
+
+def make_board(stones, player, size=11):
+    board = Board(width=size, height=size, n_in_row=5)
+    board.init_board()
+    board.states = dict(((r * size + c), p) for (r, c), p in stones.items())
+    board.availables = [m for m in range(size * size) if m not in board.states]
+    board.current_player = player
+    return board
+
+
+def playouts_to_solve(board, expected, use_threats, max_playout=5000, check_every=50):
+    """playouts until the most visited root move is one of the expected moves and stays so"""
+    mcts = MCTS(policy_value_fn, c_puct=5, n_playout=max_playout, use_threats=use_threats)
+    expected = set(r * board.width + c for r, c in expected)
+    for n in range(1, max_playout + 1):
+        mcts._playout(copy.deepcopy(board))
+        if n % check_every == 0 or mcts._root._proven is not None:
+            best = max(mcts._root._children.items(), key=lambda act_node: act_node[1]._n_visits)[0]
+            if best in expected:
+                return n, mcts.proven_playouts
+    return max_playout, mcts.proven_playouts
+
+
+def seconds_per_playout(use_threats, n_playout=300):
+    board = make_board(POSITIONS[2][1], 1)
+    mcts = MCTS(policy_value_fn, c_puct=5, n_playout=n_playout, use_threats=use_threats)
+    t1 = time.time()
+    mcts.get_move(board)
+    return (time.time() - t1) / n_playout
+
+
+def match(n_games, seconds_per_move, negamax_path, search_depth=2):
+    board = Board(width=11, height=11, n_in_row=5)
+    game = Game(board)
+    for use_threats in [False, True]:
+        n_playout = max(1, int(seconds_per_move / seconds_per_playout(use_threats)))
+        win_cnt = defaultdict(int)
+        for i in range(n_games):
+            mcts_player = MCTSPlayer(c_puct=5, n_playout=n_playout, use_threats=use_threats)
+            negamax_player = NegamaxPlayer(cmd_path=negamax_path, search_depth=search_depth)
+            win_cnt[game.start_play(mcts_player, negamax_player, start_player=i % 2, is_shown=0)] += 1
+        print("use_threats:{}, n_playout:{}, win: {}, lose: {}, tie:{}".format(
+            use_threats, n_playout, win_cnt[1], win_cnt[2], win_cnt[-1]))
+
+
+if __name__ == '__main__':
+    for name, stones, player, expected in POSITIONS:
+        for use_threats in [False, True]:
+            n, proven = playouts_to_solve(make_board(stones, player), expected, use_threats)
+            print("position:{}, use_threats:{}, playouts_to_solve:{}, proven_playouts:{}".format(
+                name, use_threats, n, proven))
+    negamax_path = 'negamax/build/renju'
+    if os.path.exists(negamax_path):
+        match(n_games=10, seconds_per_move=2.0, negamax_path=negamax_path)
+    else:
+        print("{} not built, skip the match against negamax".format(negamax_path))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Playouts per move, latency percentiles and strength of the MCTS search budgets: fixed playouts,
+fixed playouts with early termination, a time budget per move and a clock for the whole game
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+from collections import defaultdict
+from game import Board, Game
+from mcts_pure import MCTSPlayer
+
+BUDGETS = [
+    ('playouts', dict(n_playout=400)),
+    ('playouts+early_stop', dict(n_playout=400, early_stop=True)),
+    ('time_budget', dict(time_budget=0.5, early_stop=True)),
+    ('game_time', dict(game_time=10.0, early_stop=True)),
+]
+
+
+def run(name, kwargs, n_games, size=8, n_in_row=5, reference_playout=400):
+    game = Game(Board(width=size, height=size, n_in_row=n_in_row))
+    player = MCTSPlayer(c_puct=5, **kwargs)
+    reference = MCTSPlayer(c_puct=5, n_playout=reference_playout)
+    win_cnt = defaultdict(int)
+    for i in range(n_games):
+        winner = game.start_play(player, reference, start_player=i % 2, is_shown=0)
+        win_cnt['win' if winner == player.player else 'tie' if winner == -1 else 'lose'] += 1
+    print("budget:{}, win:{}, lose:{}, tie:{}, {}".format(
+        name, win_cnt['win'], win_cnt['lose'], win_cnt['tie'], player.search_stats))
+
+
+if __name__ == '__main__':
+    for name, kwargs in BUDGETS:
+        run(name, kwargs, n_games=10)
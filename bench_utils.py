@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Timing and positions shared by the bench_*.py scripts
+
+@author: Zhang Tianming
+"""
+import time
+import numpy as np
+from board_batch import BoardBatch, random_moves
+from game import Board
+
+
+def seconds_per_call(fn, n_calls, repeats=5, warmup=3):
+    """seconds per call of fn(): the best of repeats runs of n_calls calls after warmup calls,
+    so one-off costs and timing noise do not hide small differences"""
+    for i in range(warmup):
+        fn()
+    best = float('inf')
+    for r in range(repeats):
+        t1 = time.time()
+        for i in range(n_calls):
+            fn()
+        best = min(best, (time.time() - t1) / n_calls)
+    return best
+
+
+def position(size, feature_planes, seed=0, n_moves=10):
+    """a board after n_moves random moves"""
+    rng = np.random.RandomState(seed)
+    board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+    board.init_board()
+    for i in range(n_moves):
+        board.do_move(board.availables[rng.randint(len(board.availables))])
+    return board
+
+
+def random_states(n, size, feature_planes, seed=0):
+    """feature planes of n positions reached by random play"""
+    rng = np.random.RandomState(seed)
+    batch = BoardBatch(n, size, size, 5, feature_planes)
+    for i in range(rng.randint(4, 20)):
+        batch.do_move(random_moves(batch, rng))
+    return np.ascontiguousarray(batch.current_state())
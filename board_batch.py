@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+BoardBatch: B games of gomoku held as numpy arrays, every operation vectorised over the games
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import time
+import numpy as np
+from game import Board
+
+DIRECTIONS = np.array([(0, 1), (1, 0), (1, 1), (1, -1)])
+
+
+class BoardBatch(object):
+    """B games on (B, H, W) int8 arrays (0 empty, 1 and 2 the players, as in Board.states).
+    Moves are Board moves, i.e. h * width + w. A game that has ended is left alone by do_move
+    (its entry in moves is ignored), so a batch can be stepped until every game is over.
+    """
+
+    def __init__(self, batch_size, width=8, height=8, n_in_row=5, feature_planes=4):
+        self.batch_size = batch_size
+        self.width = width
+        self.height = height
+        self.n_in_row = n_in_row
+        self.feature_planes = feature_planes
+        self.init_board()
+
+    def init_board(self, start_player=0):
+        """start_player: 0 or 1 for every game, or a (B,) array of them"""
+        if self.width < self.n_in_row or self.height < self.n_in_row:
+            raise Exception('board width and height can not less than %d' % self.n_in_row)
+        B = self.batch_size
+        self.states = np.zeros((B, self.height, self.width), dtype=np.int8)
+        # ply at which each stone was played, -1 for empty cells, gives the history planes
+        self.ply = np.full((B, self.height, self.width), -1, dtype=np.int16)
+        self.current_player = (np.zeros(B, dtype=np.int8) + start_player + 1).astype(np.int8)
+        self.last_move = np.full(B, -1, dtype=np.int32)
+        self.move_count = np.zeros(B, dtype=np.int32)
+        self.winner = np.zeros(B, dtype=np.int8)  # 0 while undecided, -1 tie, else the winner
+        self._index = np.arange(B)
+
+    @classmethod
+    def from_boards(cls, boards):
+        """batch holding copies of the given Board positions (all of the same size)"""
+        first = boards[0]
+        batch = cls(len(boards), first.width, first.height, first.n_in_row, first.feature_planes)
+        for i, board in enumerate(boards):
+            for ply, (move, player) in enumerate(board.states.items()):
+                h, w = move // board.width, move % board.width
+                batch.states[i, h, w] = player
+                batch.ply[i, h, w] = ply
+            batch.current_player[i] = board.current_player
+            batch.last_move[i] = board.last_move if board.states else -1
+            batch.move_count[i] = len(board.states)
+        batch.winner[:] = batch._find_winner()
+        return batch
+
+    def legal_mask(self):
+        """(B, H*W) bool, the empty cells of the games still running"""
+        return (self.states.reshape(self.batch_size, -1) == 0) & (self.winner == 0)[:, None]
+
+    def do_move(self, moves):
+        """play moves ((B,) ints) in every running game at once"""
+        moves = np.asarray(moves)
+        active = self.winner == 0
+        idx = self._index[active]
+        moves = moves[active]
+        h, w = moves // self.width, moves % self.width
+        if np.any(self.states[idx, h, w] != 0):
+            raise Exception('move on an occupied cell')
+        self.states[idx, h, w] = self.current_player[idx]
+        self.ply[idx, h, w] = self.move_count[idx]
+        self.last_move[idx] = moves
+        self.move_count[idx] += 1
+        self.current_player[idx] = 3 - self.current_player[idx]
+        self.winner[idx] = self._find_winner(idx)
+
+    def _find_winner(self, idx=None):
+        """winner of the games idx, looking only at the lines through their last move"""
+        idx = self._index if idx is None else idx
+        winner = np.zeros(len(idx), dtype=np.int8)
+        played = self.last_move[idx] >= 0
+        idx = idx[played]
+        if len(idx) == 0:
+            return winner
+        n = self.n_in_row
+        h, w = self.last_move[idx] // self.width, self.last_move[idx] % self.width
+        player = self.states[idx, h, w]
+        # cells at offsets -(n-1)..(n-1) along the 4 directions: (games, 4, 2n-1)
+        offsets = np.arange(-(n - 1), n)
+        hh = h[:, None, None] + DIRECTIONS[None, :, 0, None] * offsets[None, None, :]
+        ww = w[:, None, None] + DIRECTIONS[None, :, 1, None] * offsets[None, None, :]
+        inside = (hh >= 0) & (hh < self.height) & (ww >= 0) & (ww < self.width)
+        cells = self.states[idx[:, None, None], np.clip(hh, 0, self.height - 1), np.clip(ww, 0, self.width - 1)]
+        same = inside & (cells == player[:, None, None])
+        # stones in a row on each side of the last move
+        forward = np.cumprod(same[:, :, n:], axis=2).sum(axis=2)
+        backward = np.cumprod(same[:, :, n - 2::-1], axis=2).sum(axis=2)
+        won = (forward + backward + 1 >= n).any(axis=1)
+        result = np.where(won, player, 0).astype(np.int8)
+        result[(result == 0) & (self.move_count[idx] >= self.width * self.height)] = -1
+        winner[played] = result
+        return winner
+
+    def game_end(self):
+        """(end, winner) arrays: winner is the player, -1 for a tie, as in Board.game_end"""
+        return self.winner != 0, np.where(self.winner == 0, -1, self.winner)
+
+    def current_state(self):
+        """(B, feature_planes, H, W) float32 planes, equal to Board.current_state() of each game
+        (square boards; the history planes 4 and 5 of the 8-plane layout stay empty as there)"""
+        B, planes = self.batch_size, self.feature_planes
+        if planes not in (4, 6, 8):
+            raise Exception('feature_planes should be 4, 6 or 8')
+        square_state = np.zeros((B, planes, self.height, self.width), dtype=np.float32)
+        cur = self.current_player[:, None, None]
+        own = self.states == cur
+        opp = (self.states != 0) & ~own
+        square_state[:, 0] = own
+        square_state[:, 1] = opp
+        if planes >= 6:
+            # stones older than the last two moves
+            old = (self.ply >= 0) & (self.ply < (self.move_count - 2)[:, None, None])
+            square_state[:, 2] = own & old
+            square_state[:, 3] = opp & old
+        played = self.last_move >= 0
+        last_plane = {4: 2, 6: 4, 8: 6}[planes]
+        idx = self._index[played]
+        square_state[idx, last_plane, self.last_move[idx] // self.width, self.last_move[idx] % self.width] = 1.0
+        square_state[self.move_count % 2 == 0, planes - 1] = 1.0
+        return square_state[:, :, ::-1, :]
+
+    def to_board(self, i):
+        """Board of game i, with the moves in the order they were played"""
+        board = Board(width=self.width, height=self.height, n_in_row=self.n_in_row,
+                      feature_planes=self.feature_planes)
+        first_player = self.current_player[i] if self.move_count[i] % 2 == 0 else 3 - self.current_player[i]
+        board.init_board(int(first_player) - 1)
+        cells = np.argwhere(self.ply[i] >= 0)
+        for h, w in sorted(cells.tolist(), key=lambda hw: self.ply[i, hw[0], hw[1]]):
+            board.do_move(h * self.width + w)
+        return board
+
+
+def random_moves(batch, rng):
+    """a uniformly random legal move for every game, 0 for the games that are over"""
+    mask = batch.legal_mask()
+    scores = rng.rand(*mask.shape) * mask
+    return scores.argmax(axis=1)
+
+
+def check_parity(n_games=64, size=11, feature_planes=8, seed=0):
+    """play random games in a batch and on Boards side by side, compare states and endings"""
+    rng = np.random.RandomState(seed)
+    batch = BoardBatch(n_games, size, size, 5, feature_planes)
+    boards = []
+    for i in range(n_games):
+        board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+        board.init_board()
+        boards.append(board)
+    while not batch.game_end()[0].all():
+        moves = random_moves(batch, rng)
+        running = ~batch.game_end()[0]
+        batch.do_move(moves)
+        for i in np.nonzero(running)[0]:
+            boards[i].do_move(moves[i])
+        states = batch.current_state()
+        end, winner = batch.game_end()
+        for i in np.nonzero(running)[0]:
+            if not np.array_equal(states[i], boards[i].current_state()):
+                raise AssertionError('feature planes differ in game {}'.format(i))
+            board_end, board_winner = boards[i].game_end()
+            if board_end != end[i] or (board_end and board_winner != winner[i]):
+                raise AssertionError('game end differs in game {}'.format(i))
+
+
+def boards_per_second(batch_size, size, feature_planes=8, n_steps=30, seed=0):
+    """do_move + game_end + current_state steps per second, counted per board"""
+    rng = np.random.RandomState(seed)
+    batch = BoardBatch(batch_size, size, size, 5, feature_planes)
+    t1 = time.time()
+    for step in range(n_steps):
+        batch.do_move(random_moves(batch, rng))
+        batch.game_end()
+        batch.current_state()
+    return batch_size * n_steps / (time.time() - t1)
+
+
+def scalar_boards_per_second(size, feature_planes=8, n_steps=30, seed=0):
+    rng = np.random.RandomState(seed)
+    board = Board(width=size, height=size, n_in_row=5, feature_planes=feature_planes)
+    board.init_board()
+    t1 = time.time()
+    for step in range(n_steps):
+        board.do_move(board.availables[rng.randint(len(board.availables))])
+        board.game_end()
+        board.current_state()
+    return n_steps / (time.time() - t1)
+
+
+if __name__ == '__main__':
+    check_parity()
+    print("parity with Board: ok")
+    for size in [11, 15, 19]:
+        print("board:{}x{}, scalar Board, boards_per_second:{:.0f}".format(size, size, scalar_boards_per_second(size)))
+        for batch_size in [64, 256, 1024]:
+            print("board:{}x{}, batch_size:{}, boards_per_second:{:.0f}".format(
+                size, size, batch_size, boards_per_second(batch_size, size)))
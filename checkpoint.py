@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint writing and loading helpers
+
+A checkpoint `name` is written as three files:
+    name          -- full training state (state_dict, optim_dict, generation, arch, ...) for resuming
+    name.weights  -- state_dict, generation and arch only, what inference workers load
+    name.gen      -- the generation number as text, written last, so seeing generation N
+                     guarantees the weights of generation N are in place
+
+@author: Zhang Tianming
+"""
+import os
+import shutil
+import threading
+import torch
+
+WEIGHTS_KEYS = ('state_dict', 'generation', 'arch')
+
+
+def to_cpu(obj):
+    """copy every tensor in a (nested) state dict to host memory"""
+    if torch.is_tensor(obj):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, dict):
+        return type(obj)((k, to_cpu(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def save_atomic(state, filename):
+    """write to a temporary file and move it in place, readers never see a partial file"""
+    torch.save(state, filename + '.undone')
+    shutil.move(filename + '.undone', filename)
+
+
+def weights_path(filename):
+    return filename + '.weights'
+
+
+def generation_path(filename):
+    return filename + '.gen'
+
+
+def save_checkpoint(state, filename):
+    """write the full state, the weights-only artifact and finally the generation marker"""
+    save_atomic(state, filename)
+    save_atomic(dict((k, state[k]) for k in WEIGHTS_KEYS if k in state), weights_path(filename))
+    if 'generation' in state:
+        with open(generation_path(filename) + '.undone', 'w') as f:
+            f.write(str(state['generation']))
+        shutil.move(generation_path(filename) + '.undone', generation_path(filename))
+
+
+def read_generation(filename):
+    """generation of the latest checkpoint written under filename, -1 if there is none;
+    only reads the small marker file, so it is cheap enough to poll after every game"""
+    try:
+        with open(generation_path(filename)) as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return -1
+
+
+def load_weights(filename, mmap=True):
+    """load the weights-only artifact on the cpu, memory-mapped when torch supports it so
+    tensors are paged in lazily as they are copied into the model;
+    falls back to the full checkpoint for files written before the split"""
+    path = weights_path(filename)
+    if not os.path.exists(path):
+        path = filename
+    try:
+        return torch.load(path, map_location='cpu', mmap=mmap, weights_only=True)
+    except TypeError:  # torch < 2.1 has no mmap/weights_only
+        return torch.load(path, map_location='cpu')
+
+
+class AsyncCheckpointWriter(object):
+    """Writes checkpoints in a background thread.
+    The state is copied to host memory on the caller's thread, so training can keep updating
+    the parameters while the file is written. A save requested while the previous one is still
+    being written replaces the pending one instead of queueing up.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def save(self, state, filename):
+        state = to_cpu(state)
+        with self._cond:
+            self._pending = (state, filename)
+            self._cond.notify_all()
+
+    def wait(self):
+        """block until every requested checkpoint is on disk"""
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                state, filename = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                save_checkpoint(state, filename)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled inference path for the policy-value network: a traced (or torch.compile'd) module called
+through a fixed entry point that reads a preallocated input tensor and writes into preallocated
+output buffers, so a call allocates nothing and skips the autograd bookkeeping.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import torch
+from policy_value_net import candidate_priors
+from shared_weights import unwrap
+
+MODES = ('trace', 'compile', 'eager')
+
+
+class CompiledPolicyValue(object):
+    """Inference-only wrapper around a PolicyValueBackBoneNet.
+    input_buffer is a (max_batch, feature_planes, width, height) host array, fill its first n rows
+    and call run(n); act_probs and value are host arrays holding the results in their first n rows.
+    The buffers are reused by every call, copy the results out if they must outlive the next one.
+    With freeze=True the weights are baked into the compiled graph (batch norm folded into the
+    convolutions), call update() after the weights of the model change.
+    """
+
+    def __init__(self, model, board_width, board_height, feature_planes=4, max_batch=1,
+                 mode='trace', freeze=True):
+        if mode not in MODES:
+            raise Exception('mode should be one of %s' % ', '.join(MODES))
+        self.model = unwrap(model)
+        self.board_width = board_width
+        self.board_height = board_height
+        self.feature_planes = feature_planes
+        self.max_batch = max_batch
+        self.mode = mode
+        self.freeze = freeze
+        self.device = next(self.model.parameters()).device
+        pin = self.device.type == 'cuda'
+        shape = (max_batch, feature_planes, board_width, board_height)
+        # host side, shared with numpy without a copy
+        self._input = torch.zeros(shape, pin_memory=pin)
+        self._act_probs = torch.zeros((max_batch, board_width * board_height), pin_memory=pin)
+        self._value = torch.zeros((max_batch, 1), pin_memory=pin)
+        self.input_buffer = self._input.numpy()
+        self.act_probs = self._act_probs.numpy()
+        self.value = self._value.numpy()
+        # device side input, the host buffer itself on the cpu
+        self._copy_input = self.device.type != 'cpu'
+        self._device_input = self._input.to(self.device) if self._copy_input else self._input
+        self.update()
+
+    def update(self):
+        """(re)build the compiled module from the current weights of the model"""
+        self.model.eval()
+        example = self._device_input[:1]
+        with torch.no_grad():
+            if self.mode == 'trace':
+                module = torch.jit.trace(self.model, example)
+            elif self.mode == 'compile':
+                module = torch.compile(self.model, dynamic=True)
+            else:
+                module = self.model
+            if self.freeze and self.mode == 'trace':
+                module = torch.jit.optimize_for_inference(torch.jit.freeze(module))
+            self.module = module
+            # the first calls of a compiled module do the optimisation work
+            for i in range(3):
+                self.module(example)
+
+    def run(self, n=1):
+        """evaluate the first n rows of input_buffer into act_probs and value"""
+        with torch.inference_mode():
+            x = self._device_input[:n]
+            if self._copy_input:
+                x.copy_(self._input[:n], non_blocking=True)
+            act_probs, value = self.module(x)
+            self._act_probs[:n].copy_(act_probs)
+            self._value[:n].copy_(value)
+        return self.act_probs[:n], self.value[:n]
+
+    def policy_value(self, state_batch):
+        """(N, feature_planes, width, height) states -> (N, width*height) probs and (N, 1) values,
+        N at most max_batch; the results are views of the output buffers"""
+        n = len(state_batch)
+        self.input_buffer[:n] = state_batch
+        return self.run(n)
+
+    def policy_value_fn(self, board):
+        """
+        input: board
+        output: a list of (action, probability) tuples for each available action and the score of the board state
+        """
+        self.input_buffer[0] = board.current_state().reshape(self.feature_planes, self.board_width,
+                                                             self.board_height)
+        act_probs, value = self.run(1)
+        legal_positions, act_probs = candidate_priors(board, act_probs[0])
+        act_probs = zip(legal_positions, act_probs)
+        return act_probs, float(value[0][0])
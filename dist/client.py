@@ -53,11 +53,13 @@ def download(data_server_url, file_name, save_path):
         return True
 
 
-def upload_samples(data_server_url, samples):
+def upload_samples(data_server_url, samples, generation=None):
+    """generation: of the model that produced the samples, recorded in the file name"""
     tmp_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'temp/')
     if not os.path.exists(tmp_dir):
         os.mkdir(tmp_dir)
-    samples_path = os.path.join(tmp_dir, 'samples.' + str(int(time.time())) + '_' + str(uuid.uuid4()) + '.pkl')
+    tag = '' if generation is None else '.g' + str(generation)
+    samples_path = os.path.join(tmp_dir, 'samples.' + str(int(time.time())) + '_' + str(uuid.uuid4()) + tag + '.pkl')
     with open(samples_path, 'wb') as pickle_file:
         pickle.dump(samples, pickle_file, 2)
     upload(data_server_url, samples_path)
@@ -82,6 +84,32 @@ def download_samples():
     return samples
 
 
+def samples_generation(file_name):
+    """generation recorded by upload_samples in file_name, 0 if there is none"""
+    parts = file_name.split('.')
+    if len(parts) > 3 and parts[-2].startswith('g') and parts[-2][1:].isdigit():
+        return int(parts[-2][1:])
+    return 0
+
+
+def download_games():
+    """like download_samples, one (generation, samples) per uploaded file (a game per file)"""
+    games = []
+    fs = os.listdir(TunnelPath)
+    fs.sort()
+    for f in fs:
+        if not f.startswith('samples.'):
+            continue
+        try:
+            with open(os.path.join(TunnelPath, f), 'r') as pickle_file:
+                games.append((samples_generation(f), pickle.load(pickle_file)))
+            os.remove(os.path.join(TunnelPath, f))
+        except Exception, e:
+            print e
+            continue
+    return games
+
+
 if __name__ == '__main__':
     DIST_DATA_URL = 'http://10.83.150.55:8000/'
     while True:
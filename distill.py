@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Distillation of a small student network from a teacher PolicyValueNet checkpoint, trained on stored
+self-play positions with the teacher's outputs as targets (policy KL + value MSE)
+
+The student is saved in the normal checkpoint format, its arch record carries the smaller trunk,
+so PolicyValueNet(checkpoint=...) or CompiledPolicyValue load it like any other model. It serves
+as the policy_value_fn of MCTSPlayer or, through rollout.network_rollout_fn, guides the rollouts
+of mcts_pure.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import argparse
+import glob
+import random
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+from checkpoint import save_checkpoint, load_weights
+from policy_value_net import PolicyValueBackBoneNet
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle  # py3k
+
+
+def load_samples(paths):
+    """(state, mcts_prob, winner) samples of the given pickle files, e.g. the samples.*.pkl
+    uploads of the distributed self-play workers"""
+    samples = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            samples.extend(pickle.load(f))
+    return samples
+
+
+def save_samples(samples, filename):
+    with open(filename, 'wb') as f:
+        pickle.dump(samples, f, 2)
+
+
+def load_model(model_file, board_width, board_height, feature_planes, device='cpu'):
+    """network of a checkpoint in eval mode, the trunk size comes from its arch record"""
+    checkpoint = load_weights(model_file)
+    arch = checkpoint.get('arch') or {}
+    board_width = arch.get('board_width', board_width)
+    board_height = arch.get('board_height', board_height)
+    feature_planes = arch.get('feature_planes', feature_planes)
+    model = PolicyValueBackBoneNet(board_width * board_height, feature_planes, checkpoint).to(device)
+    model.eval()
+    return model
+
+
+def save_student(student, filename, board_width, board_height, teacher_file=None, generation=0):
+    state = {'state_dict': student.state_dict(),
+             'generation': generation,
+             'arch': {'board_width': board_width,
+                      'board_height': board_height,
+                      'feature_planes': student.feature_planes,
+                      'channels': student.channels,
+                      'residual_blocks': student.residual_blocks},
+             'teacher': teacher_file}
+    save_checkpoint(state, filename)
+
+
+class Distiller(object):
+    """trains student to match teacher: KL(teacher policy || student policy) + value_weight * MSE
+    between the values, on states only (the stored mcts_probs and winners are not used)"""
+
+    def __init__(self, teacher, student, lr=1e-3, value_weight=1.0, weight_decay=1e-4):
+        self.teacher = teacher
+        self.student = student
+        self.value_weight = value_weight
+        self.device = next(student.parameters()).device
+        self.optimizer = optim.Adam(student.parameters(), lr=lr, weight_decay=weight_decay)
+        self.teacher.eval()
+
+    def _losses(self, state_batch):
+        with torch.no_grad():
+            teacher_probs, teacher_value = self.teacher(state_batch)
+        student_probs, student_value = self.student(state_batch)
+        kl = (teacher_probs * ((teacher_probs + 1e-10).log() - (student_probs + 1e-10).log())).sum(dim=-1).mean()
+        value_mse = F.mse_loss(student_value, teacher_value)
+        return kl, value_mse, teacher_probs, student_probs
+
+    def _tensor(self, states):
+        return torch.from_numpy(np.ascontiguousarray(states, dtype=np.float32)).to(self.device)
+
+    def train_step(self, states):
+        self.student.train()
+        kl, value_mse, _, _ = self._losses(self._tensor(states))
+        loss = kl + self.value_weight * value_mse
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+        return loss.item(), kl.item(), value_mse.item()
+
+    def evaluate(self, states, batch_size=256):
+        """kl, value_mse and top-1 move agreement with the teacher on states"""
+        self.student.eval()
+        kl_sum, mse_sum, agree = 0.0, 0.0, 0
+        with torch.no_grad():
+            for start in range(0, len(states), batch_size):
+                batch = states[start:start + batch_size]
+                kl, value_mse, teacher_probs, student_probs = self._losses(self._tensor(batch))
+                kl_sum += kl.item() * len(batch)
+                mse_sum += value_mse.item() * len(batch)
+                agree += (teacher_probs.argmax(dim=-1) == student_probs.argmax(dim=-1)).sum().item()
+        n = float(len(states))
+        return kl_sum / n, mse_sum / n, agree / n
+
+    def fit(self, states, epochs=5, batch_size=256, val_states=None):
+        """epochs passes over states in random order, prints the losses after each one"""
+        order = list(range(len(states)))
+        for epoch in range(epochs):
+            t1 = time.time()
+            random.shuffle(order)
+            losses = []
+            for start in range(0, len(order), batch_size):
+                losses.append(self.train_step(states[order[start:start + batch_size]]))
+            loss, kl, value_mse = np.mean(losses, axis=0)
+            line = "epoch:{}, loss:{:.4f}, kl:{:.4f}, value_mse:{:.4f}, time_used:{:.3f}".format(
+                epoch + 1, loss, kl, value_mse, time.time() - t1)
+            if val_states is not None:
+                line += ", val_kl:{:.4f}, val_value_mse:{:.4f}, val_top1_agreement:{:.3f}".format(
+                    *self.evaluate(val_states, batch_size))
+            print(line)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='distil a small policy-value network from a teacher checkpoint')
+    parser.add_argument('--teacher', default='checkpoint_best.pth.tar', type=str, help='teacher checkpoint')
+    parser.add_argument('--samples', default='dist/data/samples.*.pkl', type=str,
+                        help='glob of pickled self-play samples')
+    parser.add_argument('--student', default='checkpoint_student.pth.tar', type=str, help='student checkpoint')
+    parser.add_argument('--board_size', default=11, type=int)
+    parser.add_argument('--feature_planes', default=8, type=int)
+    parser.add_argument('--channels', default=32, type=int, help='student trunk channels')
+    parser.add_argument('--residual_blocks', default=2, type=int, help='student residual blocks')
+    parser.add_argument('--epochs', default=10, type=int)
+    parser.add_argument('--batch_size', default=256, type=int)
+    parser.add_argument('--lr', default=1e-3, type=float)
+    parser.add_argument('--val_ratio', default=0.05, type=float, help='fraction of the samples held out')
+    return parser.parse_args()
+
+
+def main(args):
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    teacher = load_model(args.teacher, args.board_size, args.board_size, args.feature_planes, device)
+    samples = load_samples(sorted(glob.glob(args.samples)))
+    states = np.array([sample[0] for sample in samples], dtype=np.float32)
+    np.random.shuffle(states)
+    n_val = int(len(states) * args.val_ratio)
+    print("samples:{}, held_out:{}".format(len(states), n_val))
+    student = PolicyValueBackBoneNet(teacher.num_actions, teacher.feature_planes,
+                                     channels=args.channels, residual_blocks=args.residual_blocks).to(device)
+    distiller = Distiller(teacher, student, lr=args.lr)
+    distiller.fit(states[n_val:], args.epochs, args.batch_size, val_states=states[:n_val] if n_val else None)
+    save_student(student, args.student, args.board_size, args.board_size, teacher_file=args.teacher)
+
+
+if __name__ == '__main__':
+    main(parse_arguments())
@@ -17,6 +17,8 @@ class Board(object):
         self.states = {} # board states, key:move as location on the board, value:player as pieces type
         self.n_in_row = int(kwargs.get('n_in_row', 5)) # need how many pieces in a row to win
         self.feature_planes = int(kwargs.get('feature_planes', 4))
+        # only offer moves within this Chebyshev distance of a stone, 0 offers every available move
+        self.candidate_distance = int(kwargs.get('candidate_distance', 0))
         self.players = [1, 2] # player1 and player2
         
     def init_board(self, start_player=0):
@@ -25,7 +27,9 @@ class Board(object):
         self.current_player = self.players[start_player]  # start player        
         self.availables = list(range(self.width * self.height)) # available moves 
         self.states = {} # board states, key:move as location on the board, value:player as pieces type
+        self.moves = [] # the moves played so far, in order
         self.last_move = -1
+        self.candidates = set() # empty cells near the stones, maintained when candidate_distance > 0
 
     def move_to_location(self, move):
         """       
@@ -101,8 +105,29 @@ class Board(object):
     def do_move(self, move):
         self.states[move] = self.current_player
         self.availables.remove(move)
+        self.moves.append(move)
         self.current_player = self.players[0] if self.current_player == self.players[1] else self.players[1] 
         self.last_move = move
+        if self.candidate_distance > 0:
+            self.update_candidates(move)
+
+    def update_candidates(self, move):
+        """add the empty cells around the new stone, drop the stone's own cell"""
+        d = self.candidate_distance
+        h, w = move // self.width, move % self.width
+        self.candidates.discard(move)
+        for i in range(max(0, h - d), min(self.height, h + d + 1)):
+            for j in range(max(0, w - d), min(self.width, w + d + 1)):
+                m = i * self.width + j
+                if m not in self.states:
+                    self.candidates.add(m)
+
+    def candidate_moves(self):
+        """moves worth searching: the cells near existing stones when candidate_distance > 0,
+        every available move otherwise (or on an empty board)"""
+        if self.candidate_distance > 0 and self.candidates:
+            return sorted(self.candidates)
+        return self.availables
 
     def has_a_winner(self):
         width = self.width
@@ -185,9 +210,11 @@ class Game(object):
                     print('.'.center(4), end='')
             print()
 
-    def start_play(self, player1, player2, start_player=0, is_shown=1):
+    def start_play(self, player1, player2, start_player=0, is_shown=1, is_stopped=None):
         """
         start a game between two players
+        is_stopped: optional callable checked before every move, the game is abandoned
+        and None is returned as soon as it returns True
         """
         if start_player not in (0,1):
             raise Exception('start_player should be 0 (player1 first) or 1 (player2 first)')
@@ -195,10 +222,16 @@ class Game(object):
         p1, p2 = self.board.players
         player1.set_player_ind(p1)
         player2.set_player_ind(p2)
+        for player in (player1, player2):
+            # new game: drop the search tree and restart the clock of the MCTS players
+            if hasattr(player, 'reset_player'):
+                player.reset_player()
         players = {p1: player1, p2:player2}
         if is_shown:
             self.graphic(self.board, player1.player, player2.player)
         while(1):
+            if is_stopped is not None and is_stopped():
+                return None
             current_player = self.board.get_current_player()
             player_in_turn = players[current_player]
             move = player_in_turn.get_action(self.board)
@@ -207,6 +240,10 @@ class Game(object):
                 self.graphic(self.board, player1.player, player2.player)
             end, winner = self.board.game_end()
             if end:
+                for player in (player1, player2):
+                    # stops pondering players
+                    if hasattr(player, 'reset_player'):
+                        player.reset_player()
                 if is_shown:
                     if winner != -1:
                         print("Game end. Winner is", players[winner])
@@ -215,13 +252,19 @@ class Game(object):
                 return winner   
             
             
-    def start_self_play(self, player, is_shown=0, temp=1e-6):
+    def start_self_play(self, player, is_shown=0, temp=1e-6, resign=None):
         """ start a self-play game using a MCTS player, reuse the search tree
         store the self-play data: (state, mcts_probs, z)
+        moves the player searched with its fast playout cap get all-zero mcts_probs,
+        they are value targets only
+        resign: optional ResignPolicy, the side to move resigns once the root value of its search
+        falls below the threshold, the opponent is the winner and z is set as for a finished game
         """
         self.board.init_board()        
         p1, p2 = self.board.players
         states, mcts_probs, current_players = [], [], []
+        resign_enabled = resign is not None and resign.new_game()
+        min_values = {p1: 1.0, p2: 1.0}  # lowest root value seen by each side
         move_for_annealing = 30*2
         temp_for_anneling = 1e-6
         while(1):
@@ -230,15 +273,30 @@ class Game(object):
             else:
                 move, move_probs = player.get_action(self.board, temp=temp_for_anneling, return_prob=1)
             move_for_annealing -= 1
+            if getattr(player, 'last_move_fast', False):
+                move_probs = np.zeros_like(move_probs)
             # store the data
             states.append(self.board.current_state())
             mcts_probs.append(move_probs)
             current_players.append(self.board.current_player)
-            # perform a move
-            self.board.do_move(move)
-            if is_shown:
-                self.graphic(self.board, p1, p2)
-            end, winner = self.board.game_end()
+            resigned = False
+            if resign is not None and not getattr(player, 'last_move_fast', False):
+                # fast searches are too noisy to resign on
+                value = player.last_root_value
+                min_values[self.board.current_player] = min(min_values[self.board.current_player], value)
+                resigned = resign_enabled and resign.should_resign(value)
+            if resigned:
+                end = True
+                winner = p1 if self.board.current_player == p2 else p2
+                resign.record_resignation()
+            else:
+                # perform a move
+                self.board.do_move(move)
+                if is_shown:
+                    self.graphic(self.board, p1, p2)
+                end, winner = self.board.game_end()
+                if end and resign is not None and not resign_enabled:
+                    resign.record_playthrough(min_values, winner)
             if end:
                 # winner from the perspective of the current player of each state
                 winners_z = np.zeros(len(current_players))  
@@ -248,6 +306,8 @@ class Game(object):
                 #reset MCTS root node
                 player.reset_player() 
                 if is_shown:
+                    if resigned:
+                        print("Player", self.board.current_player, "resigns")
                     if winner != -1:
                         print("Game end. Winner is player:", winner)
                     else:
@@ -1,20 +1,26 @@
 import torch
 from game import Board, Game
 from policy_value_net import PolicyValueNet
+from checkpoint import load_weights
 from mcts_pure import MCTSPlayer as MCTS_Pure
 from mcts_alphazero import MCTSPlayer
 from negamax import NegamaxPlayer
 import viewer
 import numpy as np
 import sys
+import time
 
 class Gomoku(object):
-    def __init__(self):
+    def __init__(self, ponder=False):
+        """ponder -- play the network's MCTS player, which keeps its search tree between moves and
+        searches while the human thinks, instead of the negamax engine"""
         self.width, self.height = 19, 19
         feature_planes = 8
         n = 5
         model_file = 'checkpoint_best.pth.tar'
-        self.board = Board(width=self.width, height=self.height, n_in_row=n)
+        # restrict the MCTS players to cells near the stones, most of the 19x19 board is irrelevant
+        self.board = Board(width=self.width, height=self.height, n_in_row=n, feature_planes=feature_planes,
+                           candidate_distance=2)
         self.board.init_board(start_player=0)
         # checkpoint = torch.load(model_file)
         # best_policy_model = PolicyValueNet(width, height, feature_planes, mode='eval', checkpoint=checkpoint)
@@ -23,7 +29,12 @@ class Gomoku(object):
 
         # uncomment the following line to play with pure MCTS (its much weaker even with a larger n_playout)
         # ai_player = MCTS_Pure(c_puct=5, n_playout=1000)
-        ai_player = NegamaxPlayer(cmd_path='negamax/build/renju',search_depth=2)
+        if ponder:
+            best_policy_model = PolicyValueNet(self.width, self.height, feature_planes, mode='eval',
+                                               checkpoint=load_weights(model_file))
+            ai_player = MCTSPlayer(best_policy_model.policy_value_fn, c_puct=5, n_playout=400, ponder=True)
+        else:
+            ai_player = NegamaxPlayer(cmd_path='negamax/build/renju',search_depth=2)
         self.ai_player = ai_player
         self.waiting_for_play = True
         self.chessboard = np.zeros((self.height,self.width))
@@ -45,6 +56,8 @@ class Gomoku(object):
         return self.chessboard
 
     def run(self,ai_fist=False):
+        if hasattr(self.ai_player, 'reset_player'):
+            self.ai_player.reset_player()
         if ai_fist:
             ai_role = 1
             human_role = 2
@@ -61,7 +74,8 @@ class Gomoku(object):
         end, winner = self.board.game_end()
         while not end:
             while self.waiting_for_play:
-                pass
+                # sleep rather than spin, a pondering AI player needs the interpreter meanwhile
+                time.sleep(0.01)
             end, winner = self.board.game_end()
             if end:
                 if winner != -1:
@@ -84,15 +98,26 @@ class Gomoku(object):
             self.waiting_for_play = True
         
     def end_game(self, role):
+        if hasattr(self.ai_player, 'reset_player'):
+            self.ai_player.reset_player()
         if role == 'Nobody':
             print("Tie")
         else:
             print(role + " Win")
         self.ui.gameend(role)
 
+    def stop(self):
+        """stop the AI player's pondering, e.g. when the window is closed during a game"""
+        if hasattr(self.ai_player, 'reset_player'):
+            self.ai_player.reset_player()
+
 
 if __name__=='__main__':
-    gomoku = Gomoku()
+    # python human_play_ui.py --ponder: play the network's MCTS player, pondering on the human's time
+    gomoku = Gomoku(ponder='--ponder' in sys.argv[1:])
     print('game start ......')
-    gomoku.run(ai_fist=False)
+    try:
+        gomoku.run(ai_fist=False)
+    finally:
+        gomoku.stop()
     print('game over.')
@@ -7,6 +7,8 @@ to guide the tree search and evaluate the leaf nodes
 """
 import numpy as np
 import copy 
+import time
+from mcts_tree import TreeSearch, TreePlayer
 
 
 def softmax(x):
@@ -14,132 +16,57 @@ def softmax(x):
     probs /= np.sum(probs)
     return probs
 
-class TreeNode(object):
-    """A node in the MCTS tree. Each node keeps track of its own value Q, prior probability P, and
-    its visit-count-adjusted prior score u.
-    """
-
-    def __init__(self, parent, prior_p):
-        self._parent = parent
-        self._children = {}  # a map from action to TreeNode
-        self._n_visits = 0
-        self._Q = 0
-        self._u = 0
-        self._P = prior_p
-
-    def expand(self, action_priors):
-        """Expand tree by creating new children.
-        action_priors -- output from policy function - a list of tuples of actions
-            and their prior probability according to the policy function.
-        """
-        for action, prob in action_priors:
-            if action not in self._children:
-                self._children[action] = TreeNode(self, prob)
-
-    def select(self, c_puct):
-        """Select action among children that gives maximum action value, Q plus bonus u(P).
-        Returns:
-        A tuple of (action, next_node)
-        """
-        return max(self._children.items(), key=lambda act_node: act_node[1].get_value(c_puct))
-
-    def update(self, leaf_value):
-        """Update node values from leaf evaluation.
-        Arguments:
-        leaf_value -- the value of subtree evaluation from the current player's perspective.        
-        """
-        # Count visit.
-        self._n_visits += 1
-        # Update Q, a running average of values for all visits.
-        self._Q += 1.0*(leaf_value - self._Q) / self._n_visits
-
-    def update_recursive(self, leaf_value):
-        """Like a call to update(), but applied recursively for all ancestors.
-        """
-        # If it is not root, this node's parent should be updated first.
-        if self._parent:
-            self._parent.update_recursive(-leaf_value)
-        self.update(leaf_value)
-
-    def get_value(self, c_puct):
-        """Calculate and return the value for this node: a combination of leaf evaluations, Q, and
-        this node's prior adjusted for its visit count, u
-        c_puct -- a number in (0, inf) controlling the relative impact of values, Q, and
-            prior probability, P, on this node's score.
-        """
-        self._u = c_puct * self._P * np.sqrt(self._parent._n_visits) / (1 + self._n_visits)
-        return self._Q + self._u
-
-    def is_leaf(self):
-        """Check if leaf node (i.e. no nodes below this have been expanded).
-        """
-        return self._children == {}
-
-    def is_root(self):
-        return self._parent is None
-
-
-class MCTS(object):
+class MCTS(TreeSearch):
     """A simple implementation of Monte Carlo Tree Search.
     """
 
-    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000):
+    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000, use_threats=False, vcf_depth=3,
+                 early_stop=False, check_every=16, node_budget=None, prune_ratio=0.75):
         """Arguments:
         policy_value_fn -- a function that takes in a board state and outputs a list of (action, probability)
             tuples and also a score in [-1, 1] (i.e. the expected value of the end game score from 
             the current player's perspective) for the current player.
-        c_puct -- a number in (0, inf) that controls how quickly exploration converges to the
-            maximum-value policy, where a higher value means relying on the prior more
+        the others as in mcts_tree.TreeSearch
         """
-        self._root = TreeNode(None, 1.0)
+        super(MCTS, self).__init__(c_puct, n_playout, use_threats, vcf_depth, early_stop, check_every,
+                                   node_budget, prune_ratio)
         self._policy = policy_value_fn
-        self._c_puct = c_puct
-        self._n_playout = n_playout
 
-    def _playout(self, state):
+    def _playout(self, state, first_action=None):
         """Run a single playout from the root to the leaf, getting a value at the leaf and
         propagating it back through its parents. State is modified in-place, so a copy must be
         provided.
         Arguments:
         state -- a copy of the state.
+        first_action -- root child the playout has to go through, selected by PUCT if None
         """
-        node = self._root
-        while(1):            
-            if node.is_leaf():
-                break                
-            # Greedily select next move.
-            action, node = node.select(self._c_puct)            
-            state.do_move(action)
-
+        leaf = self._select_leaf(state, first_action)
+        if leaf is None:
+            return
         # Evaluate the leaf using a network which outputs a list of (action, probability)
         # tuples p and also a score v in [-1, 1] for the current player.
         action_probs, leaf_value = self._policy(state)
-        # Check for end of game.
-        end, winner = state.game_end()
-        if not end:
-            node.expand(action_probs)
-        else:
-            # for end state，return the "true" leaf_value
-            if winner == -1:  # tie
-                leaf_value = 0.0
-            else:
-                leaf_value = 1.0 if winner == state.get_current_player() else -1.0
-
-        # Update value and visit count of nodes in this traversal.
-        node.update_recursive(-leaf_value)
+        self._backup_leaf(leaf, action_probs, leaf_value)
 
-    def get_move_probs(self, state, temp=1e-3):
-        """Runs all playouts sequentially and returns the available actions and their corresponding probabilities 
+    def get_move_probs(self, state, temp=1e-3, time_budget=None, n_playout=None):
+        """Runs the playouts sequentially and returns the available actions and their corresponding probabilities 
         Arguments:
         state -- the current state, including both game state and the current player.
         temp -- temperature parameter in (0, 1] that controls the level of exploration
+        time_budget -- seconds to search instead of n_playout playouts
+        n_playout -- playouts of this search if not the default
         Returns:
         the available actions and the corresponding probabilities 
         """        
-        for n in range(self._n_playout):
-            state_copy = copy.deepcopy(state)
-            self._playout(state_copy)
-  
+        self._search(state, time_budget, n_playout)
+        return self.move_probs(temp)
+
+    def move_probs(self, temp=1e-3):
+        """the root moves and their probabilities from the visit counts of the search so far"""
+        solved = self.solved_moves()
+        if solved is not None:
+            # the root is solved, the moves reaching the proven value share the probability
+            return solved, np.ones(len(solved)) / len(solved)
         # calc the move probabilities based on the visit counts at the root node
         act_visits = [(act, node._n_visits+1e-10) for act, node in self._root._children.items()]
         acts, visits = zip(*act_visits)
@@ -147,46 +74,172 @@ class MCTS(object):
          
         return acts, act_probs
 
-    def update_with_move(self, last_move):
-        """Step forward in the tree, keeping everything we already know about the subtree.
+    def gumbel_move_probs(self, state, n_playout=None, m=16, add_noise=True, c_visit=50, c_scale=1.0):
+        """Gumbel root search (Danihelka et al., Policy improvement by planning with Gumbel):
+        sample the top m root moves by Gumbel noise + prior logits, spread the playouts over them
+        by sequential halving on g + logits + sigma(q), and return the improved policy
+        softmax(logits + sigma(completed q)) as the target together with the chosen move.
+        Below the root the playouts select by PUCT as usual.
+        Arguments:
+        n_playout -- playouts of this search, the player's n_playout unless given
+        m -- number of root moves considered
+        add_noise -- sample the Gumbel noise (self-play), without it the search is deterministic
+        c_visit, c_scale -- scale of the q term sigma(q) = (c_visit + max visits) * c_scale * q
+        Returns:
+        the available actions, the improved policy over them and the selected action
         """
-        if last_move in self._root._children:
-            self._root = self._root._children[last_move]
-            self._root._parent = None
+        n_playout = self._n_playout if n_playout is None else n_playout
+        n = 0
+        if self._root.is_leaf():
+            # evaluate and expand the root
+            self._playout(copy.deepcopy(state))
+            n += 1
+        solved = self.solved_moves()
+        if solved is not None or self._root._proven is not None or self._root.is_leaf():
+            acts = solved if solved is not None else list(self._root._children.keys())
+            self.last_playouts, self.last_stopped_early = n, True
+            if not acts:
+                return [], np.zeros(0), None
+            probs = np.ones(len(acts)) / len(acts)
+            return acts, probs, acts[0]
+        acts = list(self._root._children.keys())
+        nodes = [self._root._children[a] for a in acts]
+        logits = np.log(np.array([node._P for node in nodes]) + 1e-10)
+        gumbel = np.random.gumbel(size=len(acts)) if add_noise else np.zeros(len(acts))
+
+        def sigma(q):
+            max_visits = max(node._n_visits for node in nodes)
+            # q from [-1, 1] to [0, 1]
+            return (c_visit + max_visits) * c_scale * (np.asarray(q) + 1.0) / 2.0
+
+        def child_q(i):
+            return nodes[i]._Q if nodes[i]._n_visits > 0 else -1.0
+
+        m = min(m, len(acts))
+        remaining = list(np.argsort(-(gumbel + logits))[:m])
+        n_phases = max(1, int(np.ceil(np.log2(m))))
+        for phase in range(n_phases):
+            budget = n_playout - n
+            if budget <= 0 or self._root._proven is not None:
+                break
+            if len(remaining) > 1:
+                per_move = max(1, budget // ((n_phases - phase) * len(remaining)))
+                for i in remaining:
+                    for k in range(per_move):
+                        if n >= n_playout:
+                            break
+                        self._playout(copy.deepcopy(state), first_action=acts[i])
+                        n += 1
+            # keep the better half
+            scores = gumbel[remaining] + logits[remaining] + sigma([child_q(i) for i in remaining])
+            order = np.argsort(-scores)
+            remaining = [remaining[j] for j in order[:max(1, len(remaining) // 2)]]
+        # playouts left over by the rounding go to the chosen move
+        while n < n_playout and self._root._proven is None:
+            self._playout(copy.deepcopy(state), first_action=acts[remaining[0]])
+            n += 1
+        self.last_playouts, self.last_stopped_early = n, n < n_playout
+
+        solved = self.solved_moves()
+        if solved is not None:
+            return solved, np.ones(len(solved)) / len(solved), solved[0]
+        # completed q: unvisited moves get the mixed value estimate of the root
+        prior = np.exp(logits - logits.max())
+        prior /= prior.sum()
+        visits = np.array([node._n_visits for node in nodes], dtype=np.float64)
+        q = np.array([node._Q for node in nodes])
+        visited = visits > 0
+        v_root = -self._root._Q  # network value of the root mixed with the playouts, root mover's view
+        if visited.any():
+            weighted_q = np.sum(prior[visited] * q[visited]) / np.sum(prior[visited])
+            v_mix = (v_root + visits.sum() * weighted_q) / (1.0 + visits.sum())
         else:
-            self._root = TreeNode(None, 1.0)
-
-    def __str__(self):
-        return "MCTS"
-        
-
-class MCTSPlayer(object):
-    """AI player based on MCTS"""
-    def __init__(self, policy_value_function, c_puct=5, n_playout=2000, is_selfplay=0):
-        self.mcts = MCTS(policy_value_function, c_puct, n_playout)
+            v_mix = v_root
+        completed_q = np.where(visited, q, v_mix)
+        improved = softmax(logits + sigma(completed_q))
+        return acts, improved, acts[remaining[0]]
+
+    def root_value(self):
+        """value of the root position for the player to move: the proven value if the root is
+        solved, else the Q of the most visited move"""
+        if self._root._proven is not None:
+            return float(self._root._proven)
+        if not self._root._children:
+            return 0.0
+        return max(self._root._children.values(), key=lambda node: node._n_visits)._Q
+
+
+class MCTSPlayer(TreePlayer):
+    """AI player based on MCTS
+    The search budget of a move is n_playout playouts, time_budget seconds if given, or a share
+    of game_time (seconds for the whole game) if given. early_stop ends a search as soon as the
+    chosen move is settled. node_budget bounds the live nodes of the search tree.
+    reuse_tree keeps the subtree under the opponent's reply between moves (self-play always does),
+    ponder also keeps searching it in a background thread during the opponent's turn (implies reuse_tree).
+    In self-play, playout cap randomisation searches a fast_move_prob fraction of the moves with only
+    fast_n_playout playouts and without noise; last_move_fast tells start_self_play to keep such
+    moves out of the policy targets.
+    root_search='gumbel' replaces PUCT + Dirichlet noise at the root by the Gumbel top-gumbel_m
+    search with sequential halving: the move comes from the search (Gumbel noise only in
+    self-play), move_probs is the improved policy and temp is not used. Needs a playout budget,
+    time_budget and game_time are ignored.
+    """
+    def __init__(self, policy_value_function, c_puct=5, n_playout=2000, is_selfplay=0, use_threats=False, vcf_depth=3,
+                 time_budget=None, game_time=None, early_stop=False, reuse_tree=False, ponder=False,
+                 fast_n_playout=None, fast_move_prob=0.0, root_search='puct', gumbel_m=16, node_budget=None):
+        mcts = MCTS(policy_value_function, c_puct, n_playout, use_threats=use_threats, vcf_depth=vcf_depth,
+                    early_stop=early_stop, node_budget=node_budget)
+        super(MCTSPlayer, self).__init__(mcts, n_playout, time_budget, game_time, reuse_tree, ponder)
         self._is_selfplay = is_selfplay
+        self.fast_n_playout = fast_n_playout
+        self.fast_move_prob = fast_move_prob
+        self.last_move_fast = False
+        self.last_root_value = 0.0  # root value of the last search for the player who moved
+        if root_search not in ('puct', 'gumbel'):
+            raise Exception("root_search should be 'puct' or 'gumbel'")
+        self.root_search = root_search
+        self.gumbel_m = gumbel_m
     
-    def set_player_ind(self, p):
-        self.player = p
-
-    def reset_player(self):
-        self.mcts.update_with_move(-1) 
-
     def get_action(self, board, temp=1e-6, return_prob=0):
         sensible_moves = board.availables
         move_probs = np.zeros(board.width*board.height) # the pi vector returned by MCTS as in the alphaGo Zero paper
         if len(sensible_moves) > 0:
-            acts, probs = self.mcts.get_move_probs(board, temp)
+            start = time.time()
+            self._sync_tree(board)
+            fast = bool(self._is_selfplay and self.fast_n_playout is not None and
+                        np.random.rand() < self.fast_move_prob)
+            self.last_move_fast = fast
+            if self.root_search == 'gumbel':
+                acts, probs, move = self.mcts.gumbel_move_probs(
+                    board, self.fast_n_playout if fast else None, m=self.gumbel_m,
+                    add_noise=bool(self._is_selfplay))
+            elif fast:
+                acts, probs = self.mcts.get_move_probs(board, temp, n_playout=self.fast_n_playout)
+            else:
+                acts, probs = self.mcts.get_move_probs(board, temp, time_budget=self.budget.seconds(board))
+            self.budget.record(start, self.mcts.last_playouts, self.mcts.last_stopped_early)
+            self.last_root_value = self.mcts.root_value()
             move_probs[list(acts)] = probs         
             if self._is_selfplay:
-                # add Dirichlet Noise for exploration (needed for self-play training)
-                move = np.random.choice(acts, p=0.75*probs + 0.25*np.random.dirichlet(0.3*np.ones(len(probs))))    
-                self.mcts.update_with_move(move) # update the root node and reuse the search tree
+                # a Gumbel search has already sampled its move
+                if self.root_search == 'puct' and fast:
+                    # not a policy target, no exploration noise needed
+                    move = np.random.choice(acts, p=probs)
+                elif self.root_search == 'puct':
+                    # add Dirichlet Noise for exploration (needed for self-play training)
+                    move = np.random.choice(acts, p=0.75*probs + 0.25*np.random.dirichlet(0.3*np.ones(len(probs))))
+                # update the root node and reuse the search tree
+                self.mcts.update_with_move(move)
+                self._tree_stones = len(board.states) + 1
             else:
-                # with the default temp=1e-3, this is almost equivalent to choosing the move with the highest prob
-                move = np.random.choice(acts, p=probs)       
-                # reset the root node
-                self.mcts.update_with_move(-1)             
+                if self.root_search == 'puct':
+                    # with the default temp=1e-3, this is almost equivalent to choosing the move with the highest prob
+                    move = np.random.choice(acts, p=probs)       
+                if self._reuse_tree:
+                    self._advance_tree(board, move)
+                else:
+                    # reset the root node
+                    self.mcts.update_with_move(-1)             
 #                location = board.move_to_location(move)
 #                print("AI move: %d,%d\n" % (location[0], location[1]))
                 
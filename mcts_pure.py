@@ -6,6 +6,8 @@ A pure implementation of the Monte Carlo Tree Search (MCTS)
 """
 import numpy as np
 import copy 
+import time
+from mcts_tree import TreeSearch, TreePlayer
 from operator import itemgetter
 
 def rollout_policy_fn(board):
@@ -17,91 +19,33 @@ def rollout_policy_fn(board):
 def policy_value_fn(board):
     """a function that takes in a state and outputs a list of (action, probability)
     tuples and a score for the state"""
-    # return uniform probabilities and 0 score for pure MCTS
-    action_probs = np.ones(len(board.availables))/len(board.availables)
-    return zip(board.availables, action_probs), 0
+    # return uniform probabilities over the candidate moves and 0 score for pure MCTS
+    moves = board.candidate_moves()
+    action_probs = np.ones(len(moves))/len(moves)
+    return zip(moves, action_probs), 0
 
-class TreeNode(object):
-    """A node in the MCTS tree. Each node keeps track of its own value Q, prior probability P, and
-    its visit-count-adjusted prior score u.
-    """
-
-    def __init__(self, parent, prior_p):
-        self._parent = parent
-        self._children = {}  # a map from action to TreeNode
-        self._n_visits = 0
-        self._Q = 0
-        self._u = 0
-        self._P = prior_p
-
-    def expand(self, action_priors):
-        """Expand tree by creating new children.
-        action_priors -- output from policy function - a list of tuples of actions
-            and their prior probability according to the policy function.
-        """
-        for action, prob in action_priors:
-            if action not in self._children:
-                self._children[action] = TreeNode(self, prob)
-
-    def select(self, c_puct):
-        """Select action among children that gives maximum action value, Q plus bonus u(P).
-        Returns:
-        A tuple of (action, next_node)
-        """
-        return max(self._children.iteritems(), key=lambda act_node: act_node[1].get_value(c_puct))
-
-    def update(self, leaf_value):
-        """Update node values from leaf evaluation.
-        Arguments:
-        leaf_value -- the value of subtree evaluation from the current player's perspective.        
-        """
-        # Count visit.
-        self._n_visits += 1
-        # Update Q, a running average of values for all visits.
-        self._Q += 1.0*(leaf_value - self._Q) / self._n_visits
-
-    def update_recursive(self, leaf_value):
-        """Like a call to update(), but applied recursively for all ancestors.
-        """
-        # If it is not root, this node's parent should be updated first.
-        if self._parent:
-            self._parent.update_recursive(-leaf_value)
-        self.update(leaf_value)
-
-    def get_value(self, c_puct):
-        """Calculate and return the value for this node: a combination of leaf evaluations, Q, and
-        this node's prior adjusted for its visit count, u
-        c_puct -- a number in (0, inf) controlling the relative impact of values, Q, and
-            prior probability, P, on this node's score.
-        """
-        self._u = c_puct * self._P * np.sqrt(self._parent._n_visits) / (1 + self._n_visits)
-        return self._Q + self._u
-
-    def is_leaf(self):
-        """Check if leaf node (i.e. no nodes below this have been expanded).
-        """
-        return self._children == {}
-
-    def is_root(self):
-        return self._parent is None
-
-
-class MCTS(object):
+class MCTS(TreeSearch):
     """A simple implementation of Monte Carlo Tree Search.
     """
 
-    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000):
+    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000, use_threats=False, vcf_depth=3,
+                 early_stop=False, check_every=16, node_budget=None, prune_ratio=0.75, rollout_fn=None,
+                 rollout_value_fn=None):
         """Arguments:
         policy_value_fn -- a function that takes in a board state and outputs a list of (action, probability)
             tuples and also a score in [-1, 1] (i.e. the expected value of the end game score from 
             the current player's perspective) for the current player.
-        c_puct -- a number in (0, inf) that controls how quickly exploration converges to the
-            maximum-value policy, where a higher value means relying on the prior more
+        rollout_fn -- picks the rollout moves, same contract as rollout_policy_fn (the default):
+            a list of (action, score) tuples, the highest score is played
+        rollout_value_fn -- replaces the whole rollout: takes the leaf state and returns its value
+            for the player to move (e.g. rollout.BatchedRollout, several rollouts played together)
+        the others as in mcts_tree.TreeSearch
         """
-        self._root = TreeNode(None, 1.0)
+        super(MCTS, self).__init__(c_puct, n_playout, use_threats, vcf_depth, early_stop, check_every,
+                                   node_budget, prune_ratio)
         self._policy = policy_value_fn
-        self._c_puct = c_puct
-        self._n_playout = n_playout
+        self._rollout = rollout_fn or rollout_policy_fn
+        self._rollout_value = rollout_value_fn
 
     def _playout(self, state):
         """Run a single playout from the root to the leaf, getting a value at the leaf and
@@ -110,24 +54,18 @@ class MCTS(object):
         Arguments:
         state -- a copy of the state.
         """
-        node = self._root
-        while(1): 
-            if node.is_leaf():
-
-                break                
-            # Greedily select next move.
-            action, node = node.select(self._c_puct)            
-            state.do_move(action)
-
+        leaf = self._select_leaf(state)
+        if leaf is None:
+            return
         action_probs, _ = self._policy(state)
-        # Check for end of game
-        end, winner = state.game_end()
-        if not end:
-            node.expand(action_probs)
+        # the priors may be read lazily from the board, the rollout below plays on it
+        action_probs = list(action_probs)
         # Evaluate the leaf node by random rollout
-        leaf_value = self._evaluate_rollout(state)
-        # Update value and visit count of nodes in this traversal.
-        node.update_recursive(-leaf_value)
+        if self._rollout_value is None:
+            leaf_value = self._evaluate_rollout(state)
+        else:
+            leaf_value = self._rollout_value(state)
+        self._backup_leaf(leaf, action_probs, leaf_value)
 
     def _evaluate_rollout(self, state, limit=1000):
         """Use the rollout policy to play until the end of the game, returning +1 if the current
@@ -138,7 +76,7 @@ class MCTS(object):
             end, winner = state.game_end()
             if end:
                 break
-            action_probs = rollout_policy_fn(state)
+            action_probs = self._rollout(state)
             max_action = max(action_probs, key=itemgetter(1))[0]
             state.do_move(max_action)
         else:
@@ -149,47 +87,49 @@ class MCTS(object):
         else:
             return 1 if winner == player else -1
 
-    def get_move(self, state):
-        """Runs all playouts sequentially and returns the most visited action.
+    def get_move(self, state, time_budget=None):
+        """Runs the playouts sequentially and returns the most visited action.
         Arguments:
         state -- the current state, including both game state and the current player.
+        time_budget -- seconds to search instead of n_playout playouts
         Returns:
         the selected action
         """
-        for n in range(self._n_playout):
-            state_copy = copy.deepcopy(state)
-            self._playout(state_copy)          
-        return max(self._root._children.iteritems(), key=lambda act_node: act_node[1]._n_visits)[0]
-
-    def update_with_move(self, last_move):
-        """Step forward in the tree, keeping everything we already know about the subtree.
-        """
-        if last_move in self._root._children:
-            self._root = self._root._children[last_move]
-            self._root._parent = None
-        else:
-            self._root = TreeNode(None, 1.0)
-
-    def __str__(self):
-        return "MCTS"
-        
-
-class MCTSPlayer(object):
-    """AI player based on MCTS"""
-    def __init__(self, c_puct=5, n_playout=2000):
-        self.mcts = MCTS(policy_value_fn, c_puct, n_playout)
+        self._search(state, time_budget)
+        solved = self.solved_moves()
+        if solved is not None:
+            return solved[0]
+        return max(self._root._children.items(), key=lambda act_node: act_node[1]._n_visits)[0]
+
+class MCTSPlayer(TreePlayer):
+    """AI player based on MCTS
+    The search budget of a move is n_playout playouts, time_budget seconds if given, or a share
+    of game_time (seconds for the whole game) if given. early_stop ends a search as soon as the
+    chosen move is settled. node_budget bounds the live nodes of the search tree.
+    reuse_tree keeps the subtree under the opponent's reply between moves, ponder also keeps
+    searching it in a background thread during the opponent's turn (implies reuse_tree).
+    rollout_fn replaces the random rollout policy and rollout_value_fn the whole rollout (see rollout.py).
+    prior_fn replaces the uniform priors of policy_value_fn, e.g. by pattern_eval.policy_value_fn.
+    """
+    def __init__(self, c_puct=5, n_playout=2000, use_threats=False, vcf_depth=3,
+                 time_budget=None, game_time=None, early_stop=False, reuse_tree=False, ponder=False,
+                 node_budget=None, rollout_fn=None, rollout_value_fn=None, prior_fn=None):
+        mcts = MCTS(prior_fn or policy_value_fn, c_puct, n_playout, use_threats=use_threats, vcf_depth=vcf_depth,
+                    early_stop=early_stop, node_budget=node_budget, rollout_fn=rollout_fn,
+                    rollout_value_fn=rollout_value_fn)
+        super(MCTSPlayer, self).__init__(mcts, n_playout, time_budget, game_time, reuse_tree, ponder)
     
-    def set_player_ind(self, p):
-        self.player = p
-
-    def reset_player(self):
-        self.mcts.update_with_move(-1) 
-
     def get_action(self, board):
         sensible_moves = board.availables
         if len(sensible_moves) > 0:
-            move = self.mcts.get_move(board)
-            self.mcts.update_with_move(-1)
+            start = time.time()
+            self._sync_tree(board)
+            move = self.mcts.get_move(board, time_budget=self.budget.seconds(board))
+            self.budget.record(start, self.mcts.last_playouts, self.mcts.last_stopped_early)
+            if self._reuse_tree:
+                self._advance_tree(board, move)
+            else:
+                self.mcts.update_with_move(-1)
             return move
         else:            
             print("WARNING: the board is full")
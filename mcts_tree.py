@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+The search tree shared by the MCTS players of mcts_alphazero and mcts_pure: the nodes, the tree
+walk with the solver and the threat solver, the memory bound, tree reuse and pondering. The two
+modules only differ in how a leaf is evaluated and how the move is chosen.
+
+@author: Zhang Tianming
+"""
+import numpy as np
+import copy
+import time
+from threats import find_threats, restrict_priors
+from search_budget import leader_is_safe, MoveBudget
+from ponder import Ponderer
+from tree_budget import free_subtree, prune_tree, tree_bytes
+
+
+class TreeNode(object):
+    """A node in the MCTS tree. Each node keeps track of its own value Q, prior probability P, and
+    its visit-count-adjusted prior score u.
+    """
+    # no per-node __dict__, trees hold hundreds of thousands of nodes
+    __slots__ = ('_parent', '_children', '_n_visits', '_Q', '_u', '_P', '_proven')
+
+    def __init__(self, parent, prior_p):
+        self._parent = parent
+        self._children = {}  # a map from action to TreeNode
+        self._n_visits = 0
+        self._Q = 0
+        self._u = 0
+        self._P = prior_p
+        # game-theoretic value for the player to move at this node once solved: 1 win, 0 draw, -1 loss
+        self._proven = None
+
+    def expand(self, action_priors):
+        """Expand tree by creating new children.
+        action_priors -- output from policy function - a list of tuples of actions
+            and their prior probability according to the policy function.
+        Returns the number of children created.
+        """
+        n = len(self._children)
+        for action, prob in action_priors:
+            if action not in self._children:
+                self._children[action] = TreeNode(self, prob)
+        return len(self._children) - n
+
+    def select(self, c_puct):
+        """Select action among children that gives maximum action value, Q plus bonus u(P).
+        A child proven lost for its player to move (a winning move) is returned right away,
+        children proven won for their player to move (losing moves) are skipped.
+        Returns:
+        A tuple of (action, next_node)
+        """
+        candidates = []
+        for act_node in self._children.items():
+            if act_node[1]._proven == -1:
+                return act_node
+            if act_node[1]._proven != 1:
+                candidates.append(act_node)
+        return max(candidates or self._children.items(), key=lambda act_node: act_node[1].get_value(c_puct))
+
+    def update(self, leaf_value):
+        """Update node values from leaf evaluation.
+        Arguments:
+        leaf_value -- the value of subtree evaluation from the current player's perspective.        
+        """
+        # Count visit.
+        self._n_visits += 1
+        # Update Q, a running average of values for all visits.
+        self._Q += 1.0*(leaf_value - self._Q) / self._n_visits
+
+    def update_recursive(self, leaf_value):
+        """Like a call to update(), but applied recursively for all ancestors.
+        """
+        # If it is not root, this node's parent should be updated first.
+        if self._parent:
+            self._parent.update_recursive(-leaf_value)
+        self.update(leaf_value)
+
+    def set_proven(self, value):
+        """Mark this node solved and propagate to the ancestors by minimax: a parent is won as soon
+        as one child is lost for its player to move, and solved with the best value once all
+        children are solved (children are the searched moves, i.e. all legal moves unless the move
+        set was restricted).
+        """
+        self._proven = value
+        node = self._parent
+        while node is not None and node._proven is None:
+            values = [child._proven for child in node._children.values()]
+            if -1 in values:
+                node._proven = 1
+            elif None not in values:
+                node._proven = max(-v for v in values)
+            else:
+                break
+            node = node._parent
+
+    def get_value(self, c_puct):
+        """Calculate and return the value for this node: a combination of leaf evaluations, Q, and
+        this node's prior adjusted for its visit count, u
+        c_puct -- a number in (0, inf) controlling the relative impact of values, Q, and
+            prior probability, P, on this node's score.
+        """
+        self._u = c_puct * self._P * np.sqrt(self._parent._n_visits) / (1 + self._n_visits)
+        return self._Q + self._u
+
+    def is_leaf(self):
+        """Check if leaf node (i.e. no nodes below this have been expanded).
+        """
+        return self._children == {}
+
+    def is_root(self):
+        return self._parent is None
+
+
+class TreeSearch(object):
+    """The tree of an MCTS: subclasses evaluate the leaves in _playout (after _select_leaf and
+    before _backup_leaf) and turn the root statistics into a move.
+    """
+
+    def __init__(self, c_puct=5, n_playout=10000, use_threats=False, vcf_depth=3,
+                 early_stop=False, check_every=16, node_budget=None, prune_ratio=0.75):
+        """Arguments:
+        c_puct -- a number in (0, inf) that controls how quickly exploration converges to the
+            maximum-value policy, where a higher value means relying on the prior more
+        use_threats -- run the threat solver on every new leaf: immediate wins and VCF wins are
+            proven without evaluation, forced blocks restrict the children to the blocking move
+        vcf_depth -- max number of consecutive fours searched by the threat solver
+        early_stop -- stop the search once the most visited root move can no longer be overtaken
+            within the remaining budget (the visit distribution is then less spread, so leave it
+            off for self-play targets)
+        check_every -- playouts between two early termination checks
+        node_budget -- max number of live tree nodes, None for no bound. Once exceeded, the
+            expanded nodes with the fewest visits are collapsed back into leaves (keeping their
+            statistics) until prune_ratio * node_budget nodes are left
+        """
+        self._root = TreeNode(None, 1.0)
+        self._node_budget = node_budget
+        self._prune_ratio = prune_ratio
+        self.live_nodes = 1  # nodes reachable from the root
+        self.pruned_nodes = 0  # nodes released by pruning since the tree was created
+        self._c_puct = c_puct
+        self._n_playout = n_playout
+        self._use_threats = use_threats
+        self._vcf_depth = vcf_depth
+        self._early_stop = early_stop
+        self._check_every = check_every
+        self.proven_playouts = 0  # playouts ended on a proven node, i.e. without evaluating the leaf
+        self.last_playouts = 0  # playouts run by the last search
+        self.last_stopped_early = False
+
+    def _playout(self, state):
+        """Run a single playout from the root to the leaf, getting a value at the leaf and
+        propagating it back through its parents. State is modified in-place, so a copy must be
+        provided.
+        """
+        raise NotImplementedError
+
+    def _select_leaf(self, state, first_action=None):
+        """First half of a playout: walk from the root to a leaf, playing the moves on state.
+        A proven or terminal leaf (or one the threat solver proves) is backed up right away and None
+        is returned, else (node, restrict) to be passed to _backup_leaf with the evaluation of state.
+        Lets a caller evaluate the leaves of many trees in one batch.
+        """
+        if self._node_budget is not None and self.live_nodes > self._node_budget:
+            # between playouts no path is in flight, the collapsed nodes can not be on one
+            freed = prune_tree(self._root, self.live_nodes, int(self._node_budget * self._prune_ratio))
+            self.live_nodes -= freed
+            self.pruned_nodes += freed
+        node = self._root
+        if first_action is not None:
+            node = self._root._children[first_action]
+            state.do_move(first_action)
+        while(1):            
+            if node.is_leaf() or node._proven is not None:
+                break                
+            # Greedily select next move.
+            action, node = node.select(self._c_puct)            
+            state.do_move(action)
+
+        if node._proven is not None:
+            # solved before, no need to evaluate it again
+            self.proven_playouts += 1
+            node.update_recursive(-node._proven)
+            return None
+        # Check for end of game.
+        end, winner = state.game_end()
+        if not end:
+            restrict = None
+            if self._use_threats:
+                proven_value, restrict = self._solve_threats(node, state)
+                if proven_value is not None:
+                    self.proven_playouts += 1
+                    node.update_recursive(-proven_value)
+                    return None
+            return node, restrict
+        # for end state，return the "true" leaf_value
+        if winner == -1:  # tie
+            leaf_value = 0.0
+        else:
+            leaf_value = 1.0 if winner == state.get_current_player() else -1.0
+        node.set_proven(int(leaf_value))
+        node.update_recursive(-leaf_value)
+        return None
+
+    def _backup_leaf(self, leaf, action_probs, leaf_value):
+        """Second half of a playout: expand the leaf returned by _select_leaf with the priors and
+        back the value up (both for the player to move at the leaf)."""
+        node, restrict = leaf
+        if restrict is not None:
+            action_probs = restrict_priors(action_probs, restrict)
+        self.live_nodes += node.expand(action_probs)
+        # Update value and visit count of nodes in this traversal.
+        node.update_recursive(-leaf_value)
+
+    def _search(self, state, time_budget=None, n_playout=None):
+        """Run _playout on copies of state until the budget is used: n_playout playouts (the tree's
+        n_playout unless given), or time_budget seconds if given. Stops before that once the root is
+        solved or, with early_stop, once the most visited move cannot be overtaken by the playouts
+        still left in the budget. Sets last_playouts and last_stopped_early.
+        """
+        n_playout = self._n_playout if n_playout is None else n_playout
+        start = time.time()
+        deadline = None if time_budget is None else start + time_budget
+        n = 0
+        self.last_stopped_early = False
+        while True:
+            if deadline is None:
+                if n >= n_playout:
+                    break
+                remaining = n_playout - n
+            else:
+                t = time.time()
+                if t >= deadline:
+                    break
+                # playouts that still fit in the budget at the speed so far
+                remaining = (deadline - t) * n / max(t - start, 1e-6)
+            if self._root._proven is not None or (
+                    self._early_stop and n > 0 and n % self._check_every == 0 and
+                    leader_is_safe(self._root, remaining)):
+                self.last_stopped_early = True
+                break
+            self._playout(copy.deepcopy(state))
+            n += 1
+        self.last_playouts = n
+
+    def solved_moves(self):
+        """moves achieving the proven value of a solved root, None if the root is not solved"""
+        value = self._root._proven
+        if value is None:
+            return None
+        moves = [act for act, node in self._root._children.items()
+                 if node._proven is not None and -node._proven == value]
+        return moves or None
+
+    def update_with_move(self, last_move):
+        """Step forward in the tree, keeping everything we already know about the subtree.
+        The rest of the tree is released right away.
+        """
+        old_root = self._root
+        if last_move in old_root._children:
+            self._root = old_root._children.pop(last_move)
+            self._root._parent = None
+            self.live_nodes -= free_subtree(old_root)
+        else:
+            free_subtree(old_root)
+            self._root = TreeNode(None, 1.0)
+            self.live_nodes = 1
+
+    def tree_bytes(self):
+        """bytes held by the live tree (walks the whole tree)"""
+        return tree_bytes(self._root)
+
+    def _solve_threats(self, node, state):
+        """Run the threat solver on a new leaf. Returns the proven leaf value for the player to move,
+        or None together with the moves the children have to be restricted to (None for no restriction).
+        """
+        status, moves = find_threats(state, self._vcf_depth)
+        if status in ('win', 'vcf'):
+            self.live_nodes += node.expand([(moves[0], 1.0)])
+            node.set_proven(1)
+            return 1.0, None
+        if status == 'loss':
+            self.live_nodes += node.expand([(m, 1.0 / len(moves)) for m in moves])
+            node.set_proven(-1)
+            return -1.0, None
+        return None, moves
+
+    def __str__(self):
+        return "MCTS"
+
+
+class TreePlayer(object):
+    """The parts of an MCTS player that manage its tree between moves: the search budget,
+    reuse_tree keeps the subtree under the opponent's reply between moves, ponder also keeps
+    searching it in a background thread during the opponent's turn (implies reuse_tree).
+    """
+
+    def __init__(self, mcts, n_playout, time_budget=None, game_time=None, reuse_tree=False, ponder=False):
+        self.mcts = mcts
+        self.budget = MoveBudget(time_budget, game_time)
+        self.search_stats = self.budget.stats
+        self._reuse_tree = reuse_tree or ponder
+        self._ponderer = Ponderer(self.mcts, max_playout=10 * n_playout) if ponder else None
+        self._tree_stones = -1  # stones on the board at the tree's root, -1 if there is no tree to reuse
+
+    def set_player_ind(self, p):
+        self.player = p
+
+    def reset_player(self):
+        if self._ponderer is not None:
+            self._ponderer.stop()
+        self.mcts.update_with_move(-1)
+        self._tree_stones = -1
+        self.budget.reset()
+
+    def _sync_tree(self, board):
+        """stop pondering and bring the root to the position on board: the subtree under the
+        opponent's reply is kept if the tree is one move behind, the tree is dropped otherwise"""
+        ponder_playouts = self._ponderer.stop() if self._ponderer is not None else 0
+        if self._tree_stones == len(board.states) - 1:
+            self.mcts.update_with_move(board.last_move)
+        elif self._tree_stones != len(board.states):
+            self.mcts.update_with_move(-1)
+        self.search_stats.record_reuse(self.mcts._root._n_visits, ponder_playouts)
+
+    def _advance_tree(self, board, move):
+        """step the root to our move, and start pondering on the opponent's turn"""
+        self.mcts.update_with_move(move)
+        self._tree_stones = len(board.states) + 1
+        if self._ponderer is not None:
+            state = copy.deepcopy(board)
+            state.do_move(move)
+            if not state.game_end()[0]:
+                self._ponderer.start(state)
@@ -24,9 +24,12 @@ class RenjuAIController {
     RenjuAIController();
     ~RenjuAIController();
 
+    // score (optional): negamax score of the move for player, 0 if the game is already won.
+    // The counters are per thread, so positions can be searched on several threads at once.
     static void generateMove(const char *gs, int player, int search_depth, int time_limit,
                              int *actual_depth, int *move_r, int *move_c, int *winning_player,
-                             unsigned int *node_count, unsigned int *eval_count, unsigned int *pm_count);
+                             unsigned int *node_count, unsigned int *eval_count, unsigned int *pm_count,
+                             int *score = nullptr);
 };
 
 #endif  // INCLUDE_AI_AI_CONTROLLER_H_
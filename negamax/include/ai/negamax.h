@@ -26,8 +26,9 @@ class RenjuAINegamax {
     RenjuAINegamax();
     ~RenjuAINegamax();
 
+    // score (optional): negamax score of the chosen move for player
     static void heuristicNegamax(const char *gs, int player, int depth, int time_limit, bool enable_ab_pruning,
-                                 int *actual_depth, int *move_r, int *move_c);
+                                 int *actual_depth, int *move_r, int *move_c, int *score = nullptr);
 
  private:
     // Preset search breadth
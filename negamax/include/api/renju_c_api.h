@@ -0,0 +1,49 @@
+/*
+ * blupig
+ * Copyright (C) 2016-2017 Yunzhu Li
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * any later version.
+
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#ifndef INCLUDE_API_RENJU_C_API_H_
+#define INCLUDE_API_RENJU_C_API_H_
+
+// C interface of the engine for foreign function interfaces (python ctypes).
+// Game states are board_size * board_size bytes, row-major, 0 empty, 1 and 2 the players.
+
+extern "C" {
+
+// RenjuAIEval::evalMove of cell (r, c) for player
+int renju_eval_move(const char *gs, int board_size, int r, int c, int player);
+
+// RenjuAIEval::evalMove of every cell for player, written to scores (board_size * board_size ints)
+void renju_eval_moves(const char *gs, int board_size, int player, int *scores);
+
+// RenjuAIEval::winningPlayer
+int renju_winning_player(const char *gs, int board_size);
+
+// RenjuAIController::generateMove on n game states (n * board_size * board_size bytes) at a fixed
+// search_depth (> 0) on num_threads threads (<= 0: one per hardware thread). Position i is searched
+// for players[i]; its move, negamax score, winning player (0 if none) and node and evaluation counts
+// are written to element i of the output arrays (any output may be null). A position that is
+// already won or full gets move -1, -1; an empty one gets the center with score 0 and no search.
+// heuristicNegamax searches positions with 2 or fewer stones at depth 6 whatever search_depth is.
+// Returns 0, or -1 if the arguments are invalid (players[i] must be 1 or 2).
+int renju_generate_moves(const char *gs, int n, int board_size, const int *players,
+                         int search_depth, int num_threads, int *move_r, int *move_c, int *scores,
+                         int *winning_player, unsigned int *node_count, unsigned int *eval_count);
+
+}
+
+#endif  // INCLUDE_API_RENJU_C_API_H_
@@ -23,9 +23,10 @@
 
 extern int g_board_size;
 extern unsigned int g_gs_size;
-extern unsigned int g_node_count;
-extern unsigned int g_eval_count;
-extern unsigned int g_pm_count;
+// Search counters, one set per thread
+extern thread_local unsigned int g_node_count;
+extern thread_local unsigned int g_eval_count;
+extern thread_local unsigned int g_pm_count;
 extern unsigned int g_cc_0;
 extern unsigned int g_cc_1;
 
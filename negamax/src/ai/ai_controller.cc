@@ -25,7 +25,8 @@
 
 void RenjuAIController::generateMove(const char *gs, int player, int search_depth, int time_limit,
                            int *actual_depth, int *move_r, int *move_c, int *winning_player,
-                           unsigned int *node_count, unsigned int *eval_count, unsigned int *pm_count) {
+                           unsigned int *node_count, unsigned int *eval_count, unsigned int *pm_count,
+                           int *score) {
     // Check arguments
     if (gs == nullptr ||
         player  < 1 || player > 2 ||
@@ -34,6 +35,7 @@ void RenjuAIController::generateMove(const char *gs, int player, int search_dept
         move_r == nullptr || move_c == nullptr) return;
 
     // Initialize counters
+    g_node_count = 0;
     g_eval_count = 0;
     g_pm_count = 0;
 
@@ -42,6 +44,7 @@ void RenjuAIController::generateMove(const char *gs, int player, int search_dept
     *move_c = -1;
     int _winning_player = 0;
     if (actual_depth != nullptr) *actual_depth = 0;
+    if (score != nullptr) *score = 0;
 
     // Check if anyone wins the game
     _winning_player = RenjuAIEval::winningPlayer(gs);
@@ -55,7 +58,8 @@ void RenjuAIController::generateMove(const char *gs, int player, int search_dept
     std::memcpy(_gs, gs, g_gs_size);
 
     // Run negamax
-    RenjuAINegamax::heuristicNegamax(_gs, player, search_depth, time_limit, true, actual_depth, move_r, move_c);
+    RenjuAINegamax::heuristicNegamax(_gs, player, search_depth, time_limit, true, actual_depth, move_r, move_c,
+                                     score);
 
     // Execute the move
     std::memcpy(_gs, gs, g_gs_size);
@@ -23,12 +23,14 @@
 #include <algorithm>
 #include <climits>
 #include <cstring>
+#include <mutex>
 
 // Initialize global variables
 RenjuAIEval::DirectionPattern *RenjuAIEval::preset_patterns = nullptr;
 int *RenjuAIEval::preset_scores = nullptr;
 int preset_patterns_size = 0;
 int preset_patterns_skip[6] = {0};
+std::once_flag preset_patterns_once;
 
 int RenjuAIEval::evalState(const char *gs, int player) {
     // Check parameters
@@ -53,10 +55,9 @@ int RenjuAIEval::evalMove(const char *gs, int r, int c, int player) {
     // Count evaluations
     ++g_eval_count;
 
-    // Generate preset patterns structure in memory
-    if (preset_patterns == nullptr) {
-        generatePresetPatterns(&preset_patterns, &preset_scores, &preset_patterns_size, preset_patterns_skip);
-    }
+    // Generate preset patterns structure in memory, once even if several threads evaluate
+    std::call_once(preset_patterns_once, generatePresetPatterns,
+                   &preset_patterns, &preset_scores, &preset_patterns_size, preset_patterns_skip);
 
     // Allocate 4 direction measurements
     DirectionMeasurement adm[4];
@@ -44,7 +44,7 @@ int RenjuAINegamax::presetSearchBreadth[5] = {17, 7, 5, 3, 3};
 #define kScoreDecayFactor 0.95f
 
 void RenjuAINegamax::heuristicNegamax(const char *gs, int player, int depth, int time_limit, bool enable_ab_pruning,
-                                      int *actual_depth, int *move_r, int *move_c) {
+                                      int *actual_depth, int *move_r, int *move_c, int *score) {
     // Check arguments
     if (gs == nullptr ||
         player < 1 || player > 2 ||
@@ -65,8 +65,9 @@ void RenjuAINegamax::heuristicNegamax(const char *gs, int player, int depth, int
     // Fixed depth or iterative deepening
     if (depth > 0) {
         if (actual_depth != nullptr) *actual_depth = depth;
-        heuristicNegamax(_gs, player, depth, depth, enable_ab_pruning,
-                         INT_MIN / 2, INT_MAX / 2, move_r, move_c);
+        int s = heuristicNegamax(_gs, player, depth, depth, enable_ab_pruning,
+                                 INT_MIN / 2, INT_MAX / 2, move_r, move_c);
+        if (score != nullptr) *score = s;
     } else {
         // Iterative deepening
         std::clock_t c_start = std::clock();
@@ -77,8 +78,9 @@ void RenjuAINegamax::heuristicNegamax(const char *gs, int player, int depth, int
             memcpy(_gs, gs, g_gs_size);
 
             // Execute negamax
-            heuristicNegamax(_gs, player, d, d, enable_ab_pruning,
-                             INT_MIN / 2, INT_MAX / 2, move_r, move_c);
+            int s = heuristicNegamax(_gs, player, d, d, enable_ab_pruning,
+                                     INT_MIN / 2, INT_MAX / 2, move_r, move_c);
+            if (score != nullptr) *score = s;
 
             // Times
             std::clock_t c_iteration = (std::clock() - c_iteration_start) * 1000 / CLOCKS_PER_SEC;
@@ -0,0 +1,95 @@
+/*
+ * blupig
+ * Copyright (C) 2016-2017 Yunzhu Li
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * any later version.
+
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#include <api/renju_c_api.h>
+#include <ai/ai_controller.h>
+#include <ai/eval.h>
+#include <utils/globals.h>
+
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <vector>
+
+static void setBoardSize(int board_size) {
+    g_board_size = board_size;
+    g_gs_size = board_size * board_size;
+}
+
+int renju_eval_move(const char *gs, int board_size, int r, int c, int player) {
+    setBoardSize(board_size);
+    return RenjuAIEval::evalMove(gs, r, c, player);
+}
+
+void renju_eval_moves(const char *gs, int board_size, int player, int *scores) {
+    if (scores == nullptr) return;
+    setBoardSize(board_size);
+    for (int r = 0; r < board_size; ++r) {
+        for (int c = 0; c < board_size; ++c) {
+            scores[board_size * r + c] = RenjuAIEval::evalMove(gs, r, c, player);
+        }
+    }
+}
+
+int renju_winning_player(const char *gs, int board_size) {
+    setBoardSize(board_size);
+    return RenjuAIEval::winningPlayer(gs);
+}
+
+int renju_generate_moves(const char *gs, int n, int board_size, const int *players,
+                         int search_depth, int num_threads, int *move_r, int *move_c, int *scores,
+                         int *winning_player, unsigned int *node_count, unsigned int *eval_count) {
+    // A fixed depth only: the time limit of iterative deepening is measured in process CPU time
+    if (gs == nullptr || players == nullptr || n < 0 || board_size <= 0 || search_depth <= 0) return -1;
+    for (int i = 0; i < n; ++i)
+        if (players[i] < 1 || players[i] > 2) return -1;
+    if (n == 0) return 0;
+    setBoardSize(board_size);
+
+    if (num_threads <= 0) num_threads = std::max(1u, std::thread::hardware_concurrency());
+    num_threads = std::min(num_threads, n);
+
+    // Each worker takes the next unlabelled position until none is left
+    std::atomic<int> next(0);
+    auto worker = [&]() {
+        for (int i = next++; i < n; i = next++) {
+            int r = -1, c = -1, winner = 0, score = 0;
+            unsigned int nodes = 0, evals = 0, pms = 0;
+            const char *position = gs + static_cast<size_t>(i) * g_gs_size;
+            if (std::all_of(position, position + g_gs_size, [](char cell) { return cell == 0; })) {
+                // The search only considers cells next to stones, open in the center as gomocup BEGIN does
+                r = c = board_size / 2;
+            } else {
+                RenjuAIController::generateMove(position, players[i], search_depth, 0,
+                                                nullptr, &r, &c, &winner, &nodes, &evals, &pms, &score);
+            }
+            if (move_r != nullptr) move_r[i] = r;
+            if (move_c != nullptr) move_c[i] = c;
+            if (scores != nullptr) scores[i] = score;
+            if (winning_player != nullptr) winning_player[i] = winner;
+            if (node_count != nullptr) node_count[i] = nodes;
+            if (eval_count != nullptr) eval_count[i] = evals;
+        }
+    };
+
+    std::vector<std::thread> threads;
+    for (int t = 1; t < num_threads; ++t) threads.emplace_back(worker);
+    worker();
+    for (auto &thread : threads) thread.join();
+    return 0;
+}
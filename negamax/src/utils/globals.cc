@@ -20,8 +20,8 @@
 
 int g_board_size = 19;
 unsigned int g_gs_size = 361;
-unsigned int g_node_count = 0;
-unsigned int g_eval_count = 0;
-unsigned int g_pm_count = 0;
+thread_local unsigned int g_node_count = 0;
+thread_local unsigned int g_eval_count = 0;
+thread_local unsigned int g_pm_count = 0;
 unsigned int g_cc_0 = 0;
 unsigned int g_cc_1 = 0;
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+ctypes bindings of the negamax engine's C interface (negamax/include/api/renju_c_api.h)
+
+Build the library with the engine:
+    mkdir -p negamax/build && cd negamax/build && cmake .. && make
+
+@author: Zhang Tianming
+"""
+import ctypes
+import numpy as np
+
+LIB_PATH = 'negamax/build/librenju_c.so'
+MAX_SEARCH_DEPTH = 10  # generateMove rejects deeper searches
+
+
+def _array(dtype):
+    return np.ctypeslib.ndpointer(dtype, flags='C_CONTIGUOUS')
+
+
+def load_library(path=LIB_PATH):
+    lib = ctypes.CDLL(path)
+    lib.renju_eval_move.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+    lib.renju_eval_move.restype = ctypes.c_int
+    lib.renju_eval_moves.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+                                     np.ctypeslib.ndpointer(np.int32, flags='C_CONTIGUOUS')]
+    lib.renju_eval_moves.restype = None
+    lib.renju_winning_player.argtypes = [ctypes.c_char_p, ctypes.c_int]
+    lib.renju_winning_player.restype = ctypes.c_int
+    lib.renju_generate_moves.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, _array(np.int32),
+                                         ctypes.c_int, ctypes.c_int, _array(np.int32), _array(np.int32),
+                                         _array(np.int32), _array(np.int32), _array(np.uint32), _array(np.uint32)]
+    lib.renju_generate_moves.restype = ctypes.c_int
+    return lib
+
+
+def game_state(board):
+    """(height, width) int8 array of a Board, 0 empty, 1 and 2 the players, row h is move // width"""
+    gs = np.zeros((board.height, board.width), dtype=np.int8)
+    for move, player in board.states.items():
+        gs[move // board.width, move % board.width] = player
+    return gs
+
+
+class NegamaxEngine(object):
+    """the engine's evaluator on numpy game states (square boards, the engine's only kind)"""
+
+    def __init__(self, path=LIB_PATH):
+        self.lib = load_library(path)
+
+    def eval_moves(self, gs, player):
+        """RenjuAIEval::evalMove of every cell for player, a (size, size) int32 array"""
+        gs = np.ascontiguousarray(gs, dtype=np.int8)
+        size = gs.shape[0]
+        scores = np.zeros(size * size, dtype=np.int32)
+        self.lib.renju_eval_moves(gs.tobytes(), size, player, scores)
+        return scores.reshape(size, size)
+
+    def eval_move(self, gs, r, c, player):
+        gs = np.ascontiguousarray(gs, dtype=np.int8)
+        return self.lib.renju_eval_move(gs.tobytes(), gs.shape[0], r, c, player)
+
+    def winning_player(self, gs):
+        gs = np.ascontiguousarray(gs, dtype=np.int8)
+        return self.lib.renju_winning_player(gs.tobytes(), gs.shape[0])
+
+    def label(self, gs_batch, players, search_depth=4, num_threads=0):
+        """RenjuAIController::generateMove on a batch of positions in one call, searched on num_threads
+        threads (0: one per hardware thread) at a fixed search_depth; positions with 2 or fewer stones
+        are searched at depth 6 whatever search_depth is (heuristicNegamax does so).
+        gs_batch: (n, size, size) game states, players: the player to move of each, 1 or 2 (an int for all).
+        Returns a dict of (n,) arrays:
+            move           -- r * size + c of the best move, -1 if the game is already over,
+                              the center on an empty board
+            score          -- negamax score of the move for the player (evaluator units, decayed per ply)
+            winner         -- winning player after the move (or before, if already over), 0 if none
+            node_count, eval_count -- search nodes and evaluations spent on the position
+        """
+        gs_batch = np.ascontiguousarray(gs_batch, dtype=np.int8)
+        n, size = gs_batch.shape[0], gs_batch.shape[1]
+        if not 0 < search_depth <= MAX_SEARCH_DEPTH:
+            raise ValueError("search_depth must be in 1..{}".format(MAX_SEARCH_DEPTH))
+        players = np.ascontiguousarray(np.broadcast_to(players, (n,)), dtype=np.int32)
+        if not np.isin(players, (1, 2)).all():
+            raise ValueError("players must be 1 or 2")
+        move_r, move_c, scores, winners = [np.zeros(n, dtype=np.int32) for _ in range(4)]
+        node_count, eval_count = np.zeros(n, dtype=np.uint32), np.zeros(n, dtype=np.uint32)
+        if self.lib.renju_generate_moves(gs_batch.tobytes(), n, size, players, search_depth, num_threads,
+                                         move_r, move_c, scores, winners, node_count, eval_count) != 0:
+            raise ValueError("invalid batch for renju_generate_moves")
+        return {'move': np.where(move_r >= 0, move_r * size + move_c, -1),
+                'score': scores,
+                'winner': winners,
+                'node_count': node_count,
+                'eval_count': eval_count}
+
+    def label_boards(self, boards, search_depth=4, num_threads=0):
+        """label for Board objects, each searched for its current player"""
+        gs_batch = np.stack([game_state(board) for board in boards])
+        players = [board.get_current_player() for board in boards]
+        return self.label(gs_batch, players, search_depth, num_threads)
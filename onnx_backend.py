@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+ONNX export of the policy-value network and an ONNX Runtime inference backend
+
+The exported graph has a dynamic batch axis. OnnxPolicyValueNet runs it on the cpu and offers
+the same policy_value_fn as PolicyValueNet, so it can be handed to MCTSPlayer as is.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import shutil
+import numpy as np
+import torch
+from checkpoint import load_weights
+from policy_value_net import PolicyValueBackBoneNet, candidate_priors
+from shared_weights import unwrap
+
+INPUT_NAME = 'state'
+OUTPUT_NAMES = ['act_probs', 'value']
+
+
+def export_onnx(model, filename, board_width, board_height, feature_planes, opset_version=13):
+    """export a PolicyValueBackBoneNet (or a DataParallel of one), the batch axis stays dynamic"""
+    model = unwrap(model)
+    device = next(model.parameters()).device
+    training = model.training
+    model.eval()
+    dummy = torch.zeros(1, feature_planes, board_width, board_height, device=device)
+    kwargs = dict(input_names=[INPUT_NAME], output_names=OUTPUT_NAMES,
+                  dynamic_axes={INPUT_NAME: {0: 'batch'}, 'act_probs': {0: 'batch'}, 'value': {0: 'batch'}},
+                  opset_version=opset_version)
+    try:
+        # the TorchScript exporter, the dynamo one needs extra packages
+        torch.onnx.export(model, dummy, filename + '.undone', dynamo=False, **kwargs)
+    except TypeError:  # torch < 2.5 has no dynamo switch
+        torch.onnx.export(model, dummy, filename + '.undone', **kwargs)
+    shutil.move(filename + '.undone', filename)
+    model.train(training)
+
+
+def export_checkpoint(model_file, onnx_file, board_width=11, board_height=11, feature_planes=8):
+    """export the weights of a checkpoint, the board size comes from its arch record if present"""
+    checkpoint = load_weights(model_file)
+    arch = checkpoint.get('arch') or {}
+    board_width = arch.get('board_width', board_width)
+    board_height = arch.get('board_height', board_height)
+    feature_planes = arch.get('feature_planes', feature_planes)
+    model = PolicyValueBackBoneNet(board_width * board_height, feature_planes, checkpoint)
+    export_onnx(model, onnx_file, board_width, board_height, feature_planes)
+    return board_width, board_height, feature_planes
+
+
+class OnnxPolicyValueNet(object):
+    """policy-value network served by ONNX Runtime on the cpu"""
+
+    def __init__(self, onnx_file, board_width, board_height, feature_planes=4,
+                 intra_op_threads=1, inter_op_threads=1):
+        """
+        intra_op_threads: threads used inside one operator (0 lets onnxruntime decide)
+        inter_op_threads: threads running independent operators in parallel
+        one thread each suits many self-play processes per host, more suit a single player
+        """
+        import onnxruntime
+        self.board_width = board_width
+        self.board_height = board_height
+        self.feature_planes = feature_planes
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(onnx_file, options, providers=['CPUExecutionProvider'])
+
+    def policy_value(self, state_batch):
+        """(N, feature_planes, width, height) states -> (N, width*height) probs and (N, 1) values"""
+        state_batch = np.ascontiguousarray(state_batch, dtype=np.float32)
+        act_probs, value = self.session.run(OUTPUT_NAMES, {INPUT_NAME: state_batch})
+        return act_probs, value
+
+    def policy_value_fn(self, board):
+        """
+        input: board
+        output: a list of (action, probability) tuples for each available action and the score of the board state
+        """
+        current_state = board.current_state()
+        current_state = current_state.reshape(-1, self.feature_planes, self.board_width, self.board_height)
+        act_probs, value = self.policy_value(current_state)
+        legal_positions, act_probs = candidate_priors(board, act_probs)
+        act_probs = zip(legal_positions, act_probs)
+        return act_probs, value[0][0]
+
+
+def max_abs_diff(model, onnx_net, state_batch):
+    """largest difference between the pytorch and the onnxruntime outputs on state_batch"""
+    model = unwrap(model)
+    device = next(model.parameters()).device
+    with torch.no_grad():
+        act_probs, value = model(torch.from_numpy(np.asarray(state_batch, dtype=np.float32)).to(device))
+    onnx_probs, onnx_value = onnx_net.policy_value(state_batch)
+    return (np.abs(act_probs.cpu().numpy() - onnx_probs).max(),
+            np.abs(value.cpu().numpy() - onnx_value).max())
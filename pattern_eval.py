@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Line-pattern evaluator of the negamax engine (RenjuAIEval, negamax/src/ai/eval.cc) in numpy:
+every cell of one or many boards is scored at once, in all four directions, with the same
+measurement and pattern table as the C++ evaluator, so the scores are equal to evalMove's.
+
+Uses: priors for the pure MCTS player (policy_value_fn), move ordering (move_order), the pattern
+rollouts of rollout.py (move_scores) and input features (pattern_planes).
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import numpy as np
+from negamax_lib import game_state
+
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1))  # the order of measureAllDirections
+
+# preset patterns of generatePresetPatterns: each a list of (min_occurrence, length, block_count,
+# space_count) that must all match, -1 ignores the field
+PATTERNS = [
+    [(1, 5, 0, 0)],
+    [(1, 4, 0, 0)],
+    [(2, 4, 1, 0)],
+    [(2, 4, -1, 1)],
+    [(1, 4, 1, 0), (1, 4, -1, 1)],
+    [(1, 4, 1, 0), (1, 3, 0, -1)],
+    [(1, 4, -1, 1), (1, 3, 0, -1)],
+    [(2, 3, 0, -1)],
+    [(3, 2, 0, -1)],
+    [(1, 3, 0, -1)],
+    [(1, 2, 0, -1)],
+]
+PATTERN_SCORES = [10000, 700, 700, 700, 700, 500, 500, 300, 50, 20, 9]
+PATTERN_SKIP = [11, 11, 10, 7, 1, 0]  # first pattern tried for the longest measured length 0..5
+WINNING_SCORE = 10000
+THREATENING_SCORE = 300  # evalADM stops matching once the score reaches it
+DEFENCE_WEIGHT = 0.9  # a block scores slightly less than the same shape of our own
+PRIOR_TEMPERATURE = 2.0  # priors are (1 + score) ** (1 / PRIOR_TEMPERATURE)
+
+
+_RAY_INDEX = {}  # board size -> (rows, cols) gather indices of the rays in the padded board
+
+
+def _rays(gs):
+    """(8, B*N*N, K) values of the cells at offsets 1..K from every cell, -1 off the board: the four
+    DIRECTIONS and then the four opposite ones. K = N + 2 leaves at least two off-board cells at the
+    end of every ray."""
+    B, N = gs.shape[0], gs.shape[1]
+    K = N + 2
+    if N not in _RAY_INDEX:
+        steps = np.array(DIRECTIONS + tuple((-dh, -dw) for dh, dw in DIRECTIONS))
+        h, w = np.divmod(np.arange(N * N), N)
+        k = np.arange(1, K + 1)
+        rows = K + h[None, :, None] + steps[:, 0, None, None] * k[None, None, :]
+        cols = K + w[None, :, None] + steps[:, 1, None, None] * k[None, None, :]
+        _RAY_INDEX[N] = rows, cols
+    rows, cols = _RAY_INDEX[N]
+    padded = np.full((B, N + 2 * K, N + 2 * K), -1, dtype=np.int8)
+    padded[:, K:K + N, K:K + N] = gs
+    # (B, 8, N*N, K) -> (8, B*N*N, K)
+    return padded[:, rows, cols].transpose(1, 0, 2, 3).reshape(8, B * N * N, K)
+
+
+def _scan(rays, player):
+    """the parts of measureDirection's walk along each ray that do not depend on the gap allowance:
+    the run of player's stones, the cell ending it and the one after, and the second run and the
+    cell ending it if that cell is skipped as the gap"""
+    K = rays.shape[-1]
+    position = np.arange(K)
+    # first cell at or after each offset that is not player's
+    stop = np.where(rays == player, K - 1, position)
+    stop = np.minimum.accumulate(stop[..., ::-1], axis=-1)[..., ::-1]
+    run1 = stop[..., 0]
+    end1 = np.take_along_axis(rays, run1[..., None], -1)[..., 0]
+    after_index = np.minimum(run1 + 1, K - 1)
+    after = np.take_along_axis(rays, after_index[..., None], -1)[..., 0]
+    run2_end = np.take_along_axis(stop, after_index[..., None], -1)[..., 0]
+    end2 = np.take_along_axis(rays, run2_end[..., None], -1)[..., 0]
+    return run1, end1, after == player, run2_end - after_index, end2
+
+
+def measure(gs, player, consecutive, scan=None):
+    """RenjuAIEval::measureAllDirections of every cell: (B*N*N, 4) length, block_count, space_count.
+    scan: _scan of the rays of gs, shared by the consecutive and the gapped measurement"""
+    run1, end1, after_player, run2, end2 = scan if scan is not None else _scan(_rays(gs), player)
+    can_gap = (end1 == 0) & after_player
+    gap_f = can_gap[:4] & (not consecutive)
+    gap_b = can_gap[4:] & (not consecutive) & ~gap_f
+    gap = np.concatenate([gap_f, gap_b])
+    added = run1 + np.where(gap, run2, 0)
+    unblocked = np.where(gap, end2 == 0, end1 == 0)
+    length = 1 + added[:4] + added[4:]
+    block = 2 - unblocked[:4].astype(np.int32) - unblocked[4:]
+    space = gap_f.astype(np.int32) + gap_b
+    # more than 5 in a row counts as 5, or as a four if it has a gap
+    five = length >= 5
+    block = np.where(five, np.where(space == 0, 0, 1), block)
+    length = np.where(five, np.where(space == 0, 5, 4), length)
+    return length.T, block.T, space.T
+
+
+def eval_adm(lengths, blocks, spaces):
+    """RenjuAIEval::evalADM of (M, 4) measurements"""
+    score = (lengths - 1).sum(axis=1)
+    start = np.array(PATTERN_SKIP)[lengths.max(axis=1)]
+    contrib = np.zeros((len(lengths), len(PATTERNS)), dtype=np.int64)
+    for i, (patterns, pattern_score) in enumerate(zip(PATTERNS, PATTERN_SCORES)):
+        match = None
+        for min_occurrence, length, block_count, space_count in patterns:
+            hit = lengths == length
+            if block_count != -1:
+                hit &= blocks == block_count
+            if space_count != -1:
+                hit &= spaces == space_count
+            count = hit.sum(axis=1) // min_occurrence
+            match = count if match is None else np.minimum(match, count)
+        contrib[:, i] = match * pattern_score * (i >= start)
+    # patterns are matched in order until the score reaches THREATENING_SCORE
+    before = score[:, None] + np.cumsum(contrib, axis=1) - contrib
+    return score + (contrib * (before < THREATENING_SCORE)).sum(axis=1)
+
+
+def eval_moves(gs, player):
+    """RenjuAIEval::evalMove of every cell for player (the cell is scored as if player played there,
+    occupied cells included, as in the engine). gs: (N, N) or (B, N, N) game states, returns int32
+    scores of the same shape."""
+    gs = np.asarray(gs, dtype=np.int8)
+    single = gs.ndim == 2
+    if single:
+        gs = gs[None]
+    scan = _scan(_rays(gs), player)
+    best = np.maximum(eval_adm(*measure(gs, player, False, scan)), eval_adm(*measure(gs, player, True, scan)))
+    best = best.reshape(gs.shape).astype(np.int32)
+    return best[0] if single else best
+
+
+def eval_state(gs, player):
+    """RenjuAIEval::evalState: the sum of evalMove over the board"""
+    return eval_moves(gs, player).sum(axis=(-2, -1))
+
+
+def move_scores(board):
+    """attack + DEFENCE_WEIGHT * defence score of every available move of board, as a dict"""
+    gs = game_state(board)
+    player = board.get_current_player()
+    # the opponent's scores are player's on the board with the colours swapped, one batch for both
+    swapped = np.where(gs == 0, 0, 3 - gs).astype(np.int8)
+    attack, defence = eval_moves(np.stack([gs, swapped]), player).reshape(2, -1)
+    return dict((move, attack[move] + DEFENCE_WEIGHT * defence[move]) for move in board.availables)
+
+
+def move_order(board):
+    """the candidate moves of board, best first by attack and defence score"""
+    scores = move_scores(board)
+    return sorted(board.candidate_moves(), key=lambda move: -scores[move])
+
+
+def policy_value_fn(board):
+    """pattern priors over the candidate moves and a 0 score, a drop-in for mcts_pure.policy_value_fn"""
+    scores = move_scores(board)
+    moves = board.candidate_moves()
+    priors = (1.0 + np.array([scores[move] for move in moves])) ** (1.0 / PRIOR_TEMPERATURE)
+    return zip(moves, priors / priors.sum()), 0
+
+
+def pattern_planes(gs, player):
+    """(..., 2, N, N) float32 features: log-scaled evalMove scores of player and of the opponent
+    on the empty cells, in [0, 1]"""
+    gs = np.asarray(gs, dtype=np.int8)
+    empty = gs == 0
+    planes = [np.log1p(np.minimum(eval_moves(gs, p), WINNING_SCORE)) / np.log1p(WINNING_SCORE) * empty
+              for p in (player, 3 - player)]
+    return np.stack(planes, axis=-3).astype(np.float32)
+
+
+def eval_move_scalar(gs, r, c, player):
+    """RenjuAIEval::evalMove transcribed line by line for one cell, the reference of the parity checks"""
+    N = len(gs)
+
+    def cell(y, x):
+        return gs[y][x] if 0 <= y < N and 0 <= x < N else -1
+
+    best = 0
+    for consecutive in (False, True):
+        adm = []
+        for dr, dc in ((0, 1), (1, 1), (1, 0), (1, -1)):
+            length, block_count, space_count = 1, 2, 0
+            space_allowance = 0 if consecutive else 1
+            for sign in (1, -1):
+                cr, cc = r, c
+                while True:
+                    cr, cc = cr + sign * dr, cc + sign * dc
+                    value = cell(cr, cc)
+                    if value == -1:
+                        break
+                    if value == 0:
+                        if space_allowance > 0 and cell(cr + sign * dr, cc + sign * dc) == player:
+                            space_allowance -= 1
+                            space_count += 1
+                            continue
+                        block_count -= 1
+                        break
+                    if value != player:
+                        break
+                    length += 1
+            if length >= 5:
+                length, block_count = (5, 0) if space_count == 0 else (4, 1)
+            adm.append((length, block_count, space_count))
+        score = sum(length - 1 for length, _, _ in adm)
+        for i in range(PATTERN_SKIP[max(length for length, _, _ in adm)], len(PATTERNS)):
+            match = None
+            for min_occurrence, length, block_count, space_count in PATTERNS[i]:
+                count = sum(1 for l, b, s in adm if l == length and (block_count == -1 or b == block_count) and
+                            (space_count == -1 or s == space_count)) // min_occurrence
+                match = count if match is None else min(match, count)
+            score += match * PATTERN_SCORES[i]
+            if score >= THREATENING_SCORE:
+                break
+        best = max(best, score)
+    return best
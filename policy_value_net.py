@@ -44,13 +44,18 @@ class ResidualBlock(nn.Module):
 
 
 class PolicyValueBackBoneNet(nn.Module):
-    def __init__(self, num_actions, feature_planes=4, checkpoint=None):
+    def __init__(self, num_actions, feature_planes=4, checkpoint=None, channels=None, residual_blocks=None):
+        """channels, residual_blocks: size of the trunk, taken from the arch record of the checkpoint
+        when not given, 256 and 10 without one"""
         super(PolicyValueBackBoneNet, self).__init__()
         self.feature_planes = feature_planes
         self.num_actions = num_actions
+        arch = (checkpoint or {}).get('arch') or {}
+        self.channels = channels if channels is not None else arch.get('channels', 256)
+        self.residual_blocks = residual_blocks if residual_blocks is not None else arch.get('residual_blocks', 10)
 
-        conv1 = BasicConv2d(self.feature_planes, 256, 3, 1, 1)
-        residuals = [ResidualBlock(256) for i in range(10)]
+        conv1 = BasicConv2d(self.feature_planes, self.channels, 3, 1, 1)
+        residuals = [ResidualBlock(self.channels) for i in range(self.residual_blocks)]
         self.seqs = nn.Sequential(*tuple([conv1] + residuals))
 
         '''
@@ -61,17 +66,17 @@ class PolicyValueBackBoneNet(nn.Module):
         self.seqs = nn.Sequential(conv1,conv2,conv3,conv4)
         '''
 
-        self.action_head_conv1 = BasicConv2d(256, 2, 1, 1, 0, use_batchnorm=False, bias=False)
+        self.action_head_conv1 = BasicConv2d(self.channels, 2, 1, 1, 0, use_batchnorm=False, bias=False)
         self.action_head = nn.Linear(2 * self.num_actions, self.num_actions)
-        self.value_head_conv1 = BasicConv2d(256, 1, 1, 1, 0, use_batchnorm=False, bias=False)
+        self.value_head_conv1 = BasicConv2d(self.channels, 1, 1, 1, 0, use_batchnorm=False, bias=False)
         self.value_head_fc1 = nn.Linear(self.num_actions, 256)
         self.value_head = nn.Linear(256, 1)
         self.resume(checkpoint)
 
     def resume(self, checkpoint):
         if checkpoint is not None:
-            if checkpoint['state_dict'].keys()[0].startswith('module.') and \
-                    checkpoint['state_dict'].keys()[-1].startswith('module.'):
+            keys = list(checkpoint['state_dict'].keys())
+            if keys and keys[0].startswith('module.') and keys[-1].startswith('module.'):
                 checkpoint['state_dict'] = dict((k[7:], v) for k, v in checkpoint['state_dict'].items())
             model_dict = self.state_dict()
             model_dict.update(checkpoint['state_dict'])
@@ -89,19 +94,50 @@ class PolicyValueBackBoneNet(nn.Module):
         return F.softmax(action_scores, dim=1), F.tanh(state_values)
 
 
+PRECISIONS = {'fp32': None, 'fp16': torch.float16, 'bf16': torch.bfloat16}
+
+
+def candidate_priors(board, act_probs):
+    """(moves, priors): the candidate moves of board and their probabilities in act_probs (the
+    width*height output of the network for board), renormalised when the moves are restricted"""
+    moves = board.candidate_moves()
+    priors = np.asarray(act_probs).flatten()[moves]
+    if board.candidate_distance > 0:
+        priors = priors / np.sum(priors)
+    return moves, priors
+
+
 class PolicyValueNet(object):
     """policy-value network """
 
-    def __init__(self, board_width, board_height, feature_planes=4, mode='train', checkpoint=None):
+    def __init__(self, board_width, board_height, feature_planes=4, mode='train', checkpoint=None,
+                 precision='fp32', accum_steps=1, channels=None, residual_blocks=None):
+        """
+        channels, residual_blocks: trunk size, from the checkpoint's arch record when not given
+            (256 channels and 10 blocks by default, distilled students are smaller)
+        precision: 'fp32', 'fp16' or 'bf16', the dtype of the forward/backward pass in train_step,
+            parameters and optimizer state stay in fp32; fp16 uses dynamic loss scaling
+        accum_steps: split each train_step batch into this many micro-batches and accumulate
+            their gradients before a single optimizer step
+        """
+        if precision not in PRECISIONS:
+            raise Exception('precision should be one of %s' % ', '.join(sorted(PRECISIONS)))
         self.board_width = board_width
         self.board_height = board_height
         self.feature_planes = feature_planes
         self.checkpoint = checkpoint
         self.mode = mode
+        self.precision = precision
+        self.accum_steps = max(1, int(accum_steps))
+        self.channels = channels
+        self.residual_blocks = residual_blocks
         self.l2_const = 1e-4  # coef of l2 penalty
         self.create_policy_value_net()
         # self.optimizer = self.create_optimizer(self.policy_value_model,'sgd',lr=3e-2,weight_decay=self.l2_const)
         self.optimizer = optim.Adam(self.policy_value_model.parameters(), lr=3e-2, weight_decay=self.l2_const)
+        self.scaler = None
+        if self.precision == 'fp16':
+            self.scaler = torch.cuda.amp.GradScaler()
 
     def create_optimizer(self, model, optimi_str, lr, weight_decay, args={}):
         # setup optimizer
@@ -128,7 +164,10 @@ class PolicyValueNet(object):
 
     def create_policy_value_net(self):
         self.policy_value_model = PolicyValueBackBoneNet(self.board_height * self.board_width,
-                                                         self.feature_planes, self.checkpoint)
+                                                         self.feature_planes, self.checkpoint,
+                                                         self.channels, self.residual_blocks)
+        self.channels = self.policy_value_model.channels
+        self.residual_blocks = self.policy_value_model.residual_blocks
 
         if self.mode == 'train':
             self.policy_value_model = torch.nn.DataParallel(self.policy_value_model).cuda()
@@ -138,49 +177,121 @@ class PolicyValueNet(object):
             self.policy_value_model.eval()
 
     def resume(self, checkpoint):
-        self.policy_value_model.resume(checkpoint)
+        model = self.policy_value_model
+        if isinstance(model, torch.nn.DataParallel):
+            model = model.module
+        model.resume(checkpoint)
+
+    def arch(self):
+        """architecture config recorded in checkpoints"""
+        return {'board_width': self.board_width,
+                'board_height': self.board_height,
+                'feature_planes': self.feature_planes,
+                'channels': self.channels,
+                'residual_blocks': self.residual_blocks}
 
     def policy_value_fn(self, board):
         """
         input: board
         output: a list of (action, probability) tuples for each available action and the score of the board state
         """
-        legal_positions = board.availables
         current_state = board.current_state()
         current_state = current_state.reshape(-1, self.feature_planes, self.board_width, self.board_height)
         current_state = Variable(torch.Tensor(current_state.copy()).type(torch.FloatTensor).cuda())
         act_probs, value = self.policy_value_model(current_state)
         act_probs, value = act_probs.data.cpu().numpy(), value.data.cpu().numpy()
-        act_probs = zip(legal_positions, act_probs.flatten()[legal_positions])
+        legal_positions, act_probs = candidate_priors(board, act_probs)
+        act_probs = zip(legal_positions, act_probs)
         return act_probs, value[0][0]
 
-    def train_step(self, state_input, mcts_probs, winner, learning_rate):
+    def autocast(self):
+        """context of the forward pass for the configured precision"""
+        device_type = next(self.policy_value_model.parameters()).device.type
+        return torch.autocast(device_type=device_type, dtype=PRECISIONS[self.precision],
+                              enabled=self.precision != 'fp32')
+
+    def train_step(self, state_input, mcts_probs, winner, learning_rate, weights=None):
         """
         Three loss terms：
         loss = (z - v)^2 + pi^T * log(p) + c||theta||^2
+        Samples whose mcts_probs are all zero (fast self-play moves) only train the value head,
+        the policy loss is averaged over the samples that have a policy target.
+        weights: optional per-sample importance weights of prioritised replay, scale each sample's loss
         """
         for idx, group in enumerate(self.optimizer.param_groups):
             if 'step' not in group:
                 group['step'] = 0
             group['step'] += 1
             group['lr'] = learning_rate
-        act_probs, value = self.policy_value_model(state_input)
-        value_losses = F.smooth_l1_loss(value, winner)
-        policy_losses = (-act_probs.log() * mcts_probs).sum(dim=-1)
+        batch_size = state_input.size(0)
+        n_policy = (mcts_probs.sum(dim=-1) > 0).sum().item()
+        policy_scale = float(batch_size) / max(n_policy, 1)
+        if self.precision == 'fp32' and self.accum_steps == 1:
+            act_probs, value = self.policy_value_model(state_input)
+            policy_losses = (-act_probs.log() * mcts_probs).sum(dim=-1)
+            self.optimizer.zero_grad()
+            # value is (batch, 1), flattened so the loss is per sample and not broadcast to (batch, batch)
+            value_losses = F.smooth_l1_loss(value.view(-1), winner, reduction='none')
+            if weights is None:
+                loss = policy_losses.mean() * policy_scale + value_losses.mean()
+            else:
+                loss = (weights * (policy_losses * policy_scale + value_losses)).mean()
+            loss.backward()
+            self.optimizer.step()
+            entropy = (-act_probs.log() * act_probs).sum(dim=-1)
+            entropy = entropy.mean()
+            return act_probs, value, loss.item(), entropy.item()
+
         self.optimizer.zero_grad()
-        loss = policy_losses.mean() + value_losses.mean()
-        loss.backward()
-        self.optimizer.step()
-        entropy = (-act_probs.log() * act_probs).sum(dim=-1)
-        entropy = entropy.mean()
-        return act_probs, value, loss.data[0], entropy.data[0]
+        micro_size = (batch_size + self.accum_steps - 1) // self.accum_steps
+        all_probs, all_values = [], []
+        loss_sum, entropy_sum = 0.0, 0.0
+        for start in range(0, batch_size, micro_size):
+            end = min(start + micro_size, batch_size)
+            with self.autocast():
+                act_probs, value = self.policy_value_model(state_input[start:end])
+            # the losses are computed in fp32, log of low precision probabilities underflows
+            act_probs, value = act_probs.float(), value.float()
+            policy_losses = (-(act_probs + 1e-10).log() * mcts_probs[start:end]).sum(dim=-1)
+            value_losses = F.smooth_l1_loss(value.view(-1), winner[start:end], reduction='none')
+            if weights is None:
+                loss = policy_losses.mean() * policy_scale + value_losses.mean()
+            else:
+                loss = (weights[start:end] * (policy_losses * policy_scale + value_losses)).mean()
+            # weight by the micro-batch share so the gradient matches the full batch mean
+            loss = loss * (end - start) / batch_size
+            if self.scaler is not None:
+                self.scaler.scale(loss).backward()
+            else:
+                loss.backward()
+            entropy = (-(act_probs + 1e-10).log() * act_probs).sum(dim=-1)
+            loss_sum += loss.item()
+            entropy_sum += entropy.sum().item()
+            all_probs.append(act_probs.detach())
+            all_values.append(value.detach())
+        if self.scaler is not None:
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+        else:
+            self.optimizer.step()
+        return torch.cat(all_probs), torch.cat(all_values), loss_sum, entropy_sum / batch_size
+
+    def sample_losses(self, state_input, mcts_probs, winner):
+        """per-sample loss (policy cross-entropy + value loss) of the current parameters as a numpy
+        array, the priorities of prioritised replay"""
+        with torch.no_grad():
+            act_probs, value = self.policy_value_model(state_input)
+            act_probs, value = act_probs.float(), value.float()
+            policy_losses = (-(act_probs + 1e-10).log() * mcts_probs).sum(dim=-1)
+            value_losses = F.smooth_l1_loss(value.view(-1), winner, reduction='none')
+        return (policy_losses + value_losses).cpu().numpy()
 
 
 if __name__ == '__main__':
     pvnet = PolicyValueNet(8, 8, 4)
     b1 = Board(height=8, width=8, feature_planes=4, n_in_row=5)
     b1.init_board()
-    print pvnet.policy_value_fn(b1)
+    print(pvnet.policy_value_fn(b1))
 
     # bs1 = torch.from_numpy(np.random.rand(3,4,8,8)).type(torch.FloatTensor).cuda()
     # print pvnet.policy_value_model(Variable(bs1))
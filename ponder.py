@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Pondering: keep searching the MCTS tree in a background thread while the opponent thinks
+
+@author: Zhang Tianming
+"""
+import copy
+import threading
+
+
+class Ponderer(object):
+    """Runs playouts on an MCTS tree from a fixed position until stopped.
+    The thread only touches the tree between start() and stop(); stop() returns as soon as the
+    playout in progress is done, after that the caller owns the tree again.
+    Pondering needs the opponent to think outside the GIL (a human, the negamax process), two
+    pondering python players in one process only take time from each other.
+    """
+
+    def __init__(self, mcts, max_playout=None):
+        self.mcts = mcts
+        self.max_playout = max_playout  # bounds the tree growth while a human takes long
+        self.playouts = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, state):
+        """ponder on state, the position at the tree's root (state is not copied, do not modify it)"""
+        self.stop()
+        self._stop.clear()
+        self.playouts = 0
+        self._thread = threading.Thread(target=self._run, args=(state,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, state):
+        while not self._stop.is_set() and self.mcts._root._proven is None:
+            if self.max_playout is not None and self.playouts >= self.max_playout:
+                break
+            self.mcts._playout(copy.deepcopy(state))
+            self.playouts += 1
+
+    def stop(self):
+        """stop pondering, returns the number of playouts run since start()"""
+        if self._thread is None:
+            return 0
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.playouts
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Background preparation of training mini-batches
+
+@author: Zhang Tianming
+"""
+import random
+import threading
+from collections import deque
+import numpy as np
+import torch
+try:
+    import Queue as queue
+except ImportError:
+    import queue  # py3k
+
+
+class BatchPrefetcher(object):
+    """Samples mini-batches from the replay buffer in a background thread, converts them to
+    float32 tensors in pinned memory and keeps up to `depth` of them ready, so the host side
+    work of the next batch overlaps with the train step of the current one.
+    data_buffer: a deque of samples, or a ReplayBuffer (or MixedReplay)
+    """
+
+    def __init__(self, data_buffer, buffer_lock, batch_size, depth=2):
+        self.data_buffer = data_buffer
+        self.buffer_lock = buffer_lock
+        self.batch_size = batch_size
+        self.batches = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.use_pinned = torch.cuda.is_available()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _sample(self):
+        with self.buffer_lock:
+            if len(self.data_buffer) < self.batch_size:
+                return None
+            if isinstance(self.data_buffer, deque):
+                ids, weights = None, None
+                mini_batch = random.sample(self.data_buffer, self.batch_size)
+            else:
+                ids, mini_batch, weights = self.data_buffer.sample(self.batch_size)
+        state_batch = np.array([data[0] for data in mini_batch], dtype=np.float32)
+        mcts_probs_batch = np.array([data[1] for data in mini_batch], dtype=np.float32)
+        winner_batch = np.array([data[2] for data in mini_batch], dtype=np.float32)
+        batch = [torch.from_numpy(state_batch), torch.from_numpy(mcts_probs_batch), torch.from_numpy(winner_batch)]
+        if weights is not None:
+            batch.append(torch.from_numpy(weights))
+        if self.use_pinned:
+            batch = [t.pin_memory() for t in batch]
+        if weights is None:
+            batch.append(None)
+        return batch + [ids]
+
+    def _run(self):
+        while not self.stopped.is_set():
+            batch = self._sample()
+            if batch is None:
+                self.stopped.wait(0.1)
+                continue
+            while not self.stopped.is_set():
+                try:
+                    self.batches.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def next(self):
+        """returns (state_batch, mcts_probs_batch, winner_batch, weights, ids), the tensors on the device,
+        the copies are issued asynchronously from pinned memory. weights (importance weights) is None
+        unless the buffer is prioritised, ids (for update_priorities) is None for a deque."""
+        batch = self.batches.get()
+        if self.use_pinned:
+            batch = [t.cuda(non_blocking=True) if t is not None else None for t in batch[:4]] + batch[4:]
+        return batch
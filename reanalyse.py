@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Reanalyse: refresh the targets of stored self-play samples with the latest network. The positions
+are searched again by mcts_alphazero.MCTS, with the trees of a batch of positions advancing in
+lock-step so the network evaluates one leaf of every tree in a single call.
+
+Sources: the replay buffer of train_parallel (reanalyse_worker, a trainer role next to the self-play
+workers) or pickled sample files such as the samples.*.pkl uploads of the distributed workers:
+    python reanalyse.py --model_file checkpoint.pth.tar --out reanalysed.pkl dist/data/samples.*.pkl
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import argparse
+import copy
+import os
+import time
+import numpy as np
+import torch
+from checkpoint import load_weights, read_generation
+from compiled_inference import CompiledPolicyValue
+from distill import load_model, load_samples, save_samples
+from game import Board
+from mcts_alphazero import MCTS
+from policy_value_net import candidate_priors
+
+
+def board_from_state(state, board_width, board_height, n_in_row=5, candidate_distance=0):
+    """a Board whose current_state() is state, the feature planes of a sample (any layout of
+    Board.current_state, augmented ones included). Player 1 moves first; the stones older than the
+    history planes tell are placed in arbitrary order."""
+    feature_planes = state.shape[0]
+    planes = np.asarray(state)[:, ::-1, :]  # current_state flips the rows
+    last_plane = {4: 2, 6: 4, 8: 6}[feature_planes]
+    board = Board(width=board_width, height=board_height, n_in_row=n_in_row,
+                  feature_planes=feature_planes, candidate_distance=candidate_distance)
+    board.init_board()
+    own = set(np.flatnonzero(planes[0]))
+    opponent = set(np.flatnonzero(planes[1]))
+    n_stones = len(own) + len(opponent)
+    if n_stones == 0:
+        return board
+    current, other = board.players if n_stones % 2 == 0 else board.players[::-1]
+    last = int(np.flatnonzero(planes[last_plane])[0])
+    # current_state puts the stones of all but the last two moves on planes 2 and 3
+    older = set(np.flatnonzero(planes[2] + planes[3])) if feature_planes >= 6 and n_stones > 2 else set()
+    recent = (own | opponent) - older - set([last])
+    for move in sorted(older) + sorted(recent) + [last]:
+        board.states[int(move)] = current if move in own else other
+        board.availables.remove(move)
+        board.moves.append(int(move))
+        if board.candidate_distance > 0:
+            board.update_candidates(move)
+    board.current_player = current
+    board.last_move = last
+    return board
+
+
+class Reanalyser(object):
+    """Searches stored positions again with net (anything with policy_value(state_batch) for batches
+    of batch_size states, e.g. a CompiledPolicyValue(max_batch=batch_size)) and returns the samples
+    with refreshed targets: mcts_prob from the visit counts at temp, as in self-play, and
+    winner_z mixed with the search value of the root by value_weight (0 keeps the game outcome).
+    Value-only samples (fast moves, all-zero mcts_prob) get a policy target too.
+    """
+
+    def __init__(self, net, board_width, board_height, n_in_row=5, c_puct=5, n_playout=400,
+                 batch_size=64, temp=1.0, value_weight=0.5, candidate_distance=0, use_threats=False):
+        self.net = net
+        self.board_width = board_width
+        self.board_height = board_height
+        self.n_in_row = n_in_row
+        self.c_puct = c_puct
+        self.n_playout = n_playout
+        self.batch_size = batch_size
+        self.temp = temp
+        self.value_weight = value_weight
+        self.candidate_distance = candidate_distance
+        self.use_threats = use_threats
+        self.evaluated_states = 0  # positions sent to the network
+        self.reanalysed = 0  # samples refreshed
+
+    def reanalyse(self, samples):
+        """[(state, mcts_prob, winner_z), ...] -> the same samples with refreshed targets"""
+        refreshed = []
+        for start in range(0, len(samples), self.batch_size):
+            refreshed.extend(self._reanalyse_batch(samples[start:start + self.batch_size]))
+        return refreshed
+
+    def _reanalyse_batch(self, samples):
+        boards = [board_from_state(state, self.board_width, self.board_height, self.n_in_row,
+                                   self.candidate_distance) for state, mcts_prob, winner in samples]
+        trees = [MCTS(None, self.c_puct, self.n_playout, use_threats=self.use_threats) for board in boards]
+        for i in range(self.n_playout):
+            pending = []
+            for tree, board in zip(trees, boards):
+                if tree._root._proven is not None:
+                    continue
+                state = copy.deepcopy(board)
+                leaf = tree._select_leaf(state)
+                if leaf is not None:
+                    pending.append((tree, leaf, state))
+            if not pending:
+                continue
+            act_probs, values = self.net.policy_value(np.array([state.current_state() for _, _, state in pending]))
+            self.evaluated_states += len(pending)
+            for (tree, leaf, state), probs, value in zip(pending, act_probs, values):
+                legal_positions, priors = candidate_priors(state, probs)
+                tree._backup_leaf(leaf, zip(legal_positions, priors), float(value[0]))
+        refreshed = []
+        for (state, mcts_prob, winner), tree in zip(samples, trees):
+            acts, probs = tree.move_probs(self.temp)
+            move_probs = np.zeros(self.board_width * self.board_height, dtype=np.float32)
+            move_probs[list(acts)] = probs
+            winner_z = (1.0 - self.value_weight) * winner + self.value_weight * tree.root_value()
+            refreshed.append((state, move_probs, np.float32(winner_z)))
+        self.reanalysed += len(refreshed)
+        return refreshed
+
+
+def load_net(model_file, board_width, board_height, feature_planes, batch_size):
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = load_model(model_file, board_width, board_height, feature_planes, device)
+    return CompiledPolicyValue(model, board_width, board_height, model.feature_planes, max_batch=batch_size)
+
+
+def reanalyse_worker(gpu_id, job_channel, result_channel, model_file,
+                     board_width, board_height, feature_planes, n_in_row,
+                     c_puct, n_playout, batch_size, temp, value_weight):
+    """reanalyse role of train_parallel: takes lists of samples from job_channel, refreshes them
+    with the latest checkpoint of model_file and puts them on result_channel tagged with the
+    generation that searched them"""
+    os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
+    generation, reanalyser = -1, None
+    while True:
+        samples = job_channel.get()
+        latest = read_generation(model_file)
+        if latest < 0:
+            continue  # nothing better than the self-play targets before the first checkpoint
+        if latest > generation:
+            if reanalyser is None:
+                net = load_net(model_file, board_width, board_height, feature_planes, batch_size)
+                reanalyser = Reanalyser(net, board_width, board_height, n_in_row, c_puct, n_playout,
+                                        batch_size, temp, value_weight)
+            else:
+                reanalyser.net.model.resume(load_weights(model_file))
+                reanalyser.net.update()
+            generation = latest
+        result_channel.put(reanalyser.reanalyse(samples), generation)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='refresh the targets of stored self-play samples')
+    parser.add_argument('samples', nargs='+', help='pickled sample files')
+    parser.add_argument('--model_file', default='checkpoint.pth.tar')
+    parser.add_argument('--out', default='reanalysed.pkl')
+    parser.add_argument('--board_size', type=int, default=11)
+    parser.add_argument('--feature_planes', type=int, default=8)
+    parser.add_argument('--n_playout', type=int, default=400)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--temp', type=float, default=1.0)
+    parser.add_argument('--value_weight', type=float, default=0.5)
+    return parser.parse_args()
+
+
+def main(args):
+    samples = load_samples(args.samples)
+    net = load_net(args.model_file, args.board_size, args.board_size, args.feature_planes, args.batch_size)
+    reanalyser = Reanalyser(net, args.board_size, args.board_size, n_playout=args.n_playout,
+                            batch_size=args.batch_size, temp=args.temp, value_weight=args.value_weight)
+    t1 = time.time()
+    refreshed = reanalyser.reanalyse(samples)
+    t2 = time.time()
+    save_samples(refreshed, args.out)
+    print("samples:{}, time_used:{:.3f}, samples_per_second:{:.2f}, evaluated_states:{}".format(
+        len(refreshed), t2 - t1, len(refreshed) / (t2 - t1), reanalyser.evaluated_states))
+
+
+if __name__ == '__main__':
+    main(parse_arguments())
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Replay buffer of self-play samples tagged with the model generation and the game that produced
+them: a sliding window over generations drops samples of models that are too old, and optional
+prioritised sampling (proportional to the training loss, from a sum tree) with importance weights
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import numpy as np
+
+
+class SumTree(object):
+    """priorities of capacity slots in a binary tree of partial sums, so setting a priority and
+    finding the slot holding a point of the cumulative sum both take O(log capacity)"""
+
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, slots):
+        return self.tree[self.size + np.asarray(slots)]
+
+    def update(self, slots, priorities):
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return
+        self.tree[self.size + slots] = priorities
+        nodes = np.unique(self.size + slots)
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """slots whose cumulative priority range contains each of values (in [0, total))"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.size:
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= np.where(go_right, left, 0.0)
+            nodes = 2 * nodes + go_right
+        return nodes - self.size
+
+
+class ReplayBuffer(object):
+    """A ring of capacity samples (state, mcts_prob, winner_z) with the generation and the game id
+    of each. Samples of generations more than generation_window behind the newest one (added, or
+    passed to advance by the trainer) are dropped, None keeps everything the ring holds.
+
+    prioritized: sample slot i with probability p_i / sum(p), p_i = (loss_i + epsilon) ** alpha
+        from update_priorities (new samples get the highest priority seen so far); sample()
+        returns the importance weights (N * P(i)) ** -beta normalised by their maximum
+    Not thread safe, callers hold their buffer lock.
+    """
+
+    def __init__(self, capacity, generation_window=None, prioritized=False, alpha=0.6, beta=0.4, epsilon=1e-3):
+        self.capacity = capacity
+        self.generation_window = generation_window
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.samples = [None] * capacity
+        self.generations = np.zeros(capacity, dtype=np.int64)
+        self.game_ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+        self.written = 0  # samples added so far, sample ids are positions in this sequence
+        self.newest_generation = None
+        self.n_alive = 0
+
+    def __len__(self):
+        return self.n_alive
+
+    def extend(self, samples, generation=0, game_id=-1):
+        """add the samples of one game (or any list of samples) produced by generation, returns the
+        number added, 0 if generation is already out of the window"""
+        self.advance(generation)
+        if self.generation_window is not None and generation <= self.newest_generation - self.generation_window:
+            return 0
+        samples = list(samples)[-self.capacity:]
+        slots = (self.written + np.arange(len(samples))) % self.capacity
+        for slot, sample in zip(slots, samples):
+            self.samples[slot] = sample
+        self.n_alive += len(slots) - int(self.alive[slots].sum())
+        self.alive[slots] = True
+        self.generations[slots] = generation
+        self.game_ids[slots] = game_id
+        if self.prioritized:
+            self.tree.update(slots, self.max_priority)
+        self.written += len(samples)
+        return len(samples)
+
+    def advance(self, generation):
+        """move the window to end at generation (the trainer's latest checkpoint), if it is newer"""
+        if self.newest_generation is not None and generation <= self.newest_generation:
+            return
+        self.newest_generation = generation
+        if self.generation_window is None:
+            return
+        stale = np.flatnonzero(self.alive & (self.generations <= self.newest_generation - self.generation_window))
+        if len(stale) == 0:
+            return
+        self.alive[stale] = False
+        self.n_alive -= len(stale)
+        for slot in stale:
+            self.samples[slot] = None
+        if self.prioritized:
+            self.tree.update(stale, 0.0)
+
+    def sample(self, batch_size):
+        """returns (ids, samples, weights): ids for update_priorities, weights None unless prioritized.
+        Uniform sampling is without replacement, prioritised sampling with replacement."""
+        if not self.prioritized:
+            slots = np.random.choice(np.flatnonzero(self.alive), batch_size, replace=False)
+            weights = None
+        else:
+            # one draw from each of batch_size equal segments of the cumulative priority
+            total = self.tree.total()
+            values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * total / batch_size
+            slots = self.tree.find(np.minimum(values, total * (1 - 1e-12)))
+            # rounding in the partial sums can land on an empty slot
+            dead = ~self.alive[slots]
+            if dead.any():
+                slots[dead] = np.random.choice(np.flatnonzero(self.alive), dead.sum())
+            probs = self.tree.get(slots) / total
+            weights = (self.n_alive * probs) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+        ids = self.written - 1 - (self.written - 1 - slots) % self.capacity
+        return ids, [self.samples[slot] for slot in slots], weights
+
+    def update_priorities(self, ids, losses):
+        """set the priorities of the sampled ids from their losses, samples overwritten or dropped
+        since they were sampled are skipped"""
+        if not self.prioritized:
+            return
+        ids, losses = np.asarray(ids), np.asarray(losses, dtype=np.float64)
+        slots = ids % self.capacity
+        keep = (ids >= self.written - self.capacity) & self.alive[slots]
+        if not keep.any():
+            return
+        priorities = (np.abs(losses[keep]) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(slots[keep], priorities)
+
+    def occupancy(self):
+        """{generation: samples held}"""
+        generations, counts = np.unique(self.generations[self.alive], return_counts=True)
+        return dict(zip(generations.tolist(), counts.tolist()))
+
+    def n_games(self):
+        return len(np.unique(self.game_ids[self.alive]))
+
+    def summary(self):
+        occupancy = self.occupancy()
+        return "samples:{}, games:{}, generations:{}".format(
+            self.n_alive, self.n_games(), ",".join("{}:{}".format(g, n) for g, n in sorted(occupancy.items())))
+
+
+class MixedReplay(object):
+    """Mini-batches with a fixed share of samples from a second buffer: reanalysed_fraction of each
+    batch comes from reanalysed (samples whose targets reanalyse.py refreshed), the rest from fresh
+    self-play; while reanalysed holds too few samples the batch is all fresh. Has the sampling
+    interface of ReplayBuffer, ids are (fresh ids, reanalysed ids)."""
+
+    def __init__(self, fresh, reanalysed, reanalysed_fraction=0.25):
+        self.fresh = fresh
+        self.reanalysed = reanalysed
+        self.reanalysed_fraction = reanalysed_fraction
+
+    def __len__(self):
+        return len(self.fresh)
+
+    def sample(self, batch_size):
+        n_reanalysed = int(round(batch_size * self.reanalysed_fraction))
+        if len(self.reanalysed) < n_reanalysed:
+            n_reanalysed = 0
+        fresh_ids, samples, fresh_weights = self.fresh.sample(batch_size - n_reanalysed)
+        reanalysed_ids, reanalysed_samples, reanalysed_weights = \
+            self.reanalysed.sample(n_reanalysed) if n_reanalysed else (np.zeros(0, dtype=np.int64), [], None)
+        weights = None
+        if fresh_weights is not None or reanalysed_weights is not None:
+            weights = np.concatenate([w if w is not None else np.ones(n, dtype=np.float32) for w, n in
+                                      ((fresh_weights, len(samples)), (reanalysed_weights, n_reanalysed))])
+        return (fresh_ids, reanalysed_ids), samples + reanalysed_samples, weights
+
+    def update_priorities(self, ids, losses):
+        fresh_ids, reanalysed_ids = ids
+        self.fresh.update_priorities(fresh_ids, losses[:len(fresh_ids)])
+        self.reanalysed.update_priorities(reanalysed_ids, losses[len(fresh_ids):])
+
+    def summary(self):
+        return "fresh {}, reanalysed {}".format(self.fresh.summary(), self.reanalysed.summary())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Resignation for self-play: a side resigns once the MCTS root value drops below a threshold.
+A fraction of the games is played out with resignation disabled, they tell how often a
+resignation would have been wrong, and the threshold is tuned to keep that rate on target.
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import random
+from collections import deque
+
+
+class ResignPolicy(object):
+    """Resignation threshold on the root value of the player to move, tuned online.
+    For every played-out game, each side contributes (the lowest root value it saw, whether it
+    went on to lose). A resignation at threshold t is false if the side's lowest value is <= t
+    but it did not lose (win or tie). tune() picks the highest threshold whose false rate over
+    the recent samples stays within target_false_rate.
+    """
+
+    def __init__(self, threshold=-0.9, playthrough_prob=0.1, target_false_rate=0.05,
+                 window=400, min_samples=40, min_threshold=-0.999, max_threshold=-0.5):
+        self.threshold = threshold
+        self.playthrough_prob = playthrough_prob  # games played to the end to measure false resignations
+        self.target_false_rate = target_false_rate
+        self.min_samples = min_samples  # would-be resignations needed before the threshold is tuned
+        # the tuned threshold stays in [min_threshold, max_threshold]
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.samples = deque(maxlen=window)  # (lowest root value, lost) of each side of played-out games
+        self.games = 0
+        self.resigned_games = 0
+        self.playthrough_games = 0
+
+    def new_game(self):
+        """returns True if resignation is enabled in the game about to start"""
+        self.games += 1
+        if random.random() < self.playthrough_prob:
+            self.playthrough_games += 1
+            return False
+        return True
+
+    def should_resign(self, value):
+        return value <= self.threshold
+
+    def record_resignation(self):
+        self.resigned_games += 1
+
+    def record_playthrough(self, min_values, winner):
+        """min_values: {player: lowest root value seen by player}, winner: as returned by game_end"""
+        for player, value in min_values.items():
+            self.samples.append((value, winner != -1 and winner != player))
+        return self.tune()
+
+    def false_rate(self, threshold=None):
+        """fraction of the would-be resignations at threshold that were not lost, and their number"""
+        threshold = self.threshold if threshold is None else threshold
+        resigned = [lost for value, lost in self.samples if value <= threshold]
+        if not resigned:
+            return 0.0, 0
+        return 1.0 - sum(resigned) / float(len(resigned)), len(resigned)
+
+    def tune(self):
+        """move the threshold to the highest value meeting the false rate target,
+        returns True if it changed"""
+        candidates = sorted(set(value for value, lost in self.samples
+                                if self.min_threshold <= value <= self.max_threshold), reverse=True)
+        for t in candidates:
+            rate, n = self.false_rate(t)
+            if n < self.min_samples:
+                # the lower thresholds see even fewer resignations
+                return False
+            if rate <= self.target_false_rate:
+                changed = t != self.threshold
+                self.threshold = t
+                return changed
+        return False
+
+    def __str__(self):
+        rate, n = self.false_rate()
+        return "resign_threshold:{:.3f}, false_resign_rate:{:.3f}, would_resign:{}, games:{}, " \
+               "resigned_games:{}, playthrough_games:{}".format(
+                   self.threshold, rate, n, self.games, self.resigned_games, self.playthrough_games)
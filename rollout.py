@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Rollout policies for the pure MCTS player, instead of the uniformly random rollout_policy_fn:
+
+pattern_rollout_fn   -- cells on the lines through the last two moves, scored for attack and
+                        defence by the negamax evaluator's patterns (pattern_eval.py)
+network_rollout_fn   -- moves sampled from a small policy network, one position per call
+BatchedRollout       -- n rollouts of a leaf played in lock-step on a BoardBatch, the network
+                        evaluates all of them in one call per ply; used as rollout_value_fn
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import random
+import numpy as np
+import pattern_eval
+from board_batch import BoardBatch
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def local_moves(board, n_last=2, reach=4):
+    """empty cells within reach along the four lines through each of the last n_last moves,
+    the only cells whose pattern score those moves changed"""
+    width, height, states = board.width, board.height, board.states
+    moves = set()
+    for last in board.moves[-n_last:]:
+        h, w = last // width, last % width
+        for dh, dw in DIRECTIONS:
+            for step in range(-reach, reach + 1):
+                y, x = h + step * dh, w + step * dw
+                if 0 <= y < height and 0 <= x < width and y * width + x not in states:
+                    moves.add(y * width + x)
+    return moves
+
+
+def pattern_rollout_fn(board):
+    """rollout_fn for mcts_pure: the best scoring local move for attack + defence
+    (pattern_eval.move_scores), ties broken at random; a random move on an empty board or when no
+    local cell is left"""
+    moves = local_moves(board)
+    if not moves:
+        return [(random.choice(board.availables), 1.0)]
+    scores = pattern_eval.move_scores(board)
+    return [(move, scores[move] + random.random()) for move in moves]
+
+
+def network_rollout_fn(net):
+    """rollout_fn for mcts_pure sampling moves from the policy of net (anything with
+    policy_value(state_batch), e.g. a CompiledPolicyValue): the scores are log p + Gumbel noise,
+    so the highest one is a sample from p over the available moves"""
+    def fn(board):
+        act_probs, _ = net.policy_value(board.current_state()[None])
+        moves = board.availables
+        probs = act_probs[0][moves]
+        noise = -np.log(-np.log(np.random.uniform(1e-10, 1.0, len(moves))))
+        return zip(moves, np.log(probs + 1e-10) + noise)
+    return fn
+
+
+class BatchedRollout(object):
+    """rollout_value_fn for mcts_pure: n_rollouts rollouts of the leaf are played together, the
+    policy of net picks the moves of all running games in one batched call per ply (Gumbel-max
+    sampling, as network_rollout_fn). Returns the mean outcome for the player to move at the leaf.
+    net must accept batches of n_rollouts states (CompiledPolicyValue(max_batch=n_rollouts)).
+    """
+
+    def __init__(self, net, n_rollouts=8):
+        self.net = net
+        self.n_rollouts = n_rollouts
+        self.evaluated_states = 0  # positions sent to the network
+
+    def __call__(self, state):
+        batch = BoardBatch.from_boards([state] * self.n_rollouts)
+        player = state.get_current_player()
+        while True:
+            end, winner = batch.game_end()
+            running = np.nonzero(~end)[0]
+            if len(running) == 0:
+                break
+            act_probs, _ = self.net.policy_value(batch.current_state()[running])
+            self.evaluated_states += len(running)
+            legal = batch.legal_mask()[running]
+            gumbel = -np.log(-np.log(np.random.uniform(1e-10, 1.0, legal.shape)))
+            scores = np.where(legal, np.log(act_probs + 1e-10) + gumbel, -np.inf)
+            moves = np.zeros(self.n_rollouts, dtype=np.int64)
+            moves[running] = scores.argmax(axis=1)
+            batch.do_move(moves)
+        outcomes = np.where(winner == player, 1.0, np.where(winner == -1, 0.0, -1.0))
+        return float(outcomes.mean())
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Transport of self-play samples from worker processes to the trainer, one message per game
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import multiprocessing
+import time
+import numpy as np
+
+
+def pack_game(play_data):
+    """[(state, mcts_prob, winner_z), ...] -> contiguous (states, mcts_probs, winners) arrays,
+    the feature planes are 0/1 so states travel as uint8"""
+    states, mcts_probs, winners = zip(*play_data)
+    return (np.ascontiguousarray(states, dtype=np.uint8),
+            np.ascontiguousarray(mcts_probs, dtype=np.float32),
+            np.ascontiguousarray(winners, dtype=np.float32))
+
+
+def unpack_game(game):
+    """inverse of pack_game, the per-sample tuples are views into the game arrays"""
+    states, mcts_probs, winners = game
+    return list(zip(states, mcts_probs, winners))
+
+
+class GameChannel(object):
+    """A bounded pipe-backed queue of packed games.
+    put() blocks while max_games games are waiting, which throttles the producers
+    instead of having them poll the queue size.
+    """
+
+    def __init__(self, max_games=256):
+        self.queue = multiprocessing.Queue(maxsize=max_games)
+
+    def put(self, play_data, generation=0):
+        """generation: of the model that played the game"""
+        self.queue.put((generation, pack_game(play_data)))
+
+    def get(self, timeout=None):
+        """returns the samples of one game as a list of (state, mcts_prob, winner_z)"""
+        return self.get_game(timeout)[1]
+
+    def get_game(self, timeout=None):
+        """returns (generation, samples) of one game"""
+        generation, game = self.queue.get(timeout=timeout)
+        return generation, unpack_game(game)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+def produce_manager(data_queue, data_queue_lock, play_data, n_games):
+    for i in range(n_games):
+        data_queue_lock.acquire()
+        for data in play_data:
+            data_queue.put(data)
+        data_queue_lock.release()
+
+
+def produce_channel(channel, play_data, n_games):
+    for i in range(n_games):
+        channel.put(play_data)
+
+
+def fake_game(n_moves, board_size, feature_planes):
+    """augmented samples of one game, in the layout produced by get_equi_data"""
+    play_data = []
+    for i in range(n_moves * 8):
+        state = (np.random.rand(feature_planes, board_size, board_size) > 0.8).astype(np.float64)
+        prob = np.random.dirichlet(np.ones(board_size * board_size))
+        play_data.append((state, prob, np.float64(1.0)))
+    return play_data
+
+
+if __name__ == '__main__':
+    n_producers, n_games, n_moves = 4, 20, 40
+    play_data = fake_game(n_moves, 11, 8)
+    n_samples = n_producers * n_games * len(play_data)
+
+    manager = multiprocessing.Manager()
+    data_queue = manager.Queue(maxsize=5120)
+    data_queue_lock = manager.Lock()
+    procs = [multiprocessing.Process(target=produce_manager, args=(data_queue, data_queue_lock, play_data, n_games))
+             for i in range(n_producers)]
+    t1 = time.time()
+    for proc in procs:
+        proc.start()
+    for i in range(n_samples):
+        data_queue.get()
+    t2 = time.time()
+    for proc in procs:
+        proc.join()
+    print("transport:manager_queue, samples:{}, samples_per_second:{:.0f}".format(n_samples, n_samples / (t2 - t1)))
+
+    channel = GameChannel(max_games=16)
+    procs = [multiprocessing.Process(target=produce_channel, args=(channel, play_data, n_games))
+             for i in range(n_producers)]
+    t1 = time.time()
+    for proc in procs:
+        proc.start()
+    received = 0
+    while received < n_samples:
+        received += len(channel.get())
+    t2 = time.time()
+    for proc in procs:
+        proc.join()
+    print("transport:game_channel, samples:{}, samples_per_second:{:.0f}".format(n_samples, n_samples / (t2 - t1)))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Search budgets for the MCTS players: early termination once the best root move is settled,
+a per-game clock split over the remaining moves, and per-move search statistics
+
+@author: Zhang Tianming
+"""
+import time
+
+
+def leader_is_safe(root, remaining_playouts):
+    """whether the most visited root child keeps the lead even if every remaining playout
+    goes to the runner-up"""
+    visits = sorted((node._n_visits for node in root._children.values()), reverse=True)
+    if len(visits) < 2:
+        return len(visits) == 1
+    return visits[0] - visits[1] > remaining_playouts
+
+
+class GameClock(object):
+    """Total thinking time for one game, spent move by move.
+    Each move gets the time left divided by the number of own moves the game is still expected
+    to last, which is estimated from the empty cells and never taken below min_moves_left, so
+    the clock is not burnt in the opening and still lasts a long endgame.
+    """
+
+    def __init__(self, game_time, min_moves_left=10, moves_left_ratio=0.15, min_move_time=0.05):
+        self.game_time = game_time
+        self.min_moves_left = min_moves_left
+        self.moves_left_ratio = moves_left_ratio  # own moves left per empty cell
+        self.min_move_time = min_move_time
+        self.reset()
+
+    def reset(self):
+        self.time_left = self.game_time
+
+    def budget(self, board):
+        """seconds for the next move on board"""
+        moves_left = max(self.min_moves_left, int(len(board.availables) * self.moves_left_ratio))
+        return max(self.min_move_time, self.time_left / float(moves_left))
+
+    def spend(self, seconds):
+        self.time_left = max(0.0, self.time_left - seconds)
+
+
+def percentile(values, q):
+    """q-th percentile of values by linear interpolation, q in [0, 100]"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    pos = (len(values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+class SearchStats(object):
+    """playouts and wall-clock latency of every search, and what tree reuse contributed"""
+
+    def __init__(self):
+        self.playouts = []
+        self.latencies = []
+        self.early_stops = 0
+        self.reused_visits = []  # root visits already in the tree when the search started
+        self.ponder_playouts = []  # playouts run during the opponent's turn
+
+    def record(self, n_playout, seconds, stopped_early=False):
+        self.playouts.append(n_playout)
+        self.latencies.append(seconds)
+        self.early_stops += int(stopped_early)
+
+    def record_reuse(self, reused_visits, ponder_playouts=0):
+        self.reused_visits.append(reused_visits)
+        self.ponder_playouts.append(ponder_playouts)
+
+    def summary(self):
+        n = max(1, len(self.playouts))
+        return {'moves': len(self.playouts),
+                'avg_playouts': sum(self.playouts) / float(n),
+                'early_stops': self.early_stops,
+                'avg_reused_visits': sum(self.reused_visits) / float(max(1, len(self.reused_visits))),
+                'avg_ponder_playouts': sum(self.ponder_playouts) / float(max(1, len(self.ponder_playouts))),
+                'latency_p50': percentile(self.latencies, 50),
+                'latency_p90': percentile(self.latencies, 90),
+                'latency_p99': percentile(self.latencies, 99),
+                'latency_max': max(self.latencies) if self.latencies else 0.0}
+
+    def __str__(self):
+        return "moves:{moves}, avg_playouts:{avg_playouts:.1f}, early_stops:{early_stops}, " \
+               "avg_reused_visits:{avg_reused_visits:.1f}, avg_ponder_playouts:{avg_ponder_playouts:.1f}, " \
+               "latency_p50:{latency_p50:.3f}, latency_p90:{latency_p90:.3f}, " \
+               "latency_p99:{latency_p99:.3f}, latency_max:{latency_max:.3f}".format(**self.summary())
+
+
+class MoveBudget(object):
+    """Search budget of a player's moves: n_playout playouts (seconds() is None), time_budget
+    seconds per move, or a share of game_time (seconds for the whole game) if given. Every search
+    is charged to the clock and recorded in stats.
+    """
+
+    def __init__(self, time_budget=None, game_time=None):
+        self.time_budget = time_budget
+        self.clock = GameClock(game_time) if game_time is not None else None
+        self.stats = SearchStats()
+
+    def reset(self):
+        """start of a new game"""
+        if self.clock is not None:
+            self.clock.reset()
+
+    def seconds(self, board):
+        """seconds for the next move on board, None to search n_playout playouts"""
+        if self.clock is not None:
+            return self.clock.budget(board)
+        return self.time_budget
+
+    def record(self, start, n_playout, stopped_early):
+        """a search that started at start has finished after n_playout playouts"""
+        elapsed = time.time() - start
+        if self.clock is not None:
+            self.clock.spend(elapsed)
+        self.stats.record(n_playout, elapsed, stopped_early)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Model weights published once into shared memory and mapped by every self-play worker
+
+@author: Zhang Tianming
+"""
+import multiprocessing
+import torch
+
+
+def strip_module(name):
+    """drop the DataParallel prefix"""
+    return name[7:] if name.startswith('module.') else name
+
+
+def unwrap(model):
+    if isinstance(model, torch.nn.DataParallel):
+        return model.module
+    return model
+
+
+class SharedWeights(object):
+    """A few slots of host tensors in shared memory, one generation of the weights per slot.
+    The trainer fills a slot nobody is using and then flips `active` to it under the lock,
+    so workers always see a complete generation. Workers pin the slot they read from,
+    a pinned slot is never overwritten.
+    Must be created before the worker processes are started.
+    """
+
+    def __init__(self, state_dict, n_slots=3):
+        self.names = [strip_module(k) for k in state_dict.keys()]
+        self.slots = []
+        for i in range(n_slots):
+            slot = dict((strip_module(k), torch.zeros(v.size(), dtype=v.dtype).share_memory_())
+                        for k, v in state_dict.items())
+            self.slots.append(slot)
+        self.lock = multiprocessing.Lock()
+        self.generation = multiprocessing.Value('l', -1, lock=False)
+        self.active = multiprocessing.Value('i', -1, lock=False)
+        self.slot_generation = multiprocessing.Array('l', [-1] * n_slots, lock=False)
+        self.pins = multiprocessing.Array('i', [0] * n_slots, lock=False)
+
+    def nbytes(self):
+        """shared memory used by one slot"""
+        return sum(t.numel() * t.element_size() for t in self.slots[0].values())
+
+    def publish(self, state_dict, generation):
+        """copy state_dict into a free slot and make it the active generation.
+        Returns False (nothing published) if every other slot is still pinned by a worker."""
+        with self.lock:
+            free = [s for s in range(len(self.slots))
+                    if s != self.active.value and self.pins[s] == 0]
+        if not free:
+            return False
+        slot = free[0]
+        # workers only pin the active slot, so this one can be filled outside the lock
+        with torch.no_grad():
+            for k, v in state_dict.items():
+                self.slots[slot][strip_module(k)].copy_(v)
+        with self.lock:
+            self.slot_generation[slot] = generation
+            self.active.value = slot
+            self.generation.value = generation
+        return True
+
+    def acquire(self):
+        """pin the active slot, returns (slot, generation), (-1, -1) if nothing is published yet"""
+        with self.lock:
+            slot = self.active.value
+            if slot < 0:
+                return -1, -1
+            self.pins[slot] += 1
+            return slot, self.slot_generation[slot]
+
+    def release(self, slot):
+        with self.lock:
+            self.pins[slot] -= 1
+
+
+class SharedWeightsReader(object):
+    """Worker side: keeps a PolicyValueNet on the latest published generation.
+    A model on the cpu is pointed at the shared tensors directly (no private copy, the slot stays
+    pinned until the next generation is mapped); a model on the gpu gets a device copy and
+    the slot is released right away.
+    PolicyValueNet always puts its model on the gpu, so the self-play workers of train_parallel
+    each still hold a device copy of the weights: for them the shared slots only save the host-side
+    copy and the checkpoint unpickling, the weights themselves are shared by cpu models only.
+    """
+
+    def __init__(self, shared, policy_value_net):
+        self.shared = shared
+        self.policy_value_net = policy_value_net
+        self.generation = -1
+        self.slot = -1
+
+    def poll(self):
+        """map the newest generation if there is one, returns True if the weights changed"""
+        if self.shared.generation.value <= self.generation:
+            return False
+        slot, generation = self.shared.acquire()
+        if slot < 0:
+            return False
+        model = unwrap(self.policy_value_net.policy_value_model)
+        weights = self.shared.slots[slot]
+        tensors = list(model.named_parameters()) + list(model.named_buffers())
+        on_cpu = all(not t.is_cuda for name, t in tensors)
+        with torch.no_grad():
+            for name, t in tensors:
+                if on_cpu:
+                    t.data = weights[name]
+                else:
+                    t.copy_(weights[name], non_blocking=False)
+        if on_cpu:
+            if self.slot >= 0:
+                self.shared.release(self.slot)
+            self.slot = slot
+        else:
+            self.shared.release(slot)
+        self.generation = generation
+        return True
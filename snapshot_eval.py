@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Background evaluation of training snapshots for the parallel trainers: evaluation games in worker
+processes, stopped early by an SPRT, promotion of the snapshot to the best model and an opponent
+that gets stronger as the snapshots beat it
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import multiprocessing
+import shutil
+import threading
+import time
+from sprt import SPRT
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty  # py3k
+
+
+class SnapshotEvaluator(object):
+    """Evaluates snapshots of the training checkpoint in a background thread, training goes on meanwhile.
+
+    worker(gpu_id, win_queue, job_queue, job_queue_lock, active_eval, game, role, *worker_args) plays
+    the games in its own process: it takes (eval_id, opponent) jobs, loads eval_model_file, abandons
+    the game once active_eval no longer holds eval_id and puts (eval_id, winner) on win_queue.
+
+    An evaluation plays up to n_games games against opponent, stopped early by SPRT(p0, p1, alpha,
+    beta). The snapshot is copied to best_model_file (promoted)
+        - when the SPRT accepts H1,
+        - when the test ends undecided after n_games ('max_games') and promote_undecided is set,
+          if its score beats the best score seen against this opponent so far.
+    After curriculum_h1_streak H1 results in a row the opponent becomes next_opponent(opponent);
+    next_opponent returns opponent itself at the end of the curriculum.
+    """
+
+    def __init__(self, worker, worker_args, game, opponent, next_opponent, n_games=10,
+                 p0=0.35, p1=0.65, alpha=0.05, beta=0.05, promote_undecided=True, curriculum_h1_streak=2,
+                 eval_model_file='checkpoint_eval.pth.tar', best_model_file='checkpoint_best.pth.tar'):
+        self.worker = worker
+        self.worker_args = tuple(worker_args)
+        self.game = game
+        self.opponent = opponent
+        self.next_opponent = next_opponent
+        self.n_games = n_games
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.promote_undecided = promote_undecided
+        self.curriculum_h1_streak = curriculum_h1_streak
+        self.eval_model_file = eval_model_file
+        self.best_model_file = best_model_file
+        self.best_score = 0.0  # best score against the current opponent
+        self.h1_streak = 0
+        self.eval_id = 0
+        self.eval_thread = None
+        self.procs = []
+
+    def start(self, gpu_ids):
+        """start one worker process per game of an evaluation, the i-th on gpu_ids[i]"""
+        self.manager = multiprocessing.Manager()
+        self.win_queue = self.manager.Queue(maxsize=self.n_games)
+        self.job_queue = self.manager.Queue(maxsize=self.n_games)
+        self.job_queue_lock = self.manager.Lock()
+        self.active_eval = self.manager.Value('i', 0)
+        for idx in range(self.n_games):
+            start_role = idx % 2
+            args = (gpu_ids[idx % len(gpu_ids)], self.win_queue, self.job_queue, self.job_queue_lock,
+                    self.active_eval, self.game, start_role) + self.worker_args
+            proc = multiprocessing.Process(target=self.worker, args=args)
+            self.procs.append(proc)
+            proc.start()
+
+    def get_win_ratio(self, opponent):
+        """plays up to n_games games against opponent, stopped early by the SPRT; returns
+        (score, SPRT status), the score alone does not tell whether the result is significant"""
+        self.eval_id += 1
+        self.active_eval.value = self.eval_id
+        self.job_queue_lock.acquire()
+        for i in range(self.n_games):
+            self.job_queue.put((self.eval_id, opponent))
+        self.job_queue_lock.release()
+        sprt = SPRT(self.p0, self.p1, self.alpha, self.beta, max_games=self.n_games)
+        status = None
+        while status is None:
+            eval_id, winner = self.win_queue.get()
+            if eval_id != self.eval_id:
+                continue
+            status = sprt.record(winner)
+        # cancel the games still in flight and drop the ones not started yet
+        self.active_eval.value = 0
+        while True:
+            try:
+                self.job_queue.get_nowait()
+            except Empty:
+                break
+        win_ratio = sprt.score()
+        print("opponent:{}, win: {}, lose: {}, tie:{}, sprt:{}, llr:{:.3f}, games_saved:{}".format(
+            opponent, sprt.wins, sprt.losses, sprt.ties, status, sprt.llr, self.n_games - sprt.games))
+        return win_ratio, status
+
+    def start_evaluate(self, batch_i, snapshot_file):
+        """snapshot snapshot_file and evaluate it in a background thread,
+        skipped if the previous evaluation is still running"""
+        if self.eval_thread is not None and self.eval_thread.is_alive():
+            print("current self-play batch: {}, previous evaluation still running, skip".format(batch_i))
+            return
+        shutil.copyfile(snapshot_file, self.eval_model_file + '.undone')
+        shutil.move(self.eval_model_file + '.undone', self.eval_model_file)
+        print("current self-play batch: {}, start to evaluate...".format(batch_i))
+        self.eval_thread = threading.Thread(target=self.evaluate, args=(batch_i, self.on_evaluated))
+        self.eval_thread.daemon = True
+        self.eval_thread.start()
+
+    def evaluate(self, batch_i, callback):
+        t1 = time.time()
+        opponent = self.opponent
+        win_ratio, status = self.get_win_ratio(opponent)
+        t2 = time.time()
+        callback(batch_i, opponent, win_ratio, status, t2 - t1)
+
+    def on_evaluated(self, batch_i, opponent, win_ratio, status, time_used):
+        """promote the evaluated snapshot and advance the opponent curriculum"""
+        promoted = status == 'H1' or (status == 'max_games' and self.promote_undecided and
+                                      win_ratio > self.best_score)
+        self.best_score = max(self.best_score, win_ratio)
+        if promoted:
+            print("New best policy!!!!!!!!")
+            shutil.copyfile(self.eval_model_file, self.best_model_file + '.undone')
+            shutil.move(self.best_model_file + '.undone', self.best_model_file)
+        self.h1_streak = self.h1_streak + 1 if status == 'H1' else 0
+        if self.h1_streak >= self.curriculum_h1_streak:
+            self.h1_streak = 0
+            next_opponent = self.next_opponent(opponent)
+            if next_opponent != opponent:
+                self.opponent = next_opponent
+                self.best_score = 0.0
+        print("current self-play batch: {}, end to evaluate...,win_ratio:{:.3f},sprt:{},promoted:{},"
+              "opponent:{},time_used:{:.3f}".format(batch_i, win_ratio, status, promoted, self.opponent,
+                                                    time_used))
+
+    def release(self):
+        for proc in self.procs:
+            proc.terminate()
+            proc.join()
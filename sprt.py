@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Sequential probability ratio test (SPRT) used to stop model evaluation early
+
+@author: Zhang Tianming
+"""
+from __future__ import print_function
+import math
+import random
+
+
+class SPRT(object):
+    """Wald's SPRT on the candidate's score per game.
+
+    H0: expected score is p0 (candidate no better than the reference)
+    H1: expected score is p1 (candidate better than the reference)
+    A win scores 1, a tie 0.5 and a loss 0, so a tie counts as half a win and half a loss.
+    """
+
+    def __init__(self, p0=0.35, p1=0.65, alpha=0.05, beta=0.05, max_games=None):
+        """Arguments:
+        p0, p1 -- expected scores under H0 and H1, 0 < p0 < p1 < 1
+        alpha -- probability of accepting H1 when H0 is true (false promotion)
+        beta -- probability of accepting H0 when H1 is true (missed promotion)
+        max_games -- truncate the test after this many games, None for no limit
+        """
+        if not 0 < p0 < p1 < 1:
+            raise Exception('sprt bounds should satisfy 0 < p0 < p1 < 1')
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.max_games = max_games
+        self.lower = math.log(beta / (1.0 - alpha))
+        self.upper = math.log((1.0 - beta) / alpha)
+        self._win_llr = math.log(p1 / p0)
+        self._loss_llr = math.log((1.0 - p1) / (1.0 - p0))
+        self.reset()
+
+    def reset(self):
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.llr = 0.0
+
+    @property
+    def games(self):
+        return self.wins + self.losses + self.ties
+
+    def record(self, winner, player=1):
+        """Record the result of one game, winner as returned by Game.start_play,
+        player is the candidate's player index.
+        Returns the current status (see status()).
+        """
+        if winner == player:
+            self.wins += 1
+            self.llr += self._win_llr
+        elif winner == -1:
+            self.ties += 1
+            self.llr += 0.5 * (self._win_llr + self._loss_llr)
+        else:
+            self.losses += 1
+            self.llr += self._loss_llr
+        return self.status()
+
+    def status(self):
+        """'H1' if the candidate is confidently better, 'H0' if it is confidently not,
+        'max_games' if the test was truncated, None if more games are needed
+        """
+        if self.llr >= self.upper:
+            return 'H1'
+        if self.llr <= self.lower:
+            return 'H0'
+        if self.max_games is not None and self.games >= self.max_games:
+            return 'max_games'
+        return None
+
+    def score(self):
+        if self.games == 0:
+            return 0.0
+        return 1.0 * (self.wins + 0.5 * self.ties) / self.games
+
+
+def simulate(p_win, p_tie=0.0, n_evals=2000, max_games=20, **kwargs):
+    """Run the test on simulated result streams with the given per-game outcome probabilities.
+    Returns (average games played, fraction accepting H1, fraction accepting H0).
+    """
+    played, accepted, rejected = 0, 0, 0
+    for i in range(n_evals):
+        test = SPRT(max_games=max_games, **kwargs)
+        status = None
+        while status is None:
+            r = random.random()
+            if r < p_win:
+                winner = 1
+            elif r < p_win + p_tie:
+                winner = -1
+            else:
+                winner = 2
+            status = test.record(winner)
+        played += test.games
+        accepted += status == 'H1'
+        rejected += status == 'H0'
+    return 1.0 * played / n_evals, 1.0 * accepted / n_evals, 1.0 * rejected / n_evals
+
+
+if __name__ == '__main__':
+    max_games = 20
+    for p_win, p_tie in [(1.0, 0.0), (0.9, 0.05), (0.7, 0.1), (0.5, 0.0), (0.3, 0.1), (0.1, 0.0), (0.0, 0.0)]:
+        avg_games, h1, h0 = simulate(p_win, p_tie, max_games=max_games)
+        print("p_win:{:.2f}, p_tie:{:.2f}, avg_games:{:.2f}, games_saved:{:.2f}, accept_h1:{:.3f}, accept_h0:{:.3f}".format(
+            p_win, p_tie, avg_games, max_games - avg_games, h1, h0))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Threat detection for gomoku: immediate wins, forced blocks and wins by continuous fours (VCF)
+
+Works on the board's `states` dict (move -> player) and places/removes stones in it
+temporarily while searching, the dict is always restored.
+
+@author: Zhang Tianming
+"""
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def _run_length(states, width, height, h, w, dh, dw, player):
+    """number of consecutive stones of player starting next to (h, w) in direction (dh, dw)"""
+    count = 0
+    h, w = h + dh, w + dw
+    while 0 <= h < height and 0 <= w < width and states.get(h * width + w) == player:
+        count += 1
+        h, w = h + dh, w + dw
+    return count
+
+
+def makes_five(states, width, height, n, move, player):
+    """whether a stone of player on move completes n in a row"""
+    h, w = move // width, move % width
+    for dh, dw in DIRECTIONS:
+        if 1 + _run_length(states, width, height, h, w, dh, dw, player) + \
+                _run_length(states, width, height, h, w, -dh, -dw, player) >= n:
+            return True
+    return False
+
+
+def near_cells(states, width, height, player, distance):
+    """empty cells within the Chebyshev distance of player's stones"""
+    cells = set()
+    for move, p in states.items():
+        if p != player:
+            continue
+        h, w = move // width, move % width
+        for i in range(max(0, h - distance), min(height, h + distance + 1)):
+            for j in range(max(0, w - distance), min(width, w + distance + 1)):
+                m = i * width + j
+                if m not in states:
+                    cells.add(m)
+    return cells
+
+
+def winning_moves(states, width, height, n, player):
+    """moves completing n in a row for player, such a move always touches one of player's stones"""
+    return sorted(m for m in near_cells(states, width, height, player, 1)
+                  if makes_five(states, width, height, n, m, player))
+
+
+def five_cells(states, width, height, n, move, player):
+    """cells that would complete n in a row for player on a line through move (move already placed)"""
+    cells = set()
+    h, w = move // width, move % width
+    for dh, dw in DIRECTIONS:
+        for offset in range(-(n - 1), 1):
+            empties, own = [], 0
+            for k in range(offset, offset + n):
+                i, j = h + k * dh, w + k * dw
+                if not (0 <= i < height and 0 <= j < width):
+                    break
+                p = states.get(i * width + j)
+                if p == player:
+                    own += 1
+                elif p is None:
+                    empties.append(i * width + j)
+                else:
+                    break
+            else:
+                if own == n - 1 and len(empties) == 1:
+                    cells.add(empties[0])
+    return cells
+
+
+def find_vcf(states, width, height, n, player, depth):
+    """first move of a win for player by continuous fours within depth fours, None if not found.
+    Assumes the opponent has no immediate win. The search is sound but not complete: lines where
+    a forced block gives the defender a four of its own are abandoned."""
+    wins = winning_moves(states, width, height, n, player)
+    if wins:
+        return wins[0]
+    if depth <= 0:
+        return None
+    opponent = 1 if player == 2 else 2
+    for m in sorted(near_cells(states, width, height, player, 2)):
+        states[m] = player
+        blocks = five_cells(states, width, height, n, m, player)
+        found = False
+        if len(blocks) >= 2:
+            # open four or double four, the defender can only block one cell
+            found = True
+        elif len(blocks) == 1:
+            b = blocks.pop()
+            states[b] = opponent
+            if not makes_five(states, width, height, n, b, opponent) and \
+                    not five_cells(states, width, height, n, b, opponent):
+                found = find_vcf(states, width, height, n, player, depth - 1) is not None
+            del states[b]
+        del states[m]
+        if found:
+            return m
+    return None
+
+
+def find_threats(board, vcf_depth=3):
+    """Tactical status of the position for the player to move.
+    Returns (status, moves):
+        ('win', [move])   -- move completes n in a row
+        ('loss', moves)   -- the opponent threatens to win on two or more cells
+        ('block', [move]) -- the opponent threatens to win on move, it has to be taken
+        ('vcf', [move])   -- move starts a win by continuous fours
+        (None, None)      -- nothing forced
+    """
+    states, width, height, n = board.states, board.width, board.height, board.n_in_row
+    if len(states) < 2 * (n - 2) - 1:
+        return None, None
+    player = board.get_current_player()
+    opponent = 1 if player == 2 else 2
+    wins = winning_moves(states, width, height, n, player)
+    if wins:
+        return 'win', wins[:1]
+    threats = winning_moves(states, width, height, n, opponent)
+    if len(threats) >= 2:
+        return 'loss', threats
+    if len(threats) == 1:
+        return 'block', threats
+    if vcf_depth > 0:
+        move = find_vcf(states, width, height, n, player, vcf_depth)
+        if move is not None:
+            return 'vcf', [move]
+    return None, None
+
+
+def restrict_priors(action_probs, moves):
+    """keep the (action, prior) pairs on moves and renormalise, uniform if the policy gave none of them"""
+    moves = set(moves)
+    restricted = [(a, p) for a, p in action_probs if a in moves]
+    total = sum(p for a, p in restricted)
+    if total <= 0:
+        return [(m, 1.0 / len(moves)) for m in sorted(moves)]
+    return [(a, p / total) for a, p in restricted]
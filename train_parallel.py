@@ -13,11 +13,19 @@ import random
 import numpy as np
 import time
 import cPickle as pickle
-from collections import defaultdict, deque
+from collections import defaultdict
 from game import Board, Game
-from policy_value_net import PolicyValueNet
+from policy_value_net import PolicyValueNet, PolicyValueBackBoneNet
 from mcts_pure import MCTSPlayer as MCTS_Pure
 from mcts_alphazero import MCTSPlayer
+from prefetch import BatchPrefetcher
+from replay_buffer import ReplayBuffer, MixedReplay
+from reanalyse import reanalyse_worker
+from checkpoint import AsyncCheckpointWriter, load_weights, read_generation, weights_path, generation_path
+from shared_weights import SharedWeights, SharedWeightsReader
+from sample_channel import GameChannel
+from resign import ResignPolicy
+from snapshot_eval import SnapshotEvaluator
 import multiprocessing
 import threading
 import os
@@ -42,62 +50,79 @@ def get_equi_data(play_data, board_height, board_width):
     return extend_data
 
 
-def collect_selfplay_data(gpu_id, data_queue, data_queue_lock, game,
+def collect_selfplay_data(gpu_id, data_channel, game,
                           board_width, board_height, feature_planes,
                           c_puct, n_playout, temp,
-                          model_file, n_games=1):
-    """collect self-play data for training"""
+                          model_file, n_games=1, shared_weights=None,
+                          fast_n_playout=None, fast_move_prob=0.0, resign=None, node_budget=None):
+    """collect self-play data for training
+    the weights come from shared_weights when given, from model_file otherwise
+    resign: optional ResignPolicy, every worker tunes its own copy from its played-out games"""
     os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
     policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, mode='eval')
     mcts_player = MCTSPlayer(policy_value_net.policy_value_fn, c_puct=c_puct,
-                             n_playout=n_playout, is_selfplay=1)
+                             n_playout=n_playout, is_selfplay=1,
+                             fast_n_playout=fast_n_playout, fast_move_prob=fast_move_prob,
+                             node_budget=node_budget)
+    reader = SharedWeightsReader(shared_weights, policy_value_net) if shared_weights is not None else None
+    generation = -1
     while True:
-        while data_queue.qsize() > 512 * 20:
-            time.sleep(1)
         for i in range(n_games):
-            winner, play_data = game.start_self_play(mcts_player, temp=temp)
+            winner, play_data = game.start_self_play(mcts_player, temp=temp, resign=resign)
+            if resign is not None and resign.games % 100 == 0:
+                print("worker pid:{}, {}".format(os.getpid(), resign))
             # augment the data
             play_data = get_equi_data(play_data, board_width, board_height)
-            data_queue_lock.acquire()
-            for data in play_data:
-                data_queue.put(data)
-            data_queue_lock.release()
-        if os.path.exists(model_file):
-            checkpoint = torch.load(model_file)
+            # one message per game tagged with the generation that played it (0 before the first
+            # checkpoint), blocks while the trainer is behind
+            played_by = reader.generation if reader is not None else generation
+            data_channel.put(play_data, max(played_by, 0))
+        # only load the weights when the trainer has published a newer generation
+        if reader is not None:
+            reader.poll()
         else:
-            checkpoint = None
-
-        os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
-        policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, mode='eval', checkpoint=checkpoint)
-        mcts_player = MCTSPlayer(policy_value_net.policy_value_fn, c_puct=c_puct,
-                                 n_playout=n_playout, is_selfplay=1)
+            latest = read_generation(model_file)
+            if latest > generation:
+                policy_value_net.resume(load_weights(model_file))
+                generation = latest
 
 
-def policy_evaluate(gpu_id, win_queue, job_queue, job_queue_lock, game, role,
+def policy_evaluate(gpu_id, win_queue, job_queue, job_queue_lock, active_eval, game, role,
                     board_width, board_height, feature_planes,
-                    c_puct, n_playout, pure_mcts_playout_num,
-                    model_file):
+                    c_puct, n_playout, model_file):
     """
     Evaluate the trained policy by playing games against the pure MCTS player
     Note: this is only for monitoring the progress of training
+    Jobs carry the id of the evaluation round and the playouts of the pure MCTS player,
+    the game is abandoned as soon as active_eval no longer holds that id (the round has been decided)
     """
     os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
     while True:
         while job_queue.empty():
             time.sleep(1)
-        job_queue.get()
-        checkpoint = torch.load(model_file)
+        eval_id, pure_mcts_playout_num = job_queue.get()
+        if eval_id != active_eval.value:
+            continue
+        checkpoint = load_weights(model_file)
         os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
-        policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, checkpoint)
+        policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, mode='eval', checkpoint=checkpoint)
         current_mcts_player = MCTSPlayer(policy_value_net.policy_value_fn, c_puct=c_puct,
                                          n_playout=n_playout)
         pure_mcts_player = MCTS_Pure(c_puct=5, n_playout=pure_mcts_playout_num)
-        winner = game.start_play(current_mcts_player, pure_mcts_player, start_player=role, is_shown=0)
+        winner = game.start_play(current_mcts_player, pure_mcts_player, start_player=role, is_shown=0,
+                                 is_stopped=lambda: active_eval.value != eval_id)
+        if winner is None:
+            continue
         job_queue_lock.acquire()
-        win_queue.put(winner)
+        win_queue.put((eval_id, winner))
         job_queue_lock.release()
 
 
+def next_pure_mcts_playout_num(pure_mcts_playout_num):
+    """opponent curriculum: 1000 more playouts for the pure MCTS player, up to 5000"""
+    return pure_mcts_playout_num + 1000 if pure_mcts_playout_num < 5000 else pure_mcts_playout_num
+
+
 class TrainPipeline():
     def __init__(self):
         # params of the board and the game
@@ -113,183 +138,284 @@ class TrainPipeline():
         self.lr_multiplier = 1.0  # adaptively adjust the learning rate based on KL
         self.temp = 1.0  # the temperature param
         self.n_playout = 400  # num of simulations for each move
+        # playout cap randomisation: this fraction of self-play moves is searched with fast_n_playout
+        # simulations and only used as value targets, 0 searches every move with n_playout
+        self.fast_move_prob = 0.0
+        self.fast_n_playout = 100
+        self.node_budget = None  # max live MCTS nodes per self-play worker, None for unbounded
+        # resign self-play games once the root value is below the threshold, the threshold is tuned
+        # to keep false resignations (measured on the played-out games) under resign_false_rate
+        self.resign = False
+        self.resign_threshold = -0.9
+        self.resign_playthrough = 0.1  # fraction of games played out with resignation disabled
+        self.resign_false_rate = 0.05
         self.c_puct = 5
         self.buffer_size = 10000
         self.batch_size = 512  # mini-batch size for training
-        self.data_buffer = deque(maxlen=self.buffer_size)
+        # samples of generations more than generation_window checkpoints older than the newest are dropped,
+        # None keeps all; prioritized samples by training loss, with importance weights
+        self.generation_window = None
+        self.prioritized_replay = False
+        self.priority_alpha = 0.6
+        self.priority_beta = 0.4
+        self.data_buffer = ReplayBuffer(self.buffer_size, self.generation_window, self.prioritized_replay,
+                                        self.priority_alpha, self.priority_beta)
+        self.data_buffer_lock = threading.Lock()
+        # reanalyse role (reanalyse.py): workers search positions of the buffer again with the latest
+        # checkpoint, reanalyse_fraction of every mini-batch comes from their refreshed samples
+        self.reanalyse_workers = 0  # 0 disables reanalyse
+        self.reanalyse_fraction = 0.25
+        self.reanalyse_n_playout = 400
+        self.reanalyse_batch = 64  # positions of one job, searched in lock-step
+        self.reanalyse_value_weight = 0.5  # share of the search value in the refreshed winner_z
+        self.reanalysed_buffer = ReplayBuffer(self.buffer_size // 2, self.generation_window, self.prioritized_replay,
+                                              self.priority_alpha, self.priority_beta)
+        self.batch_source = self.data_buffer  # what the mini-batches are sampled from
+        self.collect_procs, self.reanalyse_procs = [], []
+        self.channel_max_games = 256  # self-play workers block once this many games wait for the trainer
+        self.prefetch_depth = 2  # num of mini-batches prepared ahead of the train step
+        self.diag_sample_size = 256  # num of samples used for the kl/explained_var diagnostics
+        self.save_freq = 10  # write model_file every save_freq batches
         self.play_batch_size = 1
         self.epochs = 5  # num of train_steps for each update
+        self.precision = 'fp32'  # 'fp32', 'fp16' or 'bf16' forward/backward in train_step
+        self.accum_steps = 1  # micro-batches per train_step, lowers peak memory for large batch_size
         self.kl_targ = 0.025
         self.check_freq = 50
         self.game_batch_num = 1500
         self.n_games_eval = 10
-        self.best_win_ratio = 0.0
+        # sequential test used to stop the evaluation as soon as the result is decided
+        self.sprt_p0 = 0.35
+        self.sprt_p1 = 0.65
+        self.sprt_alpha = 0.05
+        self.sprt_beta = 0.05
+        # promotion and opponent curriculum rules, see snapshot_eval.SnapshotEvaluator
+        self.promote_undecided = True  # tests undecided after n_games_eval games promote on a better score
+        self.curriculum_h1_streak = 2  # H1 results in a row before the opponent gets stronger
         # num of simulations used for the pure mcts, which is used as the opponent to evaluate the trained policy
         self.pure_mcts_playout_num = 1000
         self.gpus = ['0', '1', '2', '3']
         self.num_inst = 0
         self.model_file = 'checkpoint.pth.tar'
         self.best_model_name = 'checkpoint_best.pth.tar'
-        if os.path.exists(self.model_file):
-            os.remove(self.model_file)
+        self.generation = 0  # bumped on every checkpoint written, lets workers skip reloading unchanged weights
+        # publish weights to self-play workers through shared memory; the workers' models are on the gpu,
+        # so each still copies the weights to its device, only the host-side copy is saved
+        self.use_shared_weights = True
+        # full checkpoint (optim_dict included) of the model under evaluation, promoted to best_model_name;
+        # training keeps overwriting model_file meanwhile
+        self.eval_model_file = 'checkpoint_eval.pth.tar'
+        for f in [self.model_file, weights_path(self.model_file), generation_path(self.model_file)]:
+            if os.path.exists(f):
+                os.remove(f)
         self.manager = multiprocessing.Manager()
 
     def init_model(self):
         gpu_id = self.gpus[self.num_inst % len(self.gpus)]
         self.num_inst += 1
         os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
-        self.policy_value_net = PolicyValueNet(self.board_width, self.board_height, self.feature_planes)
+        self.policy_value_net = PolicyValueNet(self.board_width, self.board_height, self.feature_planes,
+                                               precision=self.precision, accum_steps=self.accum_steps)
         self.mcts_player = MCTSPlayer(self.policy_value_net.policy_value_fn, c_puct=self.c_puct,
                                       n_playout=self.n_playout, is_selfplay=1)
 
     def policy_update(self):
         """update the policy-value net"""
         t1 = time.time()
-        mini_batch = random.sample(self.data_buffer, self.batch_size)
-        state_batch = np.array([data[0] for data in mini_batch])
-        mcts_probs_batch = np.array([data[1] for data in mini_batch])
-        winner_batch = np.array([data[2] for data in mini_batch])
-
-        state_batch_v = Variable(torch.Tensor(state_batch.copy()).type(torch.FloatTensor).cuda())
-        mcts_probs_batch_v = Variable(torch.Tensor(mcts_probs_batch.copy()).type(torch.FloatTensor).cuda())
-        winner_batch_v = Variable(torch.Tensor(winner_batch.copy()).type(torch.FloatTensor).cuda())
-
+        state_batch_v, mcts_probs_batch_v, winner_batch_v, weights_v, sample_ids = self.prefetcher.next()
+        t2 = time.time()
         old_probs, old_v, loss, entropy = self.policy_value_net.train_step(state_batch_v, mcts_probs_batch_v,
                                                                            winner_batch_v,
-                                                                           self.learn_rate * self.lr_multiplier)
+                                                                           self.learn_rate * self.lr_multiplier,
+                                                                           weights_v)
         old_probs, old_v = old_probs.data.cpu().numpy(), old_v.data.cpu().numpy()
         for i in range(self.epochs - 1):
+            # the outputs of this step come from the parameters left by the previous one
             new_probs, new_v, loss, entropy = self.policy_value_net.train_step(state_batch_v, mcts_probs_batch_v,
                                                                                winner_batch_v,
-                                                                               self.learn_rate * self.lr_multiplier)
+                                                                               self.learn_rate * self.lr_multiplier,
+                                                                               weights_v)
             new_probs, new_v = new_probs.data.cpu().numpy(), new_v.data.cpu().numpy()
             kl = np.mean(np.sum(old_probs * (np.log(old_probs + 1e-10) - np.log(new_probs + 1e-10)), axis=1))
             if kl > self.kl_targ * 4:  # early stopping if D_KL diverges badly
                 break
-        new_probs, new_v = self.policy_value_net.policy_value_model(state_batch_v)
+        if self.prioritized_replay:
+            losses = self.policy_value_net.sample_losses(state_batch_v, mcts_probs_batch_v, winner_batch_v)
+            with self.data_buffer_lock:
+                self.batch_source.update_priorities(sample_ids, losses)
+        t3 = time.time()
+        # diagnostics of the final parameters on a subsample, the mini-batch is already in random order
+        n = min(self.diag_sample_size, self.batch_size)
+        with torch.no_grad():
+            new_probs, new_v = self.policy_value_net.policy_value_model(state_batch_v[:n])
         new_probs, new_v = new_probs.data.cpu().numpy(), new_v.data.cpu().numpy()
+        old_probs, old_v = old_probs[:n], old_v[:n]
+        winner_batch = winner_batch_v[:n].cpu().numpy()
         kl = np.mean(np.sum(old_probs * (np.log(old_probs + 1e-10) - np.log(new_probs + 1e-10)), axis=1))
 
-
         # adaptively adjust the learning rate
         if kl > self.kl_targ * 2 and self.lr_multiplier > 0.1:
             self.lr_multiplier /= 1.5
         elif kl < self.kl_targ / 2 and self.lr_multiplier < 10:
             self.lr_multiplier *= 1.5
 
-        explained_var_old = 1 - np.var(np.array(winner_batch) - old_v.flatten()) / np.var(np.array(winner_batch))
-        explained_var_new = 1 - np.var(np.array(winner_batch) - new_v.flatten()) / np.var(np.array(winner_batch))
-        t2 = time.time()
+        explained_var_old = 1 - np.var(winner_batch - old_v.flatten()) / np.var(winner_batch)
+        explained_var_new = 1 - np.var(winner_batch - new_v.flatten()) / np.var(winner_batch)
+        t4 = time.time()
         print(
-            "kl:{:.5f},lr_multiplier:{:.3f},loss:{},entropy:{},explained_var_old:{:.3f},explained_var_new:{:.3f},time_used:{:.3f}".format(
-                kl, self.lr_multiplier, loss, entropy, explained_var_old, explained_var_new, t2 - t1))
+            "kl:{:.5f},lr_multiplier:{:.3f},loss:{},entropy:{},explained_var_old:{:.3f},explained_var_new:{:.3f},"
+            "time_used_for_data:{:.3f},time_used_for_trainstep:{:.3f},time_used_for_diagnostics:{:.3f},"
+            "time_used:{:.3f}".format(
+                kl, self.lr_multiplier, loss, entropy, explained_var_old, explained_var_new,
+                t2 - t1, t3 - t2, t4 - t3, t4 - t1))
         return loss, entropy
 
     def policy_evaluate(self):
-        self.manager = multiprocessing.Manager()
-        self.win_queue = self.manager.Queue(maxsize=self.n_games_eval)
-        self.job_queue = self.manager.Queue(maxsize=self.n_games_eval)
-        self.job_queue_lock = self.manager.Lock()
-        procs = []
-        NUM_PROCESS = self.n_games_eval
-        for idx in range(NUM_PROCESS):
-            start_role = idx % 2
-            gpu_id = self.gpus[self.num_inst % len(self.gpus)]
+        self.evaluator = SnapshotEvaluator(
+            policy_evaluate, (self.board_width, self.board_height, self.feature_planes,
+                              self.c_puct, self.n_playout, self.eval_model_file),
+            self.game, self.pure_mcts_playout_num, next_pure_mcts_playout_num, self.n_games_eval,
+            self.sprt_p0, self.sprt_p1, self.sprt_alpha, self.sprt_beta, self.promote_undecided,
+            self.curriculum_h1_streak, self.eval_model_file, self.best_model_name)
+        gpu_ids = []
+        for idx in range(self.n_games_eval):
+            gpu_ids.append(self.gpus[self.num_inst % len(self.gpus)])
             self.num_inst += 1
-            args = (gpu_id, self.win_queue, self.job_queue, self.job_queue_lock,
-                    self.game, start_role,
-                    self.board_width, self.board_height, self.feature_planes,
-                    self.c_puct, self.n_playout, self.pure_mcts_playout_num,
-                    self.model_file,)
-            proc = multiprocessing.Process(target=policy_evaluate, args=args)
-            procs.append(proc)
-            proc.start()
-        self.eval_procs = procs
-
-    def get_win_ratio(self):
-        self.job_queue_lock.acquire()
-        for i in range(self.n_games_eval):
-            self.job_queue.put(1)
-        self.job_queue_lock.release()
-        win_cnt = defaultdict(int)
-        for i in range(self.n_games_eval):
-            winner = self.win_queue.get()
-            win_cnt[winner] += 1
-            print(i)
-        win_ratio = 1.0 * (win_cnt[1] + 0.5 * win_cnt[-1]) / self.n_games_eval
-        print("num_playouts:{}, win: {}, lose: {}, tie:{}".format(self.pure_mcts_playout_num, win_cnt[1], win_cnt[2],
-                                                                  win_cnt[-1]))
-        return win_ratio
+        self.evaluator.start(gpu_ids)
 
     def collect_selfplay_data(self):
         """run the training pipeline"""
-        self.data_queue = self.manager.Queue(maxsize=5120)
-        self.data_queue_lock = self.manager.Lock()
+        self.data_channel = GameChannel(max_games=self.channel_max_games)
+        self.shared_weights = None
+        if self.use_shared_weights:
+            # allocated from a cpu template, cuda must not be initialised before the workers fork
+            template = PolicyValueBackBoneNet(self.board_width * self.board_height, self.feature_planes)
+            self.shared_weights = SharedWeights(template.state_dict())
+        resign = ResignPolicy(self.resign_threshold, self.resign_playthrough,
+                              self.resign_false_rate) if self.resign else None
         NUM_PROCESS = 24
         procs = []
         for idx in range(NUM_PROCESS):
             gpu_id = self.gpus[self.num_inst % len(self.gpus)]
             self.num_inst += 1
             proc = multiprocessing.Process(target=collect_selfplay_data,
-                                           args=(gpu_id, self.data_queue, self.data_queue_lock, self.game,
+                                           args=(gpu_id, self.data_channel, self.game,
                                                  self.board_width, self.board_height, self.feature_planes,
                                                  self.c_puct, self.n_playout, self.temp,
-                                                 self.model_file, 1,))
+                                                 self.model_file, 1, self.shared_weights,
+                                                 self.fast_n_playout, self.fast_move_prob, resign,
+                                                 self.node_budget))
             procs.append(proc)
             proc.start()
         self.collect_procs = procs
 
+    def start_reanalyse(self):
+        """start the reanalyse workers, jobs are lists of buffer samples"""
+        if self.reanalyse_workers <= 0:
+            return
+        self.reanalyse_jobs = GameChannel(max_games=2 * self.reanalyse_workers)
+        self.reanalyse_results = GameChannel(max_games=2 * self.reanalyse_workers)
+        self.batch_source = MixedReplay(self.data_buffer, self.reanalysed_buffer, self.reanalyse_fraction)
+        procs = []
+        for idx in range(self.reanalyse_workers):
+            gpu_id = self.gpus[self.num_inst % len(self.gpus)]
+            self.num_inst += 1
+            proc = multiprocessing.Process(target=reanalyse_worker,
+                                           args=(gpu_id, self.reanalyse_jobs, self.reanalyse_results, self.model_file,
+                                                 self.board_width, self.board_height, self.feature_planes,
+                                                 self.n_in_row, self.c_puct, self.reanalyse_n_playout,
+                                                 self.reanalyse_batch, self.temp, self.reanalyse_value_weight))
+            procs.append(proc)
+            proc.start()
+        self.reanalyse_procs = procs
+
+    def exchange_reanalyse(self):
+        """store the refreshed samples of finished jobs and hand out new ones while the workers' queue
+        has room, returns the number of samples stored"""
+        if not self.reanalyse_procs:
+            return 0
+        n = 0
+        while self.reanalyse_results.qsize() > 0:
+            generation, samples = self.reanalyse_results.get_game()
+            with self.data_buffer_lock:
+                n += self.reanalysed_buffer.extend(samples, generation)
+        while self.reanalyse_jobs.qsize() < self.reanalyse_workers and len(self.data_buffer) >= self.reanalyse_batch:
+            with self.data_buffer_lock:
+                samples = self.data_buffer.sample(self.reanalyse_batch)[1]
+            self.reanalyse_jobs.put(samples)
+        return n
+
     def train(self):
+        self.prefetcher = BatchPrefetcher(self.batch_source, self.data_buffer_lock, self.batch_size,
+                                          depth=self.prefetch_depth).start()
+        self.checkpoint_writer = AsyncCheckpointWriter()
+        start_time = time.time()
+        n_games, n_policy_samples, n_value_samples, n_reanalysed = 0, 0, 0, 0
         try:
             for i in range(self.game_batch_num):
                 t1 = time.time()
                 cnt = 0
                 while True:
-                    while self.data_queue.empty():
-                        time.sleep(1)
-                    item = self.data_queue.get()
-                    self.data_buffer.append(item)
-                    cnt = cnt + 1
+                    generation, samples = self.data_channel.get_game()
+                    with self.data_buffer_lock:
+                        self.data_buffer.extend(samples, generation, n_games)
+                    n_games += 1
+                    # samples of fast moves come with an all-zero mcts_prob
+                    n_value = sum(1 for state, mcts_prob, winner in samples if not mcts_prob.any())
+                    n_value_samples += n_value
+                    n_policy_samples += len(samples) - n_value
+                    cnt = cnt + len(samples)
                     if cnt > self.batch_size and len(self.data_buffer) > self.batch_size:
                         break
+                n_reanalysed += self.exchange_reanalyse()
                 t2 = time.time()
-                print("batch i:{}, data_queue_size:{},time_used:{:.3f}".format(i + 1, self.data_queue.qsize(), t2 - t1))
+                print("batch i:{}, data_channel_games:{},time_used:{:.3f},games_per_hour:{:.1f},"
+                      "policy_samples:{},value_only_samples:{},reanalysed_samples_per_second:{:.1f}".format(
+                          i + 1, self.data_channel.qsize(), t2 - t1, n_games * 3600.0 / (t2 - start_time),
+                          n_policy_samples, n_value_samples, n_reanalysed / (t2 - start_time)))
                 loss, entropy = self.policy_update()
-                state = {'state_dict': self.policy_value_net.policy_value_model.state_dict(),
-                         'optim_dict': self.policy_value_net.optimizer.state_dict(),
-                         'loss': loss,
-                         'entropy': entropy}
-                torch.save(state, self.model_file + '.undone')
-                shutil.move(self.model_file + '.undone', self.model_file)
-                # check the performance of the current model，and save the model params
-                if (i + 1) % self.check_freq == 0:
-                    t1 = time.time()
-                    print("current self-play batch: {}, start to evaluate...".format(i + 1))
-                    win_ratio = self.get_win_ratio()
-                    if win_ratio > self.best_win_ratio:
-                        print("New best policy!!!!!!!!")
-                        self.best_win_ratio = win_ratio
-                        if self.best_win_ratio == 1.0 and self.pure_mcts_playout_num < 5000:
-                            self.pure_mcts_playout_num += 1000
-                            self.best_win_ratio = 0.0
-                        torch.save(state, self.best_model_name)
-                    t2 = time.time()
-                    print("current self-play batch: {}, end to evaluate...,time_used:{:.3f}".format(i + 1, t2 - t1))
+                t3 = time.time()
+                is_check = (i + 1) % self.check_freq == 0
+                if (i + 1) % self.save_freq == 0 or is_check:
+                    self.generation += 1
+                    with self.data_buffer_lock:
+                        self.data_buffer.advance(self.generation)
+                        self.reanalysed_buffer.advance(self.generation)
+                    state = {'state_dict': self.policy_value_net.policy_value_model.state_dict(),
+                             'optim_dict': self.policy_value_net.optimizer.state_dict(),
+                             'generation': self.generation,
+                             'arch': self.policy_value_net.arch(),
+                             'loss': loss,
+                             'entropy': entropy}
+                    self.checkpoint_writer.save(state, self.model_file)
+                    if self.shared_weights is not None and \
+                            not self.shared_weights.publish(state['state_dict'], self.generation):
+                        print("generation:{} not published, all shared slots are in use".format(self.generation))
+                # check the performance of the current model in the background，training goes on meanwhile
+                if is_check:
+                    with self.data_buffer_lock:
+                        print("batch i:{}, replay {}".format(i + 1, self.batch_source.summary()))
+                    self.checkpoint_writer.wait()
+                    self.evaluator.start_evaluate(i + 1, self.model_file)
+                t4 = time.time()
+                print("batch i:{}, time_used_for_collecting:{:.3f},time_used_for_update:{:.3f},"
+                      "time_used_for_checkpoint:{:.3f}".format(i + 1, t2 - t1, t3 - t2, t4 - t3))
         except KeyboardInterrupt:
             print('\n\rquit')
+        self.prefetcher.stop()
+        self.checkpoint_writer.wait()
 
     def release(self):
-        for proc in self.collect_procs:
-            proc.terminate()
-            proc.join()
-        for proc in self.eval_procs:
+        for proc in self.collect_procs + self.reanalyse_procs:
             proc.terminate()
             proc.join()
+        self.evaluator.release()
 
 
 if __name__ == '__main__':
     training_pipeline = TrainPipeline()
     training_pipeline.collect_selfplay_data()
+    training_pipeline.start_reanalyse()
     training_pipeline.policy_evaluate()
     training_pipeline.init_model()
     print('start training')
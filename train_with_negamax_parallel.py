@@ -18,6 +18,7 @@ from game import Board, Game
 from policy_value_net import PolicyValueNet
 from mcts_pure import MCTSPlayer as MCTS_Pure
 from mcts_alphazero import MCTSPlayer
+from snapshot_eval import SnapshotEvaluator
 import multiprocessing
 import threading
 import os
@@ -76,32 +77,48 @@ def collect_selfplay_data(gpu_id, data_queue, data_queue_lock, game,
                                  n_playout=n_playout, is_selfplay=1)
 
 
-def policy_evaluate(gpu_id, win_queue, job_queue, job_queue_lock, game, role,
+def policy_evaluate(gpu_id, win_queue, job_queue, job_queue_lock, active_eval, game, role,
                     board_width, board_height, feature_planes,
-                    c_puct, n_playout, pure_mcts_playout_num,
-                    model_file):
+                    c_puct, n_playout, model_file, time_budget=None):
     """
-    Evaluate the trained policy by playing games against the pure MCTS player
+    Evaluate the trained policy by playing games against the negamax player
     Note: this is only for monitoring the progress of training
+    With time_budget the MCTS player searches that many seconds per move (with early termination)
+    instead of n_playout playouts, so it is calibrated against negamax at equal time
+    Jobs carry the id of the evaluation round and the negamax search depth,
+    the game is abandoned as soon as active_eval no longer holds that id (the round has been decided)
     """
     os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
     while True:
         while job_queue.empty():
             time.sleep(1)
-        search_depth=job_queue.get()
+        eval_id, search_depth = job_queue.get()
+        if eval_id != active_eval.value:
+            continue
         checkpoint = torch.load(model_file)
         os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
         policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, checkpoint=checkpoint)
         current_mcts_player = MCTSPlayer(policy_value_net.policy_value_fn, c_puct=c_puct,
-                                         n_playout=n_playout)
+                                         n_playout=n_playout, time_budget=time_budget,
+                                         early_stop=time_budget is not None)
         # refer_player = MCTS_Pure(c_puct=5, n_playout=pure_mcts_playout_num)
         refer_player = NegamaxPlayer(cmd_path='negamax/build/renju',search_depth=search_depth)
-        winner = game.start_play(current_mcts_player, refer_player, start_player=role, is_shown=0)
+        winner = game.start_play(current_mcts_player, refer_player, start_player=role, is_shown=0,
+                                 is_stopped=lambda: active_eval.value != eval_id)
+        if winner is None:
+            continue
         job_queue_lock.acquire()
-        win_queue.put(winner)
+        win_queue.put((eval_id, winner))
         job_queue_lock.release()
 
 
+def next_search_depth(search_depth):
+    """opponent curriculum: negamax 2 plies deeper, then -1 (iterative deepening) instead of depth 20"""
+    if search_depth == -1:
+        return search_depth
+    return search_depth + 2 if search_depth + 2 < 20 else -1
+
+
 class TrainPipeline():
     def __init__(self):
         # params of the board and the game
@@ -127,14 +144,24 @@ class TrainPipeline():
         self.check_freq = 50
         self.game_batch_num = 150000
         self.n_games_eval = 10
-        self.best_win_ratio = 0.0
+        # sequential test used to stop the evaluation as soon as the result is decided
+        self.sprt_p0 = 0.35
+        self.sprt_p1 = 0.65
+        self.sprt_alpha = 0.05
+        self.sprt_beta = 0.05
+        # promotion and opponent curriculum rules, see snapshot_eval.SnapshotEvaluator
+        self.promote_undecided = True  # tests undecided after n_games_eval games promote on a better score
+        self.curriculum_h1_streak = 2  # H1 results in a row before the opponent gets stronger
         # num of simulations used for the pure mcts, which is used as the opponent to evaluate the trained policy
         self.pure_mcts_playout_num = 1000
         self.negamax_search_depth = 2
+        self.eval_time_budget = None  # seconds per move of the evaluated player, None for n_playout playouts
         self.gpus = ['0', '1', '2', '3']
         self.num_inst = 0
         self.model_file = 'checkpoint.pth.tar'
         self.best_model_name = 'checkpoint_best.pth.tar'
+        # snapshot of the model under evaluation, training keeps overwriting model_file meanwhile
+        self.eval_model_file = 'checkpoint_eval.pth.tar'
         if os.path.exists(self.model_file):
             os.remove(self.model_file)
         self.manager = multiprocessing.Manager()
@@ -190,40 +217,17 @@ class TrainPipeline():
         return loss, entropy
 
     def policy_evaluate(self):
-        self.manager = multiprocessing.Manager()
-        self.win_queue = self.manager.Queue(maxsize=self.n_games_eval)
-        self.job_queue = self.manager.Queue(maxsize=self.n_games_eval)
-        self.job_queue_lock = self.manager.Lock()
-        procs = []
-        NUM_PROCESS = self.n_games_eval
-        for idx in range(NUM_PROCESS):
-            start_role = idx % 2
-            gpu_id = self.gpus[self.num_inst % len(self.gpus)]
+        self.evaluator = SnapshotEvaluator(
+            policy_evaluate, (self.board_width, self.board_height, self.feature_planes,
+                              self.c_puct, self.n_playout, self.eval_model_file, self.eval_time_budget),
+            self.game, self.negamax_search_depth, next_search_depth, self.n_games_eval,
+            self.sprt_p0, self.sprt_p1, self.sprt_alpha, self.sprt_beta, self.promote_undecided,
+            self.curriculum_h1_streak, self.eval_model_file, self.best_model_name)
+        gpu_ids = []
+        for idx in range(self.n_games_eval):
+            gpu_ids.append(self.gpus[self.num_inst % len(self.gpus)])
             self.num_inst += 1
-            args = (gpu_id, self.win_queue, self.job_queue, self.job_queue_lock,
-                    self.game, start_role,
-                    self.board_width, self.board_height, self.feature_planes,
-                    self.c_puct, self.n_playout, self.pure_mcts_playout_num,
-                    self.model_file,)
-            proc = multiprocessing.Process(target=policy_evaluate, args=args)
-            procs.append(proc)
-            proc.start()
-        self.eval_procs = procs
-
-    def get_win_ratio(self,search_depth=2):
-        self.job_queue_lock.acquire()
-        for i in range(self.n_games_eval):
-            self.job_queue.put(search_depth)
-        self.job_queue_lock.release()
-        win_cnt = defaultdict(int)
-        for i in range(self.n_games_eval):
-            winner = self.win_queue.get()
-            win_cnt[winner] += 1
-            print(i)
-        win_ratio = 1.0 * (win_cnt[1] + 0.5 * win_cnt[-1]) / self.n_games_eval
-        print("search_depth:{}, win: {}, lose: {}, tie:{}".format(search_depth, win_cnt[1], win_cnt[2],
-                                                                  win_cnt[-1]))
-        return win_ratio
+        self.evaluator.start(gpu_ids)
 
     def collect_selfplay_data(self):
         """run the training pipeline"""
@@ -265,22 +269,9 @@ class TrainPipeline():
                          'entropy': entropy}
                 torch.save(state, self.model_file + '.undone')
                 shutil.move(self.model_file + '.undone', self.model_file)
-                # check the performance of the current model，and save the model params
+                # check the performance of the current model in the background，training goes on meanwhile
                 if (i + 1) % self.check_freq == 0:
-                    t1 = time.time()
-                    print("current self-play batch: {}, start to evaluate...".format(i + 1))
-                    win_ratio = self.get_win_ratio(self.negamax_search_depth)
-                    if win_ratio > self.best_win_ratio:
-                        print("New best policy!!!!!!!!")
-                        self.best_win_ratio = win_ratio
-                        if self.best_win_ratio == 1.0 and self.negamax_search_depth < 20 and self.negamax_search_depth != -1:
-                            self.negamax_search_depth += 2
-                            if self.negamax_search_depth >= 20:
-                                self.negamax_search_depth = -1
-                            self.best_win_ratio = 0.0
-                        torch.save(state, self.best_model_name)
-                    t2 = time.time()
-                    print("current self-play batch: {}, end to evaluate...,time_used:{:.3f}".format(i + 1, t2 - t1))
+                    self.evaluator.start_evaluate(i + 1, self.model_file)
         except KeyboardInterrupt:
             print('\n\rquit')
 
@@ -288,9 +279,7 @@ class TrainPipeline():
         for proc in self.collect_procs:
             proc.terminate()
             proc.join()
-        for proc in self.eval_procs:
-            proc.terminate()
-            proc.join()
+        self.evaluator.release()
 
 
 if __name__ == '__main__':
@@ -23,6 +23,7 @@ import threading
 import os
 from multiprocessing import Pool
 from negamax import NegamaxPlayer
+from replay_buffer import ReplayBuffer
 import argparse
 from dist.client import *
 from dist.data_server import *
@@ -63,6 +64,7 @@ def collect_selfplay_data(pid, gpu_id, data_queue, data_queue_lock, game,
     time.sleep(int(pid) * 3)
     n_epoch = 0
     checkpoint = None
+    generation = 0
     while True:
         os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
         policy_value_net = PolicyValueNet(board_width, board_height, feature_planes, mode='eval', checkpoint=checkpoint)
@@ -81,11 +83,12 @@ def collect_selfplay_data(pid, gpu_id, data_queue, data_queue_lock, game,
             play_data = get_equi_data(play_data, board_width, board_height)
             print('PID:%s,N_EPOCH:%s,N_GAME:%s send data ....' % (pid, n_epoch, n_game))
             if is_distributed:
-                upload_samples(data_server_url, play_data)
+                upload_samples(data_server_url, play_data, generation)
             else:
+                game_id = pid * 1000000 + n_epoch * n_games + n_game
                 data_queue_lock.acquire()
                 for data in play_data:
-                    data_queue.put(data)
+                    data_queue.put((generation, game_id, data))
                 data_queue_lock.release()
             print('PID:%s,N_EPOCH:%s,N_GAME:%s send data end.' % (pid, n_epoch, n_game))
         n_epoch += 1
@@ -94,6 +97,7 @@ def collect_selfplay_data(pid, gpu_id, data_queue, data_queue_lock, game,
                 if is_distributed:
                     download(data_server_url, model_file, model_file)
                 checkpoint = torch.load(model_file)
+                generation = checkpoint.get('generation', 0)
                 break
             except:
                 time.sleep(1)
@@ -146,9 +150,20 @@ class TrainPipeline():
 
         self.batch_size = 4096  # mini-batch size for training
         self.buffer_size = self.batch_size * 20
-        self.data_buffer = deque(maxlen=self.buffer_size)
+        # a checkpoint (generation) is written after every update: samples of models more than
+        # generation_window updates old are dropped from the buffer and from the backlog of downloaded games
+        self.generation = 0
+        self.generation_window = 20
+        self.prioritized_replay = False  # sample by training loss, with importance weights
+        self.priority_alpha = 0.6
+        self.priority_beta = 0.4
+        self.data_buffer = ReplayBuffer(self.buffer_size, self.generation_window, self.prioritized_replay,
+                                        self.priority_alpha, self.priority_beta)
+        self.holder_size = self.batch_size * 300  # max samples of downloaded games waiting for the buffer
         self.play_batch_size = 1
         self.epochs = 5  # num of train_steps for each update
+        self.precision = 'fp32'  # 'fp32', 'fp16' or 'bf16' forward/backward in train_step
+        self.accum_steps = 1  # micro-batches per train_step, lowers peak memory for large batch_size
         self.kl_targ = 0.025
         self.check_freq = 50
         self.game_batch_num = 150000
@@ -170,8 +185,11 @@ class TrainPipeline():
         checkpoint = None
         if os.path.exists(self.model_file):
             checkpoint = torch.load(self.model_file)
+            self.generation = checkpoint.get('generation', 0)
+            self.data_buffer.advance(self.generation)
         self.policy_value_net = PolicyValueNet(self.board_width, self.board_height, self.feature_planes,
-                                               checkpoint=checkpoint)
+                                               checkpoint=checkpoint,
+                                               precision=self.precision, accum_steps=self.accum_steps)
         self.mcts_player = MCTSPlayer(self.policy_value_net.policy_value_fn, c_puct=self.c_puct,
                                       n_playout=self.n_playout, is_selfplay=1)
 
@@ -179,19 +197,24 @@ class TrainPipeline():
         """update the policy-value net"""
         t1 = time.time()
         t11 = time.time()
-        mini_batch = random.sample(self.data_buffer, self.batch_size)
+        sample_ids, mini_batch, weights = self.data_buffer.sample(self.batch_size)
         state_batch = np.array([data[0] for data in mini_batch])
         mcts_probs_batch = np.array([data[1] for data in mini_batch])
         winner_batch = np.array([data[2] for data in mini_batch])
         state_batch_v = Variable(torch.Tensor(state_batch.copy()).type(torch.FloatTensor).cuda())
         mcts_probs_batch_v = Variable(torch.Tensor(mcts_probs_batch.copy()).type(torch.FloatTensor).cuda())
         winner_batch_v = Variable(torch.Tensor(winner_batch.copy()).type(torch.FloatTensor).cuda())
+        weights_v = torch.from_numpy(weights).cuda() if weights is not None else None
         t12 = time.time()
         t21 = time.time()
         old_probs, old_v, loss, entropy = self.policy_value_net.train_step(state_batch_v, mcts_probs_batch_v,
                                                                            winner_batch_v,
-                                                                           self.learn_rate * self.lr_multiplier)
+                                                                           self.learn_rate * self.lr_multiplier,
+                                                                           weights_v)
         t22 = time.time()
+        if self.prioritized_replay:
+            losses = self.policy_value_net.sample_losses(state_batch_v, mcts_probs_batch_v, winner_batch_v)
+            self.data_buffer.update_priorities(sample_ids, losses)
         old_probs, old_v = old_probs.data.cpu().numpy(), old_v.data.cpu().numpy()
         '''
         for i in range(self.epochs - 1):
@@ -307,25 +330,32 @@ class TrainPipeline():
             idx = idx + 1
 
     def train(self, is_distributed=False, data_server_url=DIST_DATA_URL):
-        samples_holder = deque(maxlen=self.batch_size * 300)
+        # downloaded games waiting for the buffer, (generation, game_id, samples), oldest first
+        samples_holder = deque()
+        held, n_games, n_stale = 0, 0, 0
         try:
             for i in range(self.game_batch_num):
                 t1 = time.time()
                 cnt = 0
                 if is_distributed:
                     while True:
-                        samples = download_samples()
-                        samples_holder.extend(samples)
-                        while True:
-                            try:
-                                self.data_buffer.append(samples_holder.popleft())
-                                cnt = cnt + 1
-                                if cnt >= self.batch_size / 2 and len(self.data_buffer) > self.batch_size:
-                                    t2 = time.time()
-                                    print("batch i:{},collecting finished,samples:{},time_used:{:.3f}".format(
-                                        i + 1, cnt, t2 - t1))
-                                    break
-                            except:
+                        for generation, samples in download_games():
+                            samples_holder.append((generation, n_games, samples))
+                            held += len(samples)
+                            n_games += 1
+                        while held > self.holder_size:
+                            held -= len(samples_holder.popleft()[2])
+                        while samples_holder:
+                            generation, game_id, samples = samples_holder.popleft()
+                            held -= len(samples)
+                            added = self.data_buffer.extend(samples, generation, game_id)
+                            # games of generations out of the window are dropped
+                            n_stale += len(samples) - added
+                            cnt = cnt + added
+                            if cnt >= self.batch_size / 2 and len(self.data_buffer) > self.batch_size:
+                                t2 = time.time()
+                                print("batch i:{},collecting finished,samples:{},stale_samples_dropped:{},"
+                                      "time_used:{:.3f}".format(i + 1, cnt, n_stale, t2 - t1))
                                 break
                         if cnt >= self.batch_size / 2 and len(self.data_buffer) > self.batch_size:
                             break
@@ -338,13 +368,14 @@ class TrainPipeline():
                     while True:
                         while self.data_queue.empty():
                             time.sleep(1)
-                        item = self.data_queue.get()
-                        self.data_buffer.append(item)
-                        cnt = cnt + 1
+                        generation, game_id, item = self.data_queue.get()
+                        cnt = cnt + self.data_buffer.extend([item], generation, game_id)
                         if cnt > self.batch_size and len(self.data_buffer) > self.batch_size:
                             break
                 t2 = time.time()
                 print("batch i:{}, data_buffer_size:{},time_used:{:.3f}".format(i + 1, len(self.data_buffer), t2 - t1))
+                if (i + 1) % self.check_freq == 0:
+                    print("batch i:{}, replay {}".format(i + 1, self.data_buffer.summary()))
                 for i in range(5):
                     try:
                         loss, entropy = self.policy_update()
@@ -352,8 +383,11 @@ class TrainPipeline():
                     except Exception,e:
                         print(e)
                         continue
+                self.generation += 1
+                self.data_buffer.advance(self.generation)
                 state = {'state_dict': self.policy_value_net.policy_value_model.state_dict(),
                          'optim_dict': self.policy_value_net.optimizer.state_dict(),
+                         'generation': self.generation,
                          'loss': loss,
                          'entropy': entropy}
                 torch.save(state, self.model_file + '.undone')
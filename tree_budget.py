@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Memory bound for the MCTS trees: eager freeing of detached subtrees, pruning of low-visit
+branches and measurement of the live tree
+
+A parent and its children reference each other, so a dropped subtree is a reference cycle
+that only the cyclic garbage collector reclaims, late and in bulk. The functions here break
+the cycles so the nodes are released by reference counting as soon as they are detached.
+
+@author: Zhang Tianming
+"""
+import sys
+
+
+def free_subtree(node):
+    """detach node and everything below it, returns the number of nodes released"""
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        stack.extend(node._children.values())
+        node._children = {}
+        node._parent = None
+        count += 1
+    return count
+
+
+def collapse(node):
+    """turn node back into a leaf, keeping its own statistics, returns the number of nodes released.
+    A later playout reaching it expands it again."""
+    count = 0
+    for child in node._children.values():
+        count += free_subtree(child)
+    node._children = {}
+    return count
+
+
+def prune_tree(root, n_nodes, target_nodes):
+    """collapse the expanded nodes with the fewest visits until at most target_nodes of n_nodes
+    are left, returns the number of nodes released. The root is never collapsed, so its children
+    and their move statistics always stay."""
+    internal = []
+    stack = list(root._children.values())
+    while stack:
+        node = stack.pop()
+        if node._children:
+            internal.append(node)
+            stack.extend(node._children.values())
+    internal.sort(key=lambda node: node._n_visits)
+    freed = 0
+    for node in internal:
+        if n_nodes - freed <= target_nodes:
+            break
+        # nodes inside a subtree collapsed before have already been emptied
+        if node._children:
+            freed += collapse(node)
+    return freed
+
+
+def tree_bytes(root):
+    """bytes held by the nodes of the tree and their children dicts"""
+    total = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        total += sys.getsizeof(node) + sys.getsizeof(node._children)
+        stack.extend(node._children.values())
+    return total